@@ -0,0 +1,236 @@
+"""Local stand-in for the trends.earth API used by the benchmarks.
+
+Emulates the endpoints the CLI talks to with canned responses:
+
+    POST  /auth, /auth/refresh, /auth/logout, /auth/logout-all
+    GET   /api/v1/script/<id>[?include=logs]   (ETag / If-None-Match without logs)
+    GET   /api/v1/script/<id>/log[?start=...]
+    GET   /api/v1/script/<id>/download
+    POST  /api/v1/script, /api/v1/script/<id>/publish
+    PATCH /api/v1/script/<id>
+
+Run standalone with ``python benchmarks/mock_server.py --port 8000`` to point a
+real ``trends`` at it (``trends config set url_api http://127.0.0.1:8000``).
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SCRIPT_RE = re.compile(r"^/api/v1/script/(?P<id>[^/]+)(?P<rest>/log|/download|/publish)?$")
+
+
+def make_logs(count):
+    """Return `count` log entries, one second apart, ending now"""
+    first = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=count)
+    return [
+        {
+            "id": i,
+            "text": f"Step {i}: building layer of the script image",
+            "register_date": (first + timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def make_archive(files=5, file_size=4096):
+    """Return the bytes of a tar.gz script archive"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        members = {
+            "configuration.json": json.dumps({"name": "bench", "id": "bench-script"}).encode(),
+            "requirements.txt": b"numpy\n",
+        }
+        for i in range(files):
+            members[f"src/module_{i}.py"] = (f"VALUE_{i} = {i}\n" * (file_size // 12)).encode()
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class MockState:
+    """Tunable responses shared by all request handlers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.script_status = "SUCCESS"
+        self.log_count = 1000
+        self.follow_polls = 0
+        self.follow_batch = 20
+        self.archive = make_archive()
+        self.requests = 0
+        self.uploaded_bytes = 0
+        self.not_modified = 0
+
+    def take_follow_poll(self):
+        with self.lock:
+            if self.follow_polls <= 0:
+                return False
+            self.follow_polls -= 1
+            return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler of the mock API"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "tecli-mock/1.0"
+    # Headers and body are written separately; without TCP_NODELAY every
+    # response on a kept-alive connection stalls on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def send_json(self, body, status=200, etag=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_bytes(self, data, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length) if length else b""
+        with self.state.lock:
+            self.state.requests += 1
+            self.state.uploaded_bytes += len(data)
+        return data
+
+    def tokens(self):
+        return {
+            "access_token": "bench-access",
+            "refresh_token": "bench-refresh",
+            "expires_in": 3600,
+        }
+
+    def script(self, script_id):
+        return {
+            "id": script_id,
+            "name": "bench-script",
+            "slug": "bench-script",
+            "status": self.state.script_status,
+            "created_at": "2024-01-01T00:00:00",
+        }
+
+    def do_POST(self):
+        self.read_body()
+        path = urlparse(self.path).path
+        if path in ("/auth", "/auth/refresh"):
+            return self.send_json(self.tokens())
+        if path in ("/auth/logout", "/auth/logout-all"):
+            return self.send_json({"message": "ok"})
+        if path == "/api/v1/script":
+            return self.send_json({"data": self.script("bench-script")})
+        match = SCRIPT_RE.match(path)
+        if match and match.group("rest") == "/publish":
+            return self.send_json({"data": self.script(match.group("id"))})
+        return self.send_json({"message": "not found"}, status=404)
+
+    def do_PATCH(self):
+        self.read_body()
+        match = SCRIPT_RE.match(urlparse(self.path).path)
+        if match and not match.group("rest"):
+            return self.send_json({"data": self.script(match.group("id"))})
+        return self.send_json({"message": "not found"}, status=404)
+
+    def do_GET(self):
+        self.read_body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        match = SCRIPT_RE.match(url.path)
+        if not match:
+            return self.send_json({"message": "not found"}, status=404)
+
+        rest = match.group("rest")
+        if rest == "/download":
+            return self.send_bytes(self.state.archive, "application/gzip")
+        if rest == "/log":
+            # Follow polls succeed while budget remains, then end the loop
+            if not self.state.take_follow_poll():
+                return self.send_json({"message": "done"}, status=404)
+            return self.send_json({"data": make_logs(self.state.follow_batch)})
+
+        body = self.script(match.group("id"))
+        if "logs" in query.get("include", []):
+            body["logs"] = make_logs(self.state.log_count)
+            return self.send_json({"data": body})
+
+        # Plain metadata supports conditional requests
+        etag = '"' + hashlib.sha1(json.dumps(body).encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.state.lock:
+                self.state.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        return self.send_json({"data": body}, etag=etag)
+
+
+class MockServer:
+    """Mock API running in a background thread, usable as a context manager"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock trends.earth API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    server = MockServer(args.host, args.port)
+    print(f"Mock API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
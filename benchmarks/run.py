@@ -0,0 +1,283 @@
+"""Benchmarks of the CLI's hot paths against a local mock API.
+
+Measures end-to-end latency of ``info``, ``logs`` (dump and follow),
+``publish`` with several archive sizes, ``download``, repeated ``config.get``
+calls and CLI cold start, and writes the results as JSON.
+
+    python benchmarks/run.py -o baseline.json
+    python benchmarks/run.py --compare baseline.json --threshold 0.2
+
+With ``--compare`` the exit status is 1 when any benchmark's median is slower
+than the baseline by more than the threshold.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_server import MockServer  # noqa: E402
+
+PUBLISH_SIZES = {"publish_10k": 10 * 1024, "publish_1m": 1024**2, "publish_10m": 10 * 1024**2}
+
+
+def write_tecli_config(home, url_api):
+    """Write a logged-in ~/.tecli.yml pointing at the mock API"""
+    expires_at = (datetime.now() + timedelta(days=1)).isoformat()
+    with open(os.path.join(home, ".tecli.yml"), "w") as outfile:
+        outfile.write(
+            f'url_api: "{url_api}"\n'
+            'JWT: "bench-access"\n'
+            'refresh_token: "bench-refresh"\n'
+            f'token_expires_at: "{expires_at}"\n'
+        )
+
+
+def make_project(path, src_size):
+    """Create a script project whose src/ holds `src_size` bytes of random data"""
+    os.makedirs(os.path.join(path, "src"), exist_ok=True)
+    with open(os.path.join(path, "configuration.json"), "w") as outfile:
+        json.dump({"name": "bench", "id": "bench-script"}, outfile)
+    with open(os.path.join(path, "requirements.txt"), "w") as outfile:
+        outfile.write("numpy\n")
+    with open(os.path.join(path, "src", "main.py"), "w") as outfile:
+        outfile.write('def run(params, logger):\n    return "OK"\n')
+    with open(os.path.join(path, "src", "data.bin"), "wb") as outfile:
+        outfile.write(os.urandom(src_size))
+    return path
+
+
+def measure(fn, repeat, warmup=1, setup=None):
+    """Run `fn` `repeat` times after `warmup` runs and return the durations"""
+    durations = []
+    for i in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            durations.append(elapsed)
+    return durations
+
+
+def summarize(durations, ops=1, **extra):
+    """Latency statistics in milliseconds and throughput in operations/s"""
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    median = statistics.median(ordered)
+    result = {
+        "runs": len(ordered),
+        "ops_per_run": ops,
+        "median_ms": round(median * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "throughput_ops_s": round(ops / median, 2) if median else None,
+    }
+    result.update(extra)
+    return result
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the CLI's console output while it is being measured"""
+    with open(os.devnull, "w") as devnull:
+        handlers = logging.getLogger().handlers
+        streams = [handler.setStream(devnull) for handler in handlers]
+        try:
+            with contextlib.redirect_stdout(devnull):
+                yield
+        finally:
+            for handler, stream in zip(handlers, streams, strict=True):
+                handler.setStream(stream)
+
+
+def run_benchmarks(server, workdir, repeat, only=None):
+    """Run the selected benchmarks and return their results by name"""
+    from tecli import config, download, info, logs, publish
+
+    state = server.state
+    project = make_project(os.path.join(workdir, "project"), 1024)
+    results = {}
+
+    def selected(name):
+        return not only or name in only
+
+    def in_project(path, fn):
+        def wrapper():
+            cwd = os.getcwd()
+            os.chdir(path)
+            try:
+                with quiet():
+                    assert fn() is not False, "command failed"
+            finally:
+                os.chdir(cwd)
+
+        return wrapper
+
+    if selected("config_get"):
+        calls = 200
+
+        def config_get():
+            for _ in range(calls):
+                config.get("url_api")
+
+        results["config_get"] = summarize(measure(config_get, repeat), ops=calls)
+
+    if selected("info"):
+        results["info"] = summarize(measure(in_project(project, info.run), repeat))
+
+    if selected("logs"):
+        state.script_status = "SUCCESS"
+        results["logs"] = summarize(
+            measure(in_project(project, lambda: logs.run(timedelta(days=1))), repeat),
+            ops=state.log_count,
+            log_entries=state.log_count,
+        )
+
+    if selected("logs_follow"):
+        polls = 50
+
+        def reset_follow():
+            state.script_status = "RUNNING"
+            state.follow_polls = polls
+
+        def follow():
+            # Without the wait between polls: only the request and printing
+            # work is of interest here
+            return logs.run(timedelta(days=1), sleep=lambda seconds: None)
+
+        try:
+            durations = measure(in_project(project, follow), repeat, setup=reset_follow)
+        finally:
+            state.script_status = "SUCCESS"
+        results["logs_follow"] = summarize(durations, ops=polls, polls=polls)
+
+    for name, size in PUBLISH_SIZES.items():
+        if not selected(name):
+            continue
+        path = make_project(os.path.join(workdir, name), size)
+        results[name] = summarize(
+            measure(in_project(path, lambda: publish.run(False, True)), repeat),
+            src_bytes=size,
+        )
+
+    if selected("download"):
+        target = os.path.join(workdir, "downloads")
+        os.makedirs(target, exist_ok=True)
+        results["download"] = summarize(
+            measure(in_project(target, lambda: download.run("bench-script")), repeat),
+            archive_bytes=len(state.archive),
+        )
+
+    return results
+
+
+def run_cold_start(home, repeat, only=None):
+    """Measure a fresh interpreter importing tecli and running a command"""
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    commands = {
+        "cold_import": [sys.executable, "-c", "import tecli"],
+        "cold_config_show": [sys.executable, "-m", "tecli", "config", "show", "url_api"],
+    }
+    results = {}
+    for name, command in commands.items():
+        if only and name not in only:
+            continue
+
+        def call(command=command):
+            subprocess.run(command, env=env, check=True, capture_output=True)
+
+        results[name] = summarize(measure(call, repeat))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names of regressed benchmarks"""
+    regressions = []
+    print(
+        f"{'benchmark':<20} {'baseline ms':>12} {'current ms':>12} {'change':>9}", file=sys.stderr
+    )
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"{name:<20} {'-':>12} {current['median_ms']:>12.3f} {'new':>9}", file=sys.stderr)
+            continue
+        change = current["median_ms"] / previous["median_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<20} {previous['median_ms']:>12.3f} {current['median_ms']:>12.3f} "
+            f"{change:>+9.1%}{flag}",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trends.earth CLI hot paths")
+    parser.add_argument("-o", "--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown ratio (default: 0.2)"
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="measured runs per benchmark")
+    parser.add_argument("--only", help="comma-separated benchmark names to run")
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else None
+
+    with tempfile.TemporaryDirectory() as home, MockServer() as server:
+        write_tecli_config(home, server.url)
+        os.environ["HOME"] = home
+        from tecli import config, log
+
+        config.config_path = os.path.join(home, ".tecli.yml")
+        # Console logging as in `trends` without flags
+        log.setup()
+
+        results = run_benchmarks(server, home, args.repeat, only)
+        results.update(run_cold_start(home, args.repeat, only))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
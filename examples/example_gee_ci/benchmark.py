@@ -0,0 +1,93 @@
+"""
+Benchmark of the offline NDVI trend on a synthetic MOD13Q1-like stack.
+
+The default run streams 23 observations x 20 years over a 4096 x 4096 raster.
+Input blocks are generated on the fly, so the full stack (~15 GB as int16)
+never exists in memory or on disk.
+
+    python benchmark.py
+    python benchmark.py --size 1024 --block-size 256 --out trend.f32
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from src import offline
+
+OBSERVATIONS = 23
+
+
+def synthetic_reader(seed=0):
+    """Return a read_block callable producing deterministic 16-day stacks."""
+
+    def read_block(year, window):
+        rows, cols = window
+        shape = (OBSERVATIONS, rows.stop - rows.start, cols.stop - cols.start)
+        rng = np.random.default_rng([seed, year, rows.start, cols.start])
+        # Seasonal signal plus a small per-year greening trend and noise
+        season = (3000 + 2000 * np.sin(np.linspace(0, 2 * np.pi, OBSERVATIONS)))[
+            :, np.newaxis, np.newaxis
+        ]
+        noise = rng.integers(-300, 300, size=shape, dtype=np.int16)
+        ndvi = (season + 20 * (year - 2000)).astype(np.int16) + noise
+        # Roughly 90% good/marginal observations, the rest fill, snow or cloud
+        qa = rng.integers(0, 20, size=shape, dtype=np.int8)
+        qa = np.where(qa < 18, qa % 2, qa - 16)
+        return ndvi, qa
+
+    return read_block
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=4096, help="raster side in pixels")
+    parser.add_argument("--block-size", type=int, default=512)
+    parser.add_argument("--year-start", type=int, default=2001)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--out", help="optional path of a float32 memmap for the output")
+    args = parser.parse_args()
+
+    shape = (args.size, args.size)
+    year_end = args.year_start + args.years
+    out = None
+    if args.out:
+        out = np.memmap(args.out, dtype=np.float32, mode="w+", shape=shape)
+
+    reader = synthetic_reader()
+    read_time = 0.0
+
+    def timed_reader(year, window):
+        nonlocal read_time
+        start = time.perf_counter()
+        data = reader(year, window)
+        read_time += time.perf_counter() - start
+        return data
+
+    start = time.perf_counter()
+    result = offline.ndvi_trend(
+        timed_reader, args.year_start, year_end, shape, block_size=args.block_size, out=out
+    )
+    total_time = time.perf_counter() - start
+    compute_time = total_time - read_time
+    pixels = args.size * args.size
+
+    print(
+        json.dumps(
+            {
+                "shape": [OBSERVATIONS, args.years, args.size, args.size],
+                "block_size": args.block_size,
+                "total_seconds": round(total_time, 3),
+                "synthetic_read_seconds": round(read_time, 3),
+                "compute_seconds": round(compute_time, 3),
+                "compute_mpixels_per_second": round(pixels / compute_time / 1e6, 3),
+                "significant_pixels": int((result != offline.NODATA).sum()),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
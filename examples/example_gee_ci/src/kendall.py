@@ -0,0 +1,52 @@
+"""
+Kendall critical values shared by the Earth Engine and offline implementations.
+"""
+# Copyright 2017 Conservation International
+
+# Kendall parameter values for a significance of 0.05, indexed by period - 4
+KENDALL_COEFFICIENTS = [
+    4,
+    6,
+    9,
+    11,
+    14,
+    16,
+    19,
+    21,
+    24,
+    26,
+    31,
+    33,
+    36,
+    40,
+    43,
+    47,
+    50,
+    54,
+    59,
+    63,
+    66,
+    70,
+    75,
+    79,
+    84,
+    88,
+    93,
+    97,
+    102,
+    106,
+    111,
+    115,
+    120,
+    126,
+    131,
+    137,
+    142,
+]
+
+
+def kendall_threshold(period):
+    """Return the Kendall critical value of S for a period of `period` years."""
+    if period < 4 or period - 4 >= len(KENDALL_COEFFICIENTS):
+        raise ValueError(f"No Kendall coefficient for a period of {period} years")
+    return KENDALL_COEFFICIENTS[period - 4]
@@ -9,6 +9,14 @@ from time import sleep
 
 import ee
 
+from .kendall import KENDALL_COEFFICIENTS
+
+try:
+    from tecli.sdk.exports import TiledExport
+except ImportError:
+    # Only available when run with `trends start`
+    TiledExport = None
+
 
 def get_region(geom):
     """Return ee.Geometry from supplied GeoJSON object."""
@@ -136,57 +144,28 @@ def ndvi_annual_integral(year_start, year_end, geojson, EXECUTION_ID, logger):
 
     # Define Kendall parameter values for a significance of 0.05
     period = year_end - year_start + 1
-    coefficients = ee.Array(
-        [
-            4,
-            6,
-            9,
-            11,
-            14,
-            16,
-            19,
-            21,
-            24,
-            26,
-            31,
-            33,
-            36,
-            40,
-            43,
-            47,
-            50,
-            54,
-            59,
-            63,
-            66,
-            70,
-            75,
-            79,
-            84,
-            88,
-            93,
-            97,
-            102,
-            106,
-            111,
-            115,
-            120,
-            126,
-            131,
-            137,
-            142,
-        ]
-    )
+    coefficients = ee.Array(KENDALL_COEFFICIENTS)
     kendall = coefficients.get([period - 4])
 
     # Compute Kendall statistics
     mk_trend = mann_kendall_stat(ndvi_1yr_o.select("ndvi"))
 
-    export = {
-        "image": lf_trend.select("scale")
+    image = (
+        lf_trend.select("scale")
         .where(mk_trend.abs().lte(kendall), -99999)
         .where(lf_trend.select("scale").abs().lte(0.000001), -99999)
-        .unmask(-99999),
+        .unmask(-99999)
+    )
+
+    if TiledExport is not None:
+        # Export the region as parallel tiles and return their manifest
+        export = TiledExport(
+            image, geojson, scale=250, bucket="gee-test", description=str(EXECUTION_ID)
+        )
+        return export.run(progress=logger.send_progress)
+
+    export = {
+        "image": image,
         "description": EXECUTION_ID,
         "fileNamePrefix": EXECUTION_ID,
         "bucket": "gee-test",  # @TODO CHANGE THIS
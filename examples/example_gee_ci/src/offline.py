@@ -0,0 +1,195 @@
+"""
+Offline NumPy implementation of the annual integrated NDVI trend.
+
+Mirrors ``ndvi_annual_integral`` in ``main.py`` so its output can be validated
+without Earth Engine: MOD13Q1-like 16-day stacks are QA-masked as in
+``qa_filter``, averaged per year and scaled by 0.0001 as in ``int_16d_1yr_o``,
+fitted against year with a closed-form OLS slope (``linearFit``'s ``scale``)
+and masked with the Mann-Kendall S statistic and the same Kendall table.
+
+The raster is processed one spatial block at a time, so only a single block of
+the input stack has to be in memory. Requires numpy, which is not needed by the
+Earth Engine script itself.
+"""
+# Copyright 2017 Conservation International
+
+import numpy as np
+
+from .kendall import kendall_threshold
+
+NODATA = -99999
+SCALE_FACTOR = 0.0001
+
+
+def qa_valid(qa):
+    """Boolean mask of observations kept by qa_filter.
+
+    SummaryQA -1 (fill), 2 (snow/ice) and 3 (cloudy) are masked out.
+    """
+    return (qa != -1) & (qa != 2) & (qa != 3)
+
+
+def qa_filter(ndvi, qa):
+    """Return NDVI as float32 with pixels flagged by SummaryQA set to NaN."""
+    return np.where(qa_valid(qa), np.asarray(ndvi, dtype=np.float32), np.float32(np.nan))
+
+
+def annual_mean(ndvi, qa):
+    """Scaled mean over the observation axis of one year of 16-day data.
+
+    Args:
+        ndvi: Array of shape (observations, rows, cols). Integer input (as in
+            MOD13Q1) is summed exactly; float input may use NaN as a mask.
+        qa: SummaryQA array of the same shape.
+
+    Returns:
+        A float32 array of shape (rows, cols), NaN where no observation is valid.
+    """
+    ndvi = np.asarray(ndvi)
+    valid = qa_valid(qa)
+    if np.issubdtype(ndvi.dtype, np.integer):
+        total = (ndvi * valid).sum(axis=0, dtype=np.int64)
+    else:
+        valid &= ~np.isnan(ndvi)
+        total = np.where(valid, ndvi, 0).sum(axis=0, dtype=np.float64)
+    count = valid.sum(axis=0, dtype=np.int32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    return (mean * SCALE_FACTOR).astype(np.float32)
+
+
+def linear_fit(years, stack):
+    """Per-pixel OLS fit of ``stack`` against ``years``, ignoring NaNs.
+
+    Uses the closed-form solution on masked sums, so the cost is a handful of
+    vectorized reductions over the block regardless of its size.
+
+    Args:
+        years: Sequence of n years (the x values).
+        stack: Array of shape (n, rows, cols) with NaN for missing values.
+
+    Returns:
+        Tuple of (scale, offset) float32 arrays, NaN where fewer than two
+        valid years are available.
+    """
+    years = np.asarray(years, dtype=np.float64)
+    # Centering x keeps the sums well conditioned; the slope is unaffected.
+    x_mean = years.mean()
+    x = (years - x_mean)[:, np.newaxis, np.newaxis]
+    valid = ~np.isnan(stack)
+    y = np.where(valid, stack, 0).astype(np.float64)
+    xv = np.where(valid, x, 0)
+
+    n = valid.sum(axis=0)
+    sx = xv.sum(axis=0)
+    sy = y.sum(axis=0)
+    sxx = (xv * xv).sum(axis=0)
+    sxy = (xv * y).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denominator = n * sxx - sx * sx
+        scale = (n * sxy - sx * sy) / denominator
+        offset = (sy - scale * sx) / n - scale * x_mean
+    undefined = (n < 2) | (denominator == 0)
+    scale[undefined] = np.nan
+    offset[undefined] = np.nan
+    return scale.astype(np.float32), offset.astype(np.float32)
+
+
+def mann_kendall_stat(stack):
+    """Mann-Kendall S statistic of a (n, rows, cols) stack, ignoring NaNs.
+
+    Follows the pair loop of ``mann_kendall_stat`` in ``main.py`` exactly,
+    including its bounds (the last image is not compared), so both
+    implementations agree pixel for pixel. Comparisons involving NaN count as
+    neither concordant nor discordant, which matches masked pixels in EE.
+    """
+    n = stack.shape[0]
+    s = np.zeros(stack.shape[1:], dtype=np.int16)
+    for j in range(0, n - 2):
+        current = stack[j]
+        following = stack[j + 1 : n - 1]
+        s += (current < following).sum(axis=0, dtype=np.int16)
+        s -= (current > following).sum(axis=0, dtype=np.int16)
+    return s
+
+
+def masked_trend(years, annual, period):
+    """Trend of an annual (n, rows, cols) stack, masked as in main.py.
+
+    Returns:
+        A float32 (rows, cols) array of trend values, NODATA where the trend is
+        not significant, negligible or undefined.
+    """
+    kendall = kendall_threshold(period)
+    scale, _ = linear_fit(years, annual)
+    mk_trend = mann_kendall_stat(annual)
+
+    result = scale.copy()
+    result[np.abs(mk_trend) <= kendall] = NODATA
+    result[np.abs(scale) <= 0.000001] = NODATA
+    result[np.isnan(scale)] = NODATA
+    return result
+
+
+def trend_block(years, ndvi, qa, period):
+    """Compute the masked NDVI trend for one spatial block.
+
+    Args:
+        years: Sequence of the years being integrated.
+        ndvi: Sequence with one (observations, rows, cols) array per year.
+        qa: Sequence of SummaryQA arrays matching ``ndvi``.
+        period: Period used to look up the Kendall critical value.
+    """
+    annual = np.stack([annual_mean(n, q) for n, q in zip(ndvi, qa, strict=True)])
+    return masked_trend(years, annual, period)
+
+
+def iter_blocks(shape, block_size):
+    """Yield (row slice, column slice) windows covering a raster of `shape`."""
+    rows, cols = shape
+    for row in range(0, rows, block_size):
+        for col in range(0, cols, block_size):
+            yield (
+                slice(row, min(row + block_size, rows)),
+                slice(col, min(col + block_size, cols)),
+            )
+
+
+def iter_ndvi_trend(read_block, year_start, year_end, shape, block_size=512):
+    """Stream the NDVI trend block by block.
+
+    Args:
+        read_block: Callable ``read_block(year, window)`` returning the
+            ``(ndvi, qa)`` arrays of shape (observations, rows, cols) of that
+            year for the given (row slice, column slice) window.
+        year_start: The starting year, as in ``ndvi_annual_integral``.
+        year_end: The ending year, as in ``ndvi_annual_integral``.
+        shape: (rows, cols) of the full raster.
+        block_size: Side of the square blocks processed at a time.
+
+    Yields:
+        Tuples of (window, result) for each block.
+    """
+    # Same year range and period as int_16d_1yr_o and ndvi_annual_integral
+    years = list(range(year_start, year_end))
+    period = year_end - year_start + 1
+    for window in iter_blocks(shape, block_size):
+        # Reduce each year as soon as it is read, so only one year of 16-day
+        # observations for the block is held at a time.
+        annual = np.stack([annual_mean(*read_block(year, window)) for year in years])
+        yield window, masked_trend(years, annual, period)
+
+
+def ndvi_trend(read_block, year_start, year_end, shape, block_size=512, out=None):
+    """Compute the NDVI trend for a full raster.
+
+    Arguments are as for ``iter_ndvi_trend``. ``out`` may be any writable
+    (rows, cols) array, e.g. a ``numpy.memmap``, to keep the output on disk
+    as well; a float32 array is allocated otherwise.
+    """
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    for window, result in iter_ndvi_trend(read_block, year_start, year_end, shape, block_size):
+        out[window] = result
+    return out
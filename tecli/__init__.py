@@ -1,18 +1,41 @@
 """The GEF CLI Module."""
 
-import logging
+import sys
 
-import fire
 
-from tecli.commands import Commands
+def __getattr__(name):
+    # Commands pulls in every command module and its dependencies; it is
+    # imported on first use so that forwarding to the agent stays cheap.
+    if name == "Commands":
+        from tecli.commands import Commands
 
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    datefmt="%Y%m%d-%H:%M%p",
-)
+        return Commands
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
     """Create the CLI"""
-    fire.Fire(Commands)
+    from tecli import agent, log, timings
+
+    verbosity, json_path, argv = log.parse_args(sys.argv[1:])
+    timed, timings_path, argv = timings.parse_args(argv)
+    log.setup(verbosity, json_path)
+    # The agent's process cannot be instrumented from here
+    if not json_path and not timed:
+        exit_code = agent.forward(argv, verbosity)
+        if exit_code is not None:
+            return exit_code
+
+    command = argv[0] if argv else None
+    if timed:
+        timings.start(command)
+    try:
+        with log.timed("command", command=command):
+            import fire
+
+            from tecli.commands import Commands
+
+            fire.Fire(Commands, command=argv)
+    finally:
+        if timed:
+            timings.report(timings.stop(), timings_path)
@@ -0,0 +1,400 @@
+"""Agent command
+
+The agent is an optional background process that keeps the CLI imported,
+the configuration parsed, the access token fresh and HTTP connections open.
+While it runs, `trends` invocations of the commands in FORWARDED_COMMANDS send
+their arguments over a per-user Unix socket and stream the output back,
+instead of paying the start-up cost in every process. Without a running agent
+(or with TECLI_NO_AGENT=1 or TECLI_STATELESS=1) commands run in-process as usual.
+
+This module only imports the standard library at the top, so forwarding a
+command stays cheap.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from stat import S_IMODE, S_ISDIR
+
+# Short, non-interactive commands. `logs` is not forwarded because following
+# a build would hold the agent for as long as the build runs.
+FORWARDED_COMMANDS = {"config", "download", "info", "logout", "publish"}
+IDLE_TIMEOUT = 30 * 60
+TOKEN_CHECK_INTERVAL = 60
+
+
+def socket_path():
+    """Path of the current user's agent socket"""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if not base:
+        base = os.path.join(tempfile.gettempdir(), f"tecli-{os.getuid()}")
+    return os.path.join(base, "tecli-agent.sock")
+
+
+def log_path():
+    """Path of the agent's log file"""
+    from tecli import cache
+
+    return os.path.join(cache.default_dir("agent"), "agent.log")
+
+
+def private_dir(path):
+    """Whether `path` is a directory owned by, and only open to, this user
+
+    Without XDG_RUNTIME_DIR the socket's directory has a predictable name
+    in the shared temporary directory, which another user could create
+    first to capture forwarded commands, or answer them.
+    """
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        S_ISDIR(stat.st_mode) and stat.st_uid == os.getuid() and S_IMODE(stat.st_mode) & 0o077 == 0
+    )
+
+
+def _peer_uid(sock):
+    """User id of the process at the other end of a Unix socket, if known"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def _connect(timeout=None):
+    """Socket connected to this user's agent, or None"""
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    if not private_dir(os.path.dirname(path)):
+        logging.warning(
+            "Not using the agent: %s is not a private directory of this user",
+            os.path.dirname(path),
+        )
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        if _peer_uid(sock) not in (None, os.getuid()):
+            logging.warning("Not using the agent: %s belongs to another user", path)
+            sock.close()
+            return None
+    except OSError:
+        # Stale socket left behind by an agent that is no longer running
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _request(message, timeout=5):
+    """Send a control message to the agent and return its reply, or None"""
+    sock = _connect(timeout)
+    if sock is None:
+        return None
+    try:
+        with sock:
+            _send(sock, message)
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError):
+        return None
+
+
+def forward(argv, verbosity=0):
+    """Run `argv` through the agent and return its exit code
+
+    `verbosity` is the console log level of the command, see tecli.log.
+
+    Returns None when the command was not forwarded and has to run in-process.
+    """
+    if (
+        not argv
+        or argv[0] not in FORWARDED_COMMANDS
+        or "--help" in argv
+        or "-h" in argv
+        or os.environ.get("TECLI_NO_AGENT")
+        # The agent has its own settings, not this process' environment
+        or os.environ.get("TECLI_STATELESS", "") not in ("", "0")
+        or not hasattr(socket, "AF_UNIX")
+    ):
+        return None
+    sock = _connect()
+    if sock is None:
+        return None
+
+    with sock, sock.makefile("rb") as reader:
+        _send(
+            sock,
+            {
+                "argv": list(argv),
+                "cwd": os.getcwd(),
+                "tty": sys.stdout.isatty(),
+                "verbosity": verbosity,
+            },
+        )
+        for line in reader:
+            frame = json.loads(line)
+            if "exit" in frame:
+                return frame["exit"]
+            stream = sys.stderr if frame.get("stream") == "stderr" else sys.stdout
+            stream.write(frame["data"])
+            stream.flush()
+    print("Lost connection to the trends agent", file=sys.stderr)
+    return 1
+
+
+class _FrameWriter:
+    """Text stream that sends everything written to it to the client"""
+
+    def __init__(self, sock, stream, lock, tty=False):
+        self.sock = sock
+        self.stream = stream
+        self.lock = lock
+        self.tty = tty
+        self.closed = False
+
+    def write(self, data):
+        if data and not self.closed:
+            with self.lock:
+                try:
+                    _send(self.sock, {"stream": self.stream, "data": data})
+                except OSError:
+                    # The client went away; let the command finish quietly
+                    self.closed = True
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return self.tty
+
+
+def _no_input(prompt=""):
+    raise EOFError("Interactive input is not available through the agent (set TECLI_NO_AGENT=1)")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        if _peer_uid(self.connection) not in (None, os.getuid()):
+            return
+        line = self.rfile.readline()
+        if not line:
+            return
+        message = json.loads(line)
+        agent = self.server.agent
+        control = message.get("control")
+        if control == "status":
+            _send(self.connection, agent.status())
+        elif control == "stop":
+            _send(self.connection, {"stopping": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif "argv" in message:
+            agent.execute(
+                self.connection,
+                message["argv"],
+                message["cwd"],
+                message.get("tty"),
+                message.get("verbosity", 0),
+            )
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class Agent:
+    """Executes forwarded commands inside one long-lived process"""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT):
+        # Imported here to warm up the process once for all commands
+        import builtins
+
+        import fire
+
+        from tecli import auth, config, log
+        from tecli.commands import Commands
+
+        self.builtins = builtins
+        self.fire = fire
+        self.auth = auth
+        self.config = config
+        self.commands = Commands
+        self.log = log
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_activity = time.time()
+        self.requests = 0
+
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at),
+            "requests": self.requests,
+        }
+
+    def execute(self, sock, argv, cwd, tty=False, verbosity=0):
+        """Run a command with its output streamed to `sock`"""
+        send_lock = threading.Lock()
+        stdout = _FrameWriter(sock, "stdout", send_lock, tty)
+        stderr = _FrameWriter(sock, "stderr", send_lock, tty)
+        root = logging.getLogger()
+        client_handler = logging.StreamHandler(stderr)
+        client_handler.setFormatter(logging.Formatter(self.log.FORMAT, self.log.DATE_FORMAT))
+        client_handler.setLevel(self.log.level_for(verbosity))
+
+        # The working directory, standard streams and logging handlers are
+        # process-wide, so commands run one at a time.
+        with self.lock:
+            self.requests += 1
+            self.last_activity = time.time()
+            exit_code = 0
+            previous_dir = os.getcwd()
+            previous_handlers = root.handlers[:]
+            previous_level = root.level
+            previous_input = self.builtins.input
+            root.handlers = [client_handler]
+            root.setLevel(client_handler.level)
+            self.builtins.input = _no_input
+            try:
+                os.chdir(cwd)
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    self.fire.Fire(self.commands, command=argv, name="trends")
+            except SystemExit as error:
+                exit_code = error.code if isinstance(error.code, int) else 1
+            except Exception as error:
+                logging.error(error)
+                exit_code = 1
+            finally:
+                self.builtins.input = previous_input
+                root.handlers = previous_handlers
+                root.setLevel(previous_level)
+                os.chdir(previous_dir)
+                self.last_activity = time.time()
+        with send_lock, contextlib.suppress(OSError):
+            _send(sock, {"exit": exit_code})
+
+    def housekeeping(self, server):
+        """Refresh the token ahead of expiry and stop when idle for too long"""
+        while True:
+            time.sleep(TOKEN_CHECK_INTERVAL)
+            if time.time() - self.last_activity > self.idle_timeout:
+                logging.info("Agent idle, shutting down")
+                server.shutdown()
+                return
+            with self.lock:
+                try:
+                    if self.config.get("refresh_token") and self.auth.is_token_expired():
+                        self.auth.refresh_access_token()
+                except Exception as error:
+                    logging.error(error)
+
+    def serve(self):
+        """Listen on the agent socket until stopped"""
+        path = socket_path()
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        if not private_dir(os.path.dirname(path)):
+            logging.error(
+                "Not starting the agent: %s is not a private directory of this user",
+                os.path.dirname(path),
+            )
+            return
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        with _Server(path, _Handler) as server:
+            os.chmod(path, 0o600)
+            server.agent = self
+            threading.Thread(target=self.housekeeping, args=(server,), daemon=True).start()
+            logging.info("Agent %s listening on %s", os.getpid(), path)
+            try:
+                server.serve_forever()
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+
+
+def start(foreground=False):
+    """Start the agent in the background (or in this process)"""
+    if _request({"control": "status"}):
+        print("The trends agent is already running")
+        return True
+    if foreground:
+        Agent().serve()
+        return True
+
+    os.makedirs(os.path.dirname(log_path()), exist_ok=True)
+    with open(log_path(), "ab") as log_file:
+        subprocess.Popen(
+            [sys.executable, "-m", "tecli.agent"],
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=log_file,
+            start_new_session=True,
+        )
+    for _ in range(50):
+        if _request({"control": "status"}, timeout=1):
+            print(f"The trends agent is listening on {socket_path()}")
+            return True
+        time.sleep(0.1)
+    logging.error("The agent did not start, see %s", log_path())
+    return False
+
+
+def stop():
+    """Stop a running agent"""
+    if _request({"control": "stop"}) is None:
+        print("The trends agent is not running")
+    return True
+
+
+def status():
+    """Print the state of the agent"""
+    reply = _request({"control": "status"})
+    if reply is None:
+        print("The trends agent is not running")
+    else:
+        print(
+            f"The trends agent is running (pid {reply['pid']}, up {reply['uptime']}s, "
+            f"{reply['requests']} requests served)"
+        )
+    return True
+
+
+ACTIONS = {"start": start, "stop": stop, "status": status}
+
+
+def run(action="status", foreground=False):
+    """Agent command"""
+    if not hasattr(socket, "AF_UNIX"):
+        logging.error("The agent requires Unix domain sockets")
+        return False
+    if action not in ACTIONS:
+        logging.error("Action not found")
+        return False
+    if action == "start":
+        return start(foreground)
+    return ACTIONS[action]()
+
+
+if __name__ == "__main__":
+    from tecli import log
+
+    log.setup(verbosity=1)
+    run("start", foreground=True)
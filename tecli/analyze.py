@@ -0,0 +1,171 @@
+"""Analyze command
+
+Runs the project's run() against tecli.sdk.eegraph.StubEE instead of Earth
+Engine, and reports the size of the expression graph of every getInfo()
+and export it makes. It needs no credentials or network, so CI can catch
+graphs that grew too large before they cost hours of server time.
+"""
+
+import contextlib
+import importlib
+import json
+import logging
+import os
+import sys
+import types
+
+from termcolor import colored
+
+from tecli import start
+from tecli.sdk import eegraph
+from tecli.sdk.executor import GeeRunner
+
+# Package name under which the project's src folder is imported
+SCRIPT_PACKAGE = "tecli_analyzed_script"
+DUPLICATED_ROWS = 5
+
+
+class ScriptLogger(logging.LoggerAdapter):
+    """Logger given to the script, with the send_progress() of the platform's"""
+
+    def send_progress(self, progress):
+        self.debug("Progress: %s", progress)
+
+
+@contextlib.contextmanager
+def stubbed(ee):
+    """Import `ee` as the ee module within the block"""
+    previous = sys.modules.get("ee")
+    sys.modules["ee"] = ee
+    try:
+        yield
+    finally:
+        if previous is None:
+            sys.modules.pop("ee", None)
+        else:
+            sys.modules["ee"] = previous
+        for name in list(sys.modules):
+            if name == SCRIPT_PACKAGE or name.startswith(SCRIPT_PACKAGE + "."):
+                del sys.modules[name]
+
+
+def import_script(src_dir):
+    """The main module of the script in `src_dir`, imported as a package"""
+    package = types.ModuleType(SCRIPT_PACKAGE)
+    package.__path__ = [src_dir]
+    sys.modules[SCRIPT_PACKAGE] = package
+    return importlib.import_module(SCRIPT_PACKAGE + ".main")
+
+
+def analyze_script(src_dir, params, length=eegraph.DEFAULT_LENGTH):
+    """The getInfo() calls and exports of the script's run(), recorded by a stub"""
+    ee = eegraph.StubEE(length=length)
+    with stubbed(ee):
+        script = import_script(src_dir)
+        logger = ScriptLogger(logging.getLogger("script"), {})
+        if start.run_takes_gee_runner(src_dir):
+            with GeeRunner() as gee_runner:
+                script.run(params, logger, gee_runner)
+        else:
+            script.run(params, logger)
+    return ee.computations
+
+
+def summarize(computations):
+    """One row per distinct graph, with how many times it was computed or exported"""
+    rows = {}
+    for computation in computations:
+        key = (
+            computation.kind,
+            computation.function,
+            computation.location,
+            json.dumps(computation.expression, sort_keys=True, default=str),
+        )
+        if key in rows:
+            rows[key]["count"] += 1
+            continue
+        rows[key] = {
+            "kind": computation.kind,
+            "function": computation.function,
+            "location": computation.location,
+            "count": 1,
+            **eegraph.analyze_expression(computation.expression).to_dict(),
+        }
+    return list(rows.values())
+
+
+def check(graphs, thresholds):
+    """Descriptions of the thresholds the graphs of a script exceed"""
+    warnings = []
+    for graph in graphs:
+        stats = eegraph.GraphStats(
+            graph["nodes"], graph["expanded_nodes"], graph["depth"], graph["payload_bytes"]
+        )
+        for message in thresholds.exceeded(stats):
+            warnings.append(f"{graph['function']} ({graph['location']}): {message}")
+    getinfo_calls = sum(graph["count"] for graph in graphs if graph["kind"] == "getInfo")
+    if thresholds.max_getinfo is not None and getinfo_calls > thresholds.max_getinfo:
+        warnings.append(
+            f"{getinfo_calls} blocking getInfo() calls (limit {thresholds.max_getinfo})"
+        )
+    return warnings
+
+
+def print_report(graphs, warnings):
+    print(
+        f"{'kind':<8} {'count':>5} {'nodes':>7} {'expanded':>10} {'depth':>6} {'payload':>10}"
+        "  function"
+    )
+    for graph in graphs:
+        print(
+            f"{graph['kind']:<8} {graph['count']:>5} {graph['nodes']:>7} "
+            f"{graph['expanded_nodes']:>10} {graph['depth']:>6} "
+            f"{start.format_bytes(graph['payload_bytes']):>10}  "
+            f"{graph['function']} ({graph['location']})"
+        )
+    for graph in graphs:
+        if not graph["duplicated"]:
+            continue
+        print(colored(f"\nShared subgraphs of {graph['function']} ({graph['location']}):", "cyan"))
+        for entry in graph["duplicated"][:DUPLICATED_ROWS]:
+            print(f"{entry['uses']:>6} uses  {entry['size']:>8} nodes  {entry['function']}")
+    getinfo_calls = sum(graph["count"] for graph in graphs if graph["kind"] == "getInfo")
+    print(f"\nBlocking getInfo() calls: {getinfo_calls}")
+    for warning in warnings:
+        print(colored(f"Warning: {warning}", "yellow"))
+
+
+def run(
+    param="",
+    payload="",
+    length=eegraph.DEFAULT_LENGTH,
+    as_json=False,
+    thresholds=None,
+):
+    """Analyze command
+
+    Returns False when the script could not be run against the stub or one
+    of its graphs exceeds `thresholds` (a tecli.sdk.eegraph.Thresholds).
+    """
+    thresholds = thresholds or eegraph.Thresholds()
+    try:
+        params = start.read_params(param, payload)
+    except Exception as error:
+        logging.error(error)
+        return False
+
+    src_dir = os.path.join(os.getcwd(), "src")
+    try:
+        computations = analyze_script(src_dir, params, int(length))
+    except Exception as error:
+        logging.debug("Analysis failed", exc_info=True)
+        logging.error("The script failed against the stub ee module: %r", error)
+        return False
+
+    graphs = summarize(computations)
+    warnings = check(graphs, thresholds)
+    if as_json:
+        print(json.dumps({"graphs": graphs, "warnings": warnings}, indent=2))
+    else:
+        print_report(graphs, warnings)
+    return not warnings
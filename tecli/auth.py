@@ -1,81 +1,163 @@
 """Authentication utilities for tecli"""
 
+import base64
+import json
 import logging
+import threading
 from datetime import datetime, timedelta
 
 import requests
 
-from tecli import config
+from tecli import config, log, ratelimit
+
+_session = None
+
+# Serializes refreshes so concurrent callers do not each spend the refresh token
+_refresh_lock = threading.Lock()
+# Tokens expiring within this margin are refreshed ahead of time
+EXPIRY_MARGIN = timedelta(minutes=5)
+
+
+def session():
+    """Shared requests session, so connections are reused across requests"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
 
 
 def refresh_access_token():
     """Refresh the access token using the refresh token"""
+    with log.timed("token_refresh") as timing:
+        timing["refreshed"] = refreshed = _refresh_access_token()
+    return refreshed
+
+
+def _refresh_access_token():
     refresh_token = config.get("refresh_token")
     if not refresh_token:
         logging.debug("No refresh token available, need to login again")
         return False
 
     try:
-        response = requests.post(
-            url=config.get("url_api") + "/auth/refresh", json={"refresh_token": refresh_token}
+        response = ratelimit.request(
+            session(),
+            "POST",
+            config.get("url_api") + "/auth/refresh",
+            json={"refresh_token": refresh_token},
         )
 
         if response.status_code == 200:
-            body = response.json()
-            # Update tokens in config
-            config.set("JWT", body["access_token"])
-            if "refresh_token" in body:
-                config.set("refresh_token", body["refresh_token"])
-
-            # Update token expiration time
-            if "expires_in" in body:
-                expires_at = datetime.now() + timedelta(seconds=body["expires_in"])
-                config.set("token_expires_at", expires_at.isoformat())
+            store_tokens(response.json())
 
             logging.debug("Access token refreshed successfully")
             return True
         else:
-            logging.debug(f"Token refresh failed with status {response.status_code}")
-            # Clear invalid tokens
-            config.unset("refresh_token", "")
-            config.unset("JWT", "")
-            config.unset("token_expires_at", "")
+            logging.debug("Token refresh failed with status %s", response.status_code)
+            clear_tokens()
             return False
 
     except Exception as e:
-        logging.debug(f"Error refreshing token: {e}")
+        logging.debug("Error refreshing token: %s", e)
         return False
 
 
-def is_token_expired():
-    """Check if the current access token is expired"""
-    expires_at_str = config.get("token_expires_at")
-    if not expires_at_str:
-        return True  # No expiration info, assume expired
+def store_tokens(body):
+    """Store the tokens of an /auth or /auth/refresh response, in one write"""
+    values = {"JWT": body["access_token"]}
+    if "refresh_token" in body:
+        values["refresh_token"] = body["refresh_token"]
+    if "expires_in" in body:
+        expires_at = datetime.now() + timedelta(seconds=body["expires_in"])
+        values["token_expires_at"] = expires_at.isoformat()
+    config.update(values)
+
+
+def clear_tokens():
+    """Forget the stored access and refresh tokens"""
+    config.update({"refresh_token": None, "JWT": None, "token_expires_at": None})
+
+
+def token_claims(token):
+    """Claims of a JWT, or {} if it cannot be decoded
 
+    The signature is not checked, the server does that.
+    """
     try:
-        expires_at = datetime.fromisoformat(expires_at_str)
-        # Consider token expired if it expires within 5 minutes
-        buffer_time = timedelta(minutes=5)
-        return datetime.now() + buffer_time >= expires_at
-    except (ValueError, TypeError):
-        return True  # Invalid expiration format, assume expired
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+def token_expiry(token):
+    """Expiration time in the `exp` claim of a JWT, or None"""
+    try:
+        return datetime.fromtimestamp(token_claims(token)["exp"])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+
+
+def identity():
+    """Who requests are made as: the subject of the access token, else the email"""
+    subject = token_claims(config.get("JWT")).get("sub")
+    return str(subject) if subject is not None else config.get("email") or None
+
+
+def token_expires_at():
+    """Expiration time of the current access token, or None if unknown"""
+    expires_at_str = config.get("token_expires_at")
+    if expires_at_str:
+        try:
+            return datetime.fromisoformat(expires_at_str)
+        except (ValueError, TypeError):
+            return None
+    # e.g. a token given by TECLI_JWT
+    return token_expiry(config.get("JWT"))
+
+
+def expires_soon(expires_at):
+    """Whether a token expiring at `expires_at` needs refreshing
+
+    Tokens without (valid) expiration info are assumed expired.
+    """
+    return expires_at is None or datetime.now() + EXPIRY_MARGIN >= expires_at
+
+
+def is_token_expired():
+    """Check if the current access token is expired"""
+    return expires_soon(token_expires_at())
 
 
 def get_valid_token():
     """Get a valid access token, refreshing if necessary"""
     # Check if current token is expired
     if is_token_expired():
-        logging.debug("Token is expired or about to expire, attempting refresh")
-        if not refresh_access_token():
-            logging.debug("Token refresh failed, need to login again")
-            return None
+        with _refresh_lock:
+            # Another thread may have refreshed it while this one waited
+            if is_token_expired():
+                logging.debug("Token is expired or about to expire, attempting refresh")
+                if not refresh_access_token():
+                    logging.debug("Token refresh failed, need to login again")
+                    return None
 
     return config.get("JWT")
 
 
 def make_authenticated_request(method, url, **kwargs):
-    """Make an authenticated HTTP request with automatic token refresh"""
+    """Make an authenticated HTTP request with automatic token refresh
+
+    Requests are rate limited per host and retried on throttling, see
+    tecli.ratelimit.
+    """
+    with log.timed("authenticated_request", method=method, url=url) as timing:
+        response = _make_authenticated_request(method, url, **kwargs)
+        timing["status"] = response.status_code if response is not None else None
+    return response
+
+
+def _make_authenticated_request(method, url, **kwargs):
     token = get_valid_token()
     if not token:
         logging.error("No valid token available. Please login first.")
@@ -87,17 +169,21 @@ def make_authenticated_request(method, url, **kwargs):
     kwargs["headers"] = headers
 
     # Make the request
-    response = getattr(requests, method.lower())(url, **kwargs)
+    response = ratelimit.request(session(), method, url, **kwargs)
 
     # If we get a 401, try to refresh the token once and retry
     if response.status_code == 401:
         logging.debug("Got 401 response, attempting to refresh token")
-        if refresh_access_token():
+        with _refresh_lock:
+            # Skip the refresh when another thread already replaced the token
+            current = config.get("JWT")
+            refreshed = bool(current and current != token) or refresh_access_token()
+        if refreshed:
             # Update the token in headers and retry
             token = config.get("JWT")
             headers["Authorization"] = f"Bearer {token}"
             kwargs["headers"] = headers
-            response = getattr(requests, method.lower())(url, **kwargs)
+            response = ratelimit.request(session(), method, url, **kwargs)
         else:
             logging.error("Token refresh failed. Please login again.")
 
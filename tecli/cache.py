@@ -0,0 +1,111 @@
+"""Local on-disk cache"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+def default_dir(name):
+    """Return the default cache directory for `name` under ~/.cache/tecli"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tecli", name)
+
+
+def make_key(*parts):
+    """Content-addressed key from strings, bytes or JSON-serializable parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class Cache:
+    """Size-bounded LRU cache of JSON entries stored one file per key.
+
+    Recency is tracked with the file modification time, which is refreshed on
+    every hit, so eviction needs no index file and concurrent CLI invocations
+    sharing a directory cannot corrupt each other's state.
+    """
+
+    def __init__(self, path, max_size=512 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key):
+        """Return the entry stored under `key`, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path) as infile:
+                entry = json.load(infile)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def set(self, key, entry, evict=True):
+        """Store `entry` under `key` and evict old entries if needed
+
+        Eviction scans the whole directory; callers replacing an entry with
+        one of about the same size can skip it with `evict=False`.
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as outfile:
+                json.dump(entry, outfile)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if evict:
+            self.evict()
+
+    def delete(self, key):
+        """Remove the entry stored under `key`"""
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Remove every entry"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_size"""
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logging.debug("Evicted cache entry %s", path)
+            except FileNotFoundError:
+                pass
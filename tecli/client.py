@@ -0,0 +1,398 @@
+"""Programmatic client for the trends.earth API
+
+`Client` is a blocking client built on the CLI's own authentication helpers,
+so it shares their connection pool and token refresh. `AsyncClient` exposes
+the same operations as coroutines for running many requests concurrently;
+it needs the optional httpx dependency (``pip install trends-earth-cli[async]``).
+
+    from tecli.client import AsyncClient
+
+    async with AsyncClient() as client:
+        scripts = await asyncio.gather(*(client.get_script(i) for i in ids))
+
+Both read the API URL and tokens from ~/.tecli.yml (see `trends login`) and
+raise ApiError when a request fails.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tarfile
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from datetime import datetime, timezone
+from typing import Any
+
+import requests
+
+from tecli import auth, config, jsonstream, log, ratelimit, sync
+from tecli.http_cache import HttpCache
+
+MAX_CONNECTIONS = 1000
+MAX_KEEPALIVE_CONNECTIONS = 100
+TIMEOUT = 60.0
+
+
+class ApiError(Exception):
+    """An API request did not succeed"""
+
+    def __init__(self, status_code: int | None, body: Any = None) -> None:
+        self.status_code = status_code
+        self.body = body
+        super().__init__(f"API request failed with status {status_code}: {body}")
+
+
+class AuthenticationError(ApiError):
+    """There is no valid token, the user has to login again"""
+
+    def __init__(self) -> None:
+        super().__init__(None, "No valid token available. Please login first.")
+
+
+def _response_body(response: Any) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def _log_params(start: datetime | None) -> dict[str, str]:
+    if start is None:
+        return {}
+    # Same naive UTC format as the API's own timestamps
+    return {"start": start.astimezone(timezone.utc).replace(tzinfo=None).isoformat()}
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as infile:
+        return infile.read()
+
+
+class _BaseClient:
+    def __init__(self, url_api: str | None = None) -> None:
+        self._url_api = url_api
+
+    @property
+    def url_api(self) -> str:
+        return self._url_api or config.get("url_api")
+
+    def _url(self, path: str) -> str:
+        return self.url_api + path
+
+    @staticmethod
+    def _script_path(script_id: str, suffix: str = "") -> str:
+        return f"/api/v1/script/{script_id}{suffix}"
+
+
+class Client(_BaseClient):
+    """Blocking trends.earth API client
+
+    With an `http_cache`, metadata GETs are revalidated with conditional
+    requests and answered from the cache on 304 or while the API is down.
+    """
+
+    def __init__(self, url_api: str | None = None, http_cache: HttpCache | None = None) -> None:
+        super().__init__(url_api)
+        self.http_cache = http_cache
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+        response = auth.make_authenticated_request(method, self._url(path), **kwargs)
+        if response is None:
+            raise AuthenticationError()
+        if response.status_code != 200:
+            raise ApiError(response.status_code, _response_body(response))
+        return response
+
+    def _get_json(self, path: str) -> Any:
+        if self.http_cache is None:
+            return self._request("GET", path).json()
+
+        url = self._url(path)
+        entry = self.http_cache.lookup(url)
+        try:
+            response = auth.make_authenticated_request(
+                "GET", url, headers=self.http_cache.conditional_headers(entry)
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            body = self.http_cache.offline_body(entry)
+            if body is None:
+                raise
+            return body
+
+        if response is None:
+            raise AuthenticationError()
+        if response.status_code == 304 and entry:
+            return self.http_cache.revalidated(url, entry, response)
+        if response.status_code != 200:
+            raise ApiError(response.status_code, _response_body(response))
+        body = response.json()
+        self.http_cache.save(url, response, body)
+        return body
+
+    def get_script(self, script_id: str) -> dict[str, Any]:
+        """Return the script's metadata"""
+        return self._get_json(self._script_path(script_id))["data"]
+
+    def iter_logs(self, script_id: str, start: datetime | None = None) -> Iterator[dict[str, Any]]:
+        """Return the script's log entries since `start` as a streaming iterator
+
+        The request is sent right away, so errors are raised by this call and
+        not by the iteration.
+        """
+        response = self._request(
+            "GET", self._script_path(script_id, "/log"), params=_log_params(start), stream=True
+        )
+        return jsonstream.iter_response_items(response, ("data",))
+
+    def iter_script_logs(self, script_id: str, script: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        """Stream the script's whole log history, filling `script` with its metadata
+
+        The metadata members that follow the logs in the response are only
+        available once the iterator is exhausted.
+        """
+        response = self._request(
+            "GET", self._script_path(script_id), params={"include": "logs"}, stream=True
+        )
+        return jsonstream.iter_response_items(response, ("data", "logs"), {"data": script})
+
+    def publish(
+        self, archive: str, script_id: str | None = None, public: bool = False
+    ) -> dict[str, Any]:
+        """Upload a script archive, as a new script or over `script_id`
+
+        Returns the script's metadata.
+        """
+        with open(archive, "rb") as infile:
+            if script_id:
+                response = self._request(
+                    "PATCH", self._script_path(script_id), files={"file": infile}
+                )
+            else:
+                response = self._request("POST", "/api/v1/script", files={"file": infile})
+        data = response.json()["data"]
+        if public:
+            self.make_public(data["id"])
+        return data
+
+    def make_public(self, script_id: str) -> None:
+        """Make a published script public"""
+        self._request("POST", self._script_path(script_id, "/publish"))
+
+    def download(self, script_id: str, path: str | None = None) -> str:
+        """Extract the script's archive into `path` (./<script_id> by default)"""
+        path = path or os.path.join(".", script_id)
+        response = self._request("GET", self._script_path(script_id, "/download"), stream=True)
+        with tarfile.open(mode="r|gz", fileobj=response.raw) as tar:
+            sync.write_manifest(path, sync.extract_archive(tar, path))
+        return path
+
+    def sync(
+        self, script_id: str, path: str | None = None, jobs: int = sync.DEFAULT_JOBS
+    ) -> dict[str, list[str]]:
+        """Update `path` (./<script_id> by default) to the script's archive
+
+        Only files that changed are written; see tecli.sync.
+        """
+        path = path or os.path.join(".", script_id)
+        response = self._request("GET", self._script_path(script_id, "/download"), stream=True)
+        with log.timed("sync", script=script_id):
+            return sync.sync_archive(response.raw, path, jobs)
+
+    def logout(self, all_sessions: bool = False) -> None:
+        """Revoke the current session (or all of them) and forget the tokens"""
+        self._request("POST", "/auth/logout-all" if all_sessions else "/auth/logout")
+        auth.clear_tokens()
+        if self.http_cache is not None:
+            self.http_cache.clear()
+
+
+class AsyncClient(_BaseClient):
+    """Asynchronous trends.earth API client
+
+    One instance holds a pool of up to `max_connections` connections that all
+    of its requests share, so thousands of coroutines can have requests in
+    flight at once. An expired token is refreshed once for all of them, and
+    requests share the per-host rate limiter and retry policy of the CLI.
+    Use it as an async context manager, or call aclose() when done.
+    """
+
+    def __init__(
+        self,
+        url_api: str | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        timeout: float = TIMEOUT,
+    ) -> None:
+        try:
+            import httpx
+        except ImportError as error:
+            raise ImportError(
+                "AsyncClient requires httpx, install it with: pip install trends-earth-cli[async]"
+            ) from error
+
+        super().__init__(url_api)
+        self._httpx = httpx
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(max_connections, MAX_KEEPALIVE_CONNECTIONS),
+            ),
+            timeout=timeout,
+        )
+        self._refresh_lock: asyncio.Lock | None = None
+        # The access token and its expiration, read from the config by _load_token()
+        self._cached_token: str | None = None
+        self._token_expires_at: datetime | None = None
+
+    async def __aenter__(self) -> AsyncClient:
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the connection pool"""
+        await self._http.aclose()
+
+    def _load_token(self) -> None:
+        """Read the access token and its expiration from the config (blocking)"""
+        self._cached_token = config.get("JWT")
+        self._token_expires_at = auth.token_expires_at()
+
+    def _usable_token(self, rejected: str | None) -> str | None:
+        token = self._cached_token
+        if token and token != rejected and not auth.expires_soon(self._token_expires_at):
+            return token
+        return None
+
+    async def _token(self, rejected: str | None = None) -> str:
+        """Return a valid token, refreshing it when expired or `rejected`
+
+        The token is kept on the client, so the config is only read, in a
+        thread, when the token is missing, expiring or was rejected.
+        """
+        token = self._usable_token(rejected)
+        if token:
+            return token
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # Another request may have loaded or refreshed it while this one waited
+            token = self._usable_token(rejected)
+            if token:
+                return token
+            # Another process may have refreshed it
+            await asyncio.to_thread(self._load_token)
+            token = self._usable_token(rejected)
+            if token:
+                return token
+            if not await asyncio.to_thread(auth.refresh_access_token):
+                raise AuthenticationError()
+            await asyncio.to_thread(self._load_token)
+            if not self._cached_token:
+                raise AuthenticationError()
+            return self._cached_token
+
+    async def _send(self, method: str, path: str, stream: bool = False, **kwargs: Any) -> Any:
+        url = self._url(path)
+        token = await self._token()
+        retrying = ratelimit.Retrying(method, url)
+        refreshed = False
+        while True:
+            wait = retrying.throttle()
+            if wait:
+                await asyncio.sleep(wait)
+            request = self._http.build_request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+            try:
+                with log.timed("http_request", method=method, url=url) as timing:
+                    response = await self._http.send(request, stream=stream)
+                    timing["status"] = response.status_code
+            except self._httpx.TransportError as error:
+                delay = retrying.retry_delay(error=error)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code == 401 and not refreshed:
+                    refreshed = True
+                    await response.aclose()
+                    token = await self._token(rejected=token)
+                    continue
+                delay = retrying.retry_delay(response)
+                if delay is None:
+                    break
+                await response.aclose()
+            if delay:
+                await asyncio.sleep(delay)
+
+        if response.status_code != 200:
+            if stream:
+                await response.aread()
+                await response.aclose()
+            raise ApiError(response.status_code, _response_body(response))
+        return response
+
+    async def get_script(self, script_id: str) -> dict[str, Any]:
+        """Return the script's metadata"""
+        response = await self._send("GET", self._script_path(script_id))
+        return response.json()["data"]
+
+    async def iter_logs(
+        self, script_id: str, start: datetime | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield the script's log entries since `start` as they are received"""
+        response = await self._send(
+            "GET", self._script_path(script_id, "/log"), stream=True, params=_log_params(start)
+        )
+        try:
+            async for entry in jsonstream.aiter_items(response.aiter_bytes(), ("data",)):
+                yield entry
+        finally:
+            await response.aclose()
+
+    async def publish(
+        self, archive: str, script_id: str | None = None, public: bool = False
+    ) -> dict[str, Any]:
+        """Upload a script archive, as a new script or over `script_id`
+
+        Returns the script's metadata.
+        """
+        files = {"file": (os.path.basename(archive), await asyncio.to_thread(_read_file, archive))}
+        if script_id:
+            response = await self._send("PATCH", self._script_path(script_id), files=files)
+        else:
+            response = await self._send("POST", "/api/v1/script", files=files)
+        data = response.json()["data"]
+        if public:
+            await self.make_public(data["id"])
+        return data
+
+    async def make_public(self, script_id: str) -> None:
+        """Make a published script public"""
+        await self._send("POST", self._script_path(script_id, "/publish"))
+
+    async def download(self, script_id: str, path: str | None = None) -> str:
+        """Extract the script's archive into `path` (./<script_id> by default)"""
+        path = path or os.path.join(".", script_id)
+        response = await self._send("GET", self._script_path(script_id, "/download"), stream=True)
+        # Spooled to disk rather than held in memory, then extracted in a thread
+        with tempfile.TemporaryFile() as archive:
+            try:
+                async for chunk in response.aiter_bytes(sync.CHUNK_SIZE):
+                    await asyncio.to_thread(archive.write, chunk)
+            finally:
+                await response.aclose()
+
+            def extract() -> None:
+                archive.seek(0)
+                with tarfile.open(mode="r:gz", fileobj=archive) as tar:
+                    sync.write_manifest(path, sync.extract_archive(tar, path))
+
+            await asyncio.to_thread(extract)
+        return path
+
+    async def logout(self, all_sessions: bool = False) -> None:
+        """Revoke the current session (or all of them) and forget the tokens"""
+        await self._send("POST", "/auth/logout-all" if all_sessions else "/auth/logout")
+        auth.clear_tokens()
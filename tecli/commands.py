@@ -1,11 +1,27 @@
 """Wrapper for the CLI commands."""
 
 import logging
+import sys
 from datetime import timedelta
 
 from termcolor import colored
 
-from tecli import clear, config, create, download, info, login, logout, logs, publish, start
+from tecli import (
+    agent,
+    analyze,
+    clear,
+    config,
+    create,
+    download,
+    info,
+    login,
+    logmux,
+    logout,
+    logs,
+    publish,
+    start,
+)
+from tecli.sdk import eegraph
 
 
 class Commands:
@@ -24,17 +40,69 @@ class Commands:
             logging.error(error)
 
     @staticmethod
-    def start(queryParams="", payload=""):
+    def start(
+        queryParams="",
+        payload="",
+        cache=False,
+        cache_dir="",
+        no_cache=False,
+        profile=None,
+        getinfo_cache=False,
+        optimized=False,
+        startup=False,
+        batch_logs=False,
+    ):
         """Start a script"""
         try:
             print("Running the script")
-            if start.run(queryParams, payload):
+            if start.run(
+                queryParams,
+                payload,
+                cache,
+                cache_dir,
+                no_cache,
+                profile,
+                getinfo_cache,
+                optimized,
+                startup,
+                batch_logs,
+            ):
                 print(colored("Execution Finished", "green"))
             else:
                 print(colored("Error running the script", "red"))
         except Exception as error:
             logging.error(error)
 
+    @staticmethod
+    def analyze(
+        queryParams="",
+        payload="",
+        json=False,
+        length=eegraph.DEFAULT_LENGTH,
+        max_nodes=eegraph.DEFAULT_MAX_NODES,
+        max_expanded_nodes=eegraph.DEFAULT_MAX_EXPANDED_NODES,
+        max_depth=eegraph.DEFAULT_MAX_DEPTH,
+        max_payload_bytes=eegraph.DEFAULT_MAX_PAYLOAD_BYTES,
+        max_getinfo=eegraph.DEFAULT_MAX_GETINFO,
+    ):
+        """Report the size of the script's Earth Engine expression graphs"""
+        thresholds = eegraph.Thresholds(
+            max_nodes, max_expanded_nodes, max_depth, max_payload_bytes, max_getinfo
+        )
+        try:
+            if not json:
+                print("Analyzing the script")
+            if analyze.run(queryParams, payload, length, json, thresholds):
+                if not json:
+                    print(colored("Expression graphs within the thresholds", "green"))
+                return
+            if not json:
+                print(colored("Error analyzing the script", "red"))
+        except Exception as error:
+            logging.error(error)
+        # Fail CI jobs
+        sys.exit(1)
+
     @staticmethod
     def config(action, var_name, value=None):
         """Config GEE"""
@@ -78,11 +146,13 @@ class Commands:
             logging.error(error)
 
     @staticmethod
-    def publish(public=False, overwrite=False):
-        """Publish a script"""
+    def publish(public=False, overwrite=False, workspace=None, jobs=None):
+        """Publish a script, or every project of a --workspace directory"""
         try:
-            print("Publishing the script")
-            if publish.run(public, overwrite):
+            print(
+                f"Publishing the scripts in {workspace}" if workspace else "Publishing the script"
+            )
+            if publish.run(public, overwrite, workspace, jobs):
                 print(colored("Script published successfully", "green"))
             else:
                 print(colored("Error publishing the script", "red"))
@@ -90,11 +160,11 @@ class Commands:
             logging.error(error)
 
     @staticmethod
-    def download(script_id=None):
-        """Download a script"""
+    def download(script_id=None, sync=False, jobs=None):
+        """Download a script, or only its changes with --sync"""
         try:
-            print("Downloading the script")
-            if download.run(script_id):
+            print("Synchronizing the script" if sync else "Downloading the script")
+            if download.run(script_id, sync, jobs):
                 print(colored("Script downloaded successfully", "green"))
             else:
                 print(colored("Error downloading the script", "red"))
@@ -114,11 +184,15 @@ class Commands:
             logging.error(error)
 
     @staticmethod
-    def info():
-        """Get info script"""
+    def info(workspace=None, jobs=None):
+        """Get info script, or of every project of a --workspace directory"""
         try:
-            print("Getting info script")
-            if info.run():
+            print(
+                f"Getting info of the scripts in {workspace}"
+                if workspace
+                else "Getting info script"
+            )
+            if info.run(workspace, jobs):
                 pass
             else:
                 print(colored("Error getting info script", "red"))
@@ -126,9 +200,13 @@ class Commands:
             logging.error(error)
 
     @staticmethod
-    def logs(since=timedelta(hours=1)):
-        """Get logs of script"""
+    def logs(since=timedelta(hours=1), ids=None, workspace=None, jsonl=False, rate=None):
+        """Get logs of script, or follow several with --ids and/or --workspace"""
         try:
+            if ids or workspace:
+                if not logmux.run(ids, workspace, since, jsonl, rate):
+                    print(colored("Error getting logs", "red"))
+                return
             print("Getting logs of script build")
             if logs.run(since):
                 pass
@@ -138,3 +216,12 @@ class Commands:
             raise
         except Exception as error:
             logging.error(error)
+
+    @staticmethod
+    def agent(action="status", foreground=False):
+        """Manage the background agent (start, stop, status)"""
+        try:
+            if not agent.run(action, foreground):
+                print(colored("Error managing the agent", "red"))
+        except Exception as error:
+            logging.error(error)
@@ -1,55 +1,148 @@
-"""Config command"""
+"""Config command
 
+With TECLI_STATELESS=1 the config file is neither read nor written: the
+settings start from the TECLI_* variables of ENV_SETTINGS and every change
+(e.g. a refreshed token) is kept in memory for the life of the process.
+This suits CI jobs, which then need no ~/.tecli.yml and do not contend on
+a shared one.
+"""
+
+import functools
 import logging
 import os
+import threading
 
 import yaml
 
+from tecli import log
+
 config_path = os.path.expanduser("~") + "/.tecli.yml"
 
+STATELESS_ENV = "TECLI_STATELESS"
+# Settings given by environment variables in stateless mode
+ENV_SETTINGS = {
+    "TECLI_JWT": "JWT",
+    "TECLI_REFRESH_TOKEN": "refresh_token",
+    "TECLI_URL_API": "url_api",
+}
+
 # Default values that can be altered in local .tecli.yml file
-settings = {"url_api": "https://api.trends.earth"}
+DEFAULTS = {"url_api": "https://api.trends.earth"}
+settings = dict(DEFAULTS)
+
+# (mtime, size) of the config file when it was last parsed, or STATELESS
+# once the environment was merged in stateless mode
+_loaded_stat = None
+STATELESS = "stateless"
+_lock = threading.RLock()
+
+
+def _locked(function):
+    """Run `function` holding the lock of the settings
+
+    Threads (e.g. of the agent, or concurrent token refreshes) would
+    otherwise see the settings while a reload replaces them, or lose a
+    change made between another thread's load() and save().
+    """
+
+    @functools.wraps(function)
+    def locked(*args, **kwargs):
+        with _lock:
+            return function(*args, **kwargs)
+
+    return locked
+
+
+def stateless():
+    """Whether the settings live in memory only, see TECLI_STATELESS"""
+    return os.environ.get(STATELESS_ENV, "") not in ("", "0")
+
+
+@_locked
+def load():
+    """Merge the config file into settings if it changed since the last read
+
+    Parsing the YAML file dominates repeated config reads, so it is only done
+    when the file's modification time or size differ from the last parse.
+    That keeps long-running processes (e.g. the agent) in sync with changes
+    made by other invocations. In stateless mode the environment is merged
+    instead, once.
+    """
+    global settings, _loaded_stat
+    if stateless():
+        if _loaded_stat != STATELESS:
+            for name, key in ENV_SETTINGS.items():
+                if os.environ.get(name):
+                    settings[key] = os.environ[name]
+            _loaded_stat = STATELESS
+        return settings
+    with log.timed("config_read", parsed=False) as timing, open(config_path, "r+") as infile:
+        stat = os.fstat(infile.fileno())
+        if (stat.st_mtime_ns, stat.st_size) != _loaded_stat:
+            # Rebuilt rather than merged, so that keys another process removed
+            # (e.g. tokens, by `trends logout`) are not written back by save()
+            rebuilt = dict(DEFAULTS)
+            rebuilt.update(yaml.load(infile, Loader=yaml.FullLoader) or {})
+            settings = rebuilt
+            _loaded_stat = (stat.st_mtime_ns, stat.st_size)
+            timing["parsed"] = True
+    return settings
+
+
+@_locked
+def save():
+    """Write settings back to the config file, unless stateless"""
+    global _loaded_stat
+    if stateless():
+        return
+    with log.timed("config_write"), open(config_path, "w+") as outfile:
+        yaml.dump(settings, outfile, default_flow_style=False)
+        outfile.flush()
+        stat = os.fstat(outfile.fileno())
+        _loaded_stat = (stat.st_mtime_ns, stat.st_size)
+
+
+@_locked
+def set(var_name, value):
+    load()
+    settings[var_name] = value
+    save()
+    return True
 
 
-def set(var_name, value):
-    global settings
-    with open(config_path, "r+") as infile:
-        settings.update(yaml.load(infile, Loader=yaml.FullLoader))
-        with open(config_path, "w+") as outfile:
-            if settings is None:
-                settings = {}
+@_locked
+def update(values):
+    """Set several settings with a single write; None values are removed"""
+    load()
+    for var_name, value in values.items():
+        if value is None:
+            settings.pop(var_name, None)
+        else:
             settings[var_name] = value
-            yaml.dump(settings, outfile, default_flow_style=False)
+    save()
     return True
 
 
+@_locked
 def show(var_name, value):
-    global settings
-    with open(config_path, "r+") as infile:
-        settings.update(yaml.load(infile, Loader=yaml.FullLoader))
-        if settings is not None:
-            print("Value: " + str(settings[var_name]))
+    load()
+    print("Value: " + str(settings[var_name]))
     return True
 
 
+@_locked
 def get(var_name):
-    global settings
-    with open(config_path, "r+") as infile:
-        settings.update(yaml.load(infile, Loader=yaml.FullLoader))
-        if settings is not None and var_name in settings:
-            return settings[var_name]
-        return ""
-    return True
+    load()
+    if var_name in settings:
+        return settings[var_name]
+    return ""
 
 
+@_locked
 def unset(var_name, value):
-    global settings
-    with open(config_path, "r+") as infile:
-        settings.update(yaml.load(infile, Loader=yaml.FullLoader))
-        with open(config_path, "w+") as outfile:
-            if settings is not None:
-                settings.pop(var_name, None)
-                yaml.dump(settings, outfile, default_flow_style=False)
+    load()
+    settings.pop(var_name, None)
+    save()
     return True
 
 
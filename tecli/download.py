@@ -1,37 +1,43 @@
 """Download command"""
 
 import logging
-import tarfile
 
 from termcolor import colored
 
-from tecli import auth, config
+from tecli import sync
+from tecli.client import ApiError, AuthenticationError, Client
 
 
-def run(script_id=None):
-    """Download command"""
+def run(script_id=None, sync_files=False, jobs=None):
+    """Download command
+
+    With `sync_files`, only the files that changed since the last download
+    are written, and files removed from the script are deleted.
+    """
     if not script_id:
         logging.error("invalid script_id")
         return False
     try:
-        response = auth.make_authenticated_request(
-            "GET", config.get("url_api") + "/api/v1/script/" + script_id + "/download", stream=True
-        )
-
-        if response is None:
-            print(colored("Authentication failed. Please login.", "red"))
-            return False
-
-        if response.status_code != 200:
-            if response.status_code == 401:
-                print(colored("Do you need login", "red"))
-            else:
-                print(colored("Error obtaining info of script.", "red"))
-            return False
-            # path = os.getcwd() + '/' + configuration.get('id')
-        tar = tarfile.open(mode="r:gz", fileobj=response.raw)
-        tar.extractall(path="./" + script_id)
-
+        if sync_files:
+            result = Client().sync(script_id, "./" + script_id, jobs or sync.DEFAULT_JOBS)
+            print(
+                f"{len(result['written'])} files written, {len(result['unchanged'])} unchanged, "
+                f"{len(result['deleted'])} deleted"
+            )
+        else:
+            Client().download(script_id, "./" + script_id)
+    except sync.UnsafePathError as error:
+        print(colored(f"Refusing the unsafe path {error} of the archive", "red"))
+        return False
+    except AuthenticationError:
+        print(colored("Authentication failed. Please login.", "red"))
+        return False
+    except ApiError as error:
+        if error.status_code == 401:
+            print(colored("Do you need login", "red"))
+        else:
+            print(colored("Error obtaining info of script.", "red"))
+        return False
     except (KeyboardInterrupt, SystemExit):
         raise
     except Exception as error:
@@ -0,0 +1,124 @@
+"""On-disk cache of API responses revalidated with conditional requests
+
+Responses that carry an ETag or Last-Modified header are stored under
+~/.cache/tecli/http. The next GET of the same URL sends If-None-Match /
+If-Modified-Since, and a 304 answer is served from the stored body, so an
+unchanged resource costs a round trip but no body transfer. When the API
+cannot be reached, entries younger than the TTL are served as they are.
+
+Entries are keyed on the full URL, API base included, and on the identity
+of the user (see auth.identity()), so switching accounts or APIs without
+logging out never serves another one's responses.
+"""
+
+import logging
+import os
+import time
+
+from tecli import auth, cache, config
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE_MB = 64
+# Share of the TTL that the `stored_at` of a revalidated entry may lag by
+REFRESH_FRACTION = 0.1
+
+
+class HttpCache:
+    """Stores response bodies with their validators, evicted LRU by size"""
+
+    def __init__(
+        self,
+        path=None,
+        max_size=DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        ttl=DEFAULT_TTL,
+        identity=None,
+    ):
+        self.store = cache.Cache(path or cache.default_dir("http"), max_size)
+        self.ttl = ttl
+        self.identity = identity
+
+    def key(self, url):
+        return cache.make_key(self.identity, url)
+
+    def lookup(self, url):
+        """Return the stored entry for `url`, or None"""
+        entry = self.store.get(self.key(url))
+        if entry and entry.get("url") == url and entry.get("identity") == self.identity:
+            return entry
+        return None
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Headers that make a GET of the entry's URL conditional"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def save(self, url, response, body):
+        """Store a 200 response's JSON `body` if it can be revalidated later"""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        self.store.set(
+            self.key(url),
+            {
+                "url": url,
+                "identity": self.identity,
+                "etag": etag,
+                "last_modified": last_modified,
+                "stored_at": time.time(),
+                "body": body,
+            },
+        )
+
+    def revalidated(self, url, entry, response):
+        """Record a 304 answer for `entry` and return its body
+
+        Most 304s change nothing worth writing: lookup() already refreshed
+        the entry's recency, so it is only rewritten when its validators
+        changed or its `stored_at` lags by more than REFRESH_FRACTION of the
+        TTL (which only makes offline_body() stricter). The body is the same
+        size, so nothing needs evicting.
+        """
+        etag = response.headers.get("ETag") or entry.get("etag")
+        last_modified = response.headers.get("Last-Modified") or entry.get("last_modified")
+        now = time.time()
+        if (
+            etag != entry.get("etag")
+            or last_modified != entry.get("last_modified")
+            or now - entry["stored_at"] > self.ttl * REFRESH_FRACTION
+        ):
+            entry.update(etag=etag, last_modified=last_modified, stored_at=now)
+            self.store.set(self.key(url), entry, evict=False)
+        return entry["body"]
+
+    def offline_body(self, entry):
+        """The entry's body if it is recent enough to use without the API, else None"""
+        if entry and time.time() - entry["stored_at"] <= self.ttl:
+            logging.warning(
+                "API unreachable, using the response cached %ds ago",
+                time.time() - entry["stored_at"],
+            )
+            return entry["body"]
+        return None
+
+    def clear(self):
+        """Remove every stored response"""
+        self.store.clear()
+
+
+def from_config():
+    """The HTTP cache as configured in ~/.tecli.yml, or None when disabled"""
+    if str(config.get("http_cache")).lower() == "false":
+        return None
+    return HttpCache(
+        os.path.expanduser(config.get("http_cache_dir") or cache.default_dir("http")),
+        int(config.get("http_cache_max_size") or DEFAULT_MAX_SIZE_MB) * 1024 * 1024,
+        int(config.get("http_cache_ttl") or DEFAULT_TTL),
+        auth.identity(),
+    )
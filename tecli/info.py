@@ -1,24 +1,49 @@
 """Info command"""
 
-import json
 import logging
-import os
+from concurrent.futures import ThreadPoolExecutor
 
 from termcolor import colored
 
-from tecli import auth, config
+from tecli import config, http_cache, publish, workspace
+from tecli.client import ApiError, AuthenticationError, Client
+from tecli.workspace import read_configuration
 
 
-def read_configuration():
-    """Read configuration file of project"""
-    to_dir = os.getcwd()
-    logging.debug(f"Reading configuration file in path: {to_dir}")
-    with open(os.path.join(to_dir, "configuration.json")) as json_data:
-        d = json.load(json_data)
-        return d
+def script_status(client, path):
+    """(name, id, status or error) of the project in `path`"""
+    configuration = read_configuration(path)
+    name = configuration.get("name", path)
+    if "id" not in configuration:
+        return name, None, "NOT PUBLISHED"
+    try:
+        return name, configuration["id"], client.get_script(configuration["id"])["status"]
+    except AuthenticationError:
+        return name, configuration["id"], "Authentication failed. Please login."
+    except ApiError as error:
+        return name, configuration["id"], f"Error obtaining info of script ({error.status_code})"
+
+
+def workspace_info(root, jobs=publish.DEFAULT_JOBS):
+    """Print the status of every project of a workspace, fetched concurrently"""
+    projects = workspace.discover(root)
+    if not projects:
+        print(colored(f"No projects found in {root}", "red"))
+        return False
+
+    client = Client(http_cache=http_cache.from_config())
+    with ThreadPoolExecutor(max(1, int(jobs))) as executor:
+        rows = list(executor.map(lambda path: script_status(client, path), projects))
+
+    width = max(len(name) for name, _, _ in rows)
+    for name, script_id, status in rows:
+        print(f"{name:<{width}}  {script_id or '-':<36}  {status}")
+    return True
 
 
-def run():
+def run(workspace_dir=None, jobs=None):
+    if workspace_dir:
+        return workspace_info(workspace_dir, jobs or publish.DEFAULT_JOBS)
     try:
         configuration = read_configuration()
         if "id" not in configuration:
@@ -26,35 +51,30 @@ def run():
             print("Status: NOT PUBLISHED")
 
         else:
-            # Use the new authenticated request function
-            response = auth.make_authenticated_request(
-                "GET", config.get("url_api") + "/api/v1/script/" + configuration["id"]
-            )
-
-            if response is None:
+            try:
+                script = Client(http_cache=http_cache.from_config()).get_script(configuration["id"])
+            except AuthenticationError:
                 print(colored("Authentication failed. Please login.", "red"))
                 return False
-
-            if response.status_code != 200:
-                if response.status_code == 401:
+            except ApiError as error:
+                if error.status_code == 401:
                     print(colored("Do you need login", "red"))
                 else:
                     print(colored("Error obtaining info of script.", "red"))
                 return False
-            else:
-                data = response.json()
-                print("Id: " + data["data"]["id"])
-                print("Slug: " + data["data"]["name"])
-                print("Name: " + data["data"]["slug"])
-                print("Status: " + data["data"]["status"])
-                print("CreatedAt: " + data["data"]["created_at"])
-                print(
-                    "Run script: "
-                    + config.get("url_api")
-                    + "/api/v1/script/"
-                    + data["data"]["name"]
-                    + "/run?params"
-                )
+
+            print("Id: " + script["id"])
+            print("Slug: " + script["name"])
+            print("Name: " + script["slug"])
+            print("Status: " + script["status"])
+            print("CreatedAt: " + script["created_at"])
+            print(
+                "Run script: "
+                + config.get("url_api")
+                + "/api/v1/script/"
+                + script["name"]
+                + "/run?params"
+            )
 
     except Exception as error:
         logging.error(error)
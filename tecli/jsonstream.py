@@ -0,0 +1,179 @@
+"""Incremental parsing of large JSON API responses"""
+
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+# Yielded by the parser when it needs the next chunk of input
+_NEED_DATA = object()
+
+
+class _Reader:
+    """Text buffer that the parser consumes and the driver feeds chunks into
+
+    The parsing methods are generators that yield _NEED_DATA when the buffer
+    runs out, which lets the same parser be driven by both sync and async
+    chunk sources.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def feed(self, chunk):
+        """Append a chunk of bytes (or str) to the buffer"""
+        if self.pos:
+            # Drop what has already been consumed so the buffer stays small
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        self.buffer += self.decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    def close(self):
+        """Mark the end of the input"""
+        self.buffer += self.decoder.decode(b"", final=True)
+        self.eof = True
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at end of input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ""
+            yield _NEED_DATA
+
+    def next_char(self):
+        """Consume and return the next non-whitespace character"""
+        char = yield from self.peek()
+        if not char:
+            raise ValueError("Unexpected end of JSON input")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        yield from self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                yield _NEED_DATA
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if (
+                not self.eof
+                and isinstance(value, (int, float))
+                and NUMBER_CHARS.issuperset(self.buffer[end:])
+            ):
+                yield _NEED_DATA
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(reader):
+    if (yield from reader.next_char()) != "[":
+        raise ValueError("Expected a JSON array")
+    if (yield from reader.peek()) == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield (yield from reader.value())
+        char = yield from reader.next_char()
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Unexpected {char!r} in JSON array")
+
+
+def _walk(reader, path, meta):
+    if (yield from reader.next_char()) != "{":
+        raise ValueError("Expected a JSON object")
+    if (yield from reader.peek()) == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = yield from reader.value()
+        if (yield from reader.next_char()) != ":":
+            raise ValueError("Expected ':' in JSON object")
+        expected = "[" if len(path) == 1 else "{"
+        if key == path[0] and (yield from reader.peek()) == expected:
+            if len(path) == 1:
+                yield from _iter_array(reader)
+            else:
+                yield from _walk(reader, path[1:], meta.setdefault(key, {}))
+        else:
+            meta[key] = yield from reader.value()
+        char = yield from reader.next_char()
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError(f"Unexpected {char!r} in JSON object")
+
+
+def _parse(reader, path, meta):
+    if path:
+        yield from _walk(reader, tuple(path), meta if meta is not None else {})
+    else:
+        yield from _iter_array(reader)
+    if (yield from reader.peek()):
+        raise ValueError("Unexpected data after JSON document")
+
+
+def iter_items(chunks, path, meta=None):
+    """Yield the items of the array found at `path` as they are parsed.
+
+    Args:
+        chunks: Iterable of bytes (or str), e.g. ``response.iter_content()``.
+        path: Sequence of object keys leading to the array, e.g.
+            ``("data", "logs")``. An empty path means the document itself is
+            the array.
+        meta: Optional dict that receives every other member of the objects
+            along `path`, nested the same way. Existing nested dicts are
+            updated in place, and members that come after the array are only
+            available once the iteration has finished.
+
+    Only one item at a time is held in memory, so arbitrarily long arrays
+    can be processed while the response is still downloading.
+    """
+    reader = _Reader()
+    chunks = iter(chunks)
+    for event in _parse(reader, path, meta):
+        if event is _NEED_DATA:
+            chunk = next(chunks, None)
+            if chunk is None:
+                reader.close()
+            else:
+                reader.feed(chunk)
+        else:
+            yield event
+
+
+async def aiter_items(chunks, path, meta=None):
+    """Async variant of iter_items for an async iterable of chunks"""
+    reader = _Reader()
+    chunks = aiter(chunks)
+    for event in _parse(reader, path, meta):
+        if event is _NEED_DATA:
+            try:
+                reader.feed(await anext(chunks))
+            except StopAsyncIteration:
+                reader.close()
+        else:
+            yield event
+
+
+def iter_response_items(response, path, meta=None, chunk_size=CHUNK_SIZE):
+    """Stream the items of the array at `path` from a ``stream=True`` response"""
+    return iter_items(response.iter_content(chunk_size=chunk_size), path, meta)
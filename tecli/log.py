@@ -0,0 +1,150 @@
+"""Logging setup of the CLI
+
+Importing tecli does not configure logging. `trends` calls setup() with the
+verbosity of its global flags, which are removed from the command line
+before the command is parsed:
+
+    -q, --quiet        only errors
+    (default)          warnings and errors
+    -v, --verbose      informational messages
+    -vv                debug messages, including per-operation timings
+    --log-json=PATH    also append every record, debug included, to PATH as
+                       JSON lines; timed() records carry `operation` and
+                       `duration_ms` fields
+    --timings[=PATH]   print a waterfall of the timed() operations, see
+                       tecli.timings
+
+Modules log with lazy %-style arguments, so filtered records cost a level
+check and no formatting, and timed() does no work unless debug records are
+wanted or timings are recorded.
+
+Only the standard library is imported, as this runs before forwarding to the
+agent.
+"""
+
+import contextlib
+import json
+import logging
+import time
+
+from tecli import timings
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y%m%d-%H:%M%p"
+LEVELS = {-1: logging.ERROR, 0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+VERBOSE_FLAGS = {"-v": 1, "--verbose": 1, "-vv": 2, "-vvv": 2}
+QUIET_FLAGS = {"-q", "--quiet"}
+JSON_FLAG = "--log-json"
+# Attributes of every LogRecord, the others come from `extra`
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+logger = logging.getLogger("tecli")
+
+
+def parse_args(argv):
+    """Split the logging flags from `argv`
+
+    Returns (verbosity, json_path, remaining arguments). Flags after `--` are
+    left alone, they belong to Fire.
+    """
+    verbosity = 0
+    json_path = None
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--":
+            remaining.append(arg)
+            remaining.extend(args)
+            break
+        if arg in VERBOSE_FLAGS:
+            verbosity = max(verbosity, 0) + VERBOSE_FLAGS[arg]
+        elif arg in QUIET_FLAGS:
+            verbosity = -1
+        elif arg == JSON_FLAG:
+            json_path = next(args, None)
+        elif arg.startswith(JSON_FLAG + "="):
+            json_path = arg.split("=", 1)[1]
+        else:
+            remaining.append(arg)
+    return min(verbosity, 2), json_path, remaining
+
+
+def level_for(verbosity):
+    """Console log level of a verbosity between -1 (quiet) and 2 (debug)"""
+    return LEVELS[max(-1, min(2, verbosity))]
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def format(self, record):
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in RECORD_ATTRIBUTES:
+                data[name] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def setup(verbosity=0, json_path=None):
+    """Configure the root logger for the console and an optional JSON-lines file"""
+    # Process and thread details are not part of any output
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT))
+    console.setLevel(level_for(verbosity))
+    root.addHandler(console)
+    level = console.level
+
+    if json_path:
+        sink = logging.FileHandler(json_path, encoding="utf-8")
+        sink.setFormatter(JsonFormatter())
+        root.addHandler(sink)
+        level = logging.DEBUG
+    root.setLevel(level)
+
+
+@contextlib.contextmanager
+def timed(operation, **fields):
+    """Log the duration of the block at debug level
+
+    Yields a dict whose items are added to the record, so the block can
+    report its outcome (e.g. a status code). The block is also a span of the
+    active timings recorder. Costs nothing unless debug records are enabled
+    or timings are recorded.
+    """
+    recorder = timings.recorder
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if recorder is None and not debug:
+        yield fields
+        return
+    depth = recorder.enter() if recorder is not None else 0
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        end = time.perf_counter()
+        if recorder is not None:
+            recorder.leave(operation, start, end, depth, fields)
+        if debug:
+            duration_ms = round((end - start) * 1000, 3)
+            logger.debug(
+                "%s took %.1f ms",
+                operation,
+                duration_ms,
+                extra=dict(fields, operation=operation, duration_ms=duration_ms),
+            )
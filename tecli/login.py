@@ -1,12 +1,11 @@
 """Login command"""
 
 import re
-from datetime import datetime, timedelta
 from getpass import getpass
 
 import requests
 
-from tecli import config
+from tecli import auth, config
 
 EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
@@ -44,19 +43,7 @@ def run():
             error_msg = response.text
         return {"error": error_msg}
 
-    body = response.json()
-
-    # Store access token
-    config.set("JWT", body["access_token"])
-
-    # Store refresh token if provided
-    if "refresh_token" in body:
-        config.set("refresh_token", body["refresh_token"])
-
-    # Store token expiration if provided
-    if "expires_in" in body:
-        expires_at = datetime.now() + timedelta(seconds=body["expires_in"])
-        config.set("token_expires_at", expires_at.isoformat())
+    auth.store_tokens(response.json())
 
     print("Login successful!")
     return True
@@ -0,0 +1,228 @@
+"""Following the logs of many scripts from one process
+
+All scripts share one scheduler, one HTTP session and one request budget:
+each script is polled on its own interval, which starts at MIN_INTERVAL,
+grows while the script is quiet and resets when it prints again, and every
+request first takes a token from a bucket refilled at the configured rate.
+The request rate therefore stays bounded however many scripts are watched.
+A network or decoding error only affects its script, which backs off and
+is dropped after MAX_ERRORS failed requests in a row.
+"""
+
+import heapq
+import json
+import logging
+import time
+from datetime import timedelta
+
+import requests
+from termcolor import colored
+
+from tecli import config, logs, workspace
+from tecli.client import ApiError, AuthenticationError, Client
+from tecli.ratelimit import TokenBucket
+
+MIN_INTERVAL = 2
+MAX_INTERVAL = 30
+BACKOFF = 1.5
+# Requests per second across all followed scripts
+DEFAULT_RATE = 5
+FINISHED_STATUSES = {"FAIL", "SUCCESS"}
+# Failed requests in a row after which a script is no longer followed
+MAX_ERRORS = 5
+# Errors of one script's requests that others need not be affected by
+TRANSIENT_ERRORS = (requests.RequestException, ValueError)
+
+
+class Watch:
+    """Polling state of one followed script"""
+
+    def __init__(self, script_id, name=None):
+        self.script_id = script_id
+        self.name = name or script_id
+        self.interval = MIN_INTERVAL
+        self.last_entry = None
+        self.status = None
+        # Whether the history was shown, and the failed requests in a row
+        self.started = False
+        self.errors = 0
+
+
+class Multiplexer:
+    """Polls the logs of several scripts and merges their output"""
+
+    def __init__(self, watches, since, jsonl=False, rate=DEFAULT_RATE, client=None):
+        self.watches = watches
+        self.since = since
+        self.jsonl = jsonl
+        self.client = client or Client()
+        self.bucket = TokenBucket(rate)
+        self.failed = False
+
+    def request(self, method, *args):
+        self.bucket.acquire()
+        return method(*args)
+
+    def emit(self, watch, entry):
+        if self.jsonl:
+            line = json.dumps(
+                {
+                    "script": watch.script_id,
+                    "name": watch.name,
+                    "register_date": entry["register_date"],
+                    "text": entry["text"],
+                }
+            )
+        else:
+            line = f"[{watch.name}] {entry['register_date']}: {entry['text']}"
+        print(line, flush=True)
+
+    def report(self, watch, message, color="red", **fields):
+        if self.jsonl:
+            fields = {"script": watch.script_id, "name": watch.name, "message": message, **fields}
+            print(json.dumps(fields), flush=True)
+        else:
+            print(colored(f"[{watch.name}] {message}", color), flush=True)
+
+    def report_status(self, watch):
+        color = "green" if watch.status == "SUCCESS" else "red"
+        self.report(watch, f"Status: {watch.status}", color, status=watch.status)
+
+    def consume(self, watch, entries, cutoff=None):
+        """Print new entries and return how many there were"""
+        count = 0
+        for entry in entries:
+            # The entry at the start of a follow request was already shown
+            if entry == watch.last_entry:
+                continue
+            watch.last_entry = entry
+            count += 1
+            if entry["text"] is None:
+                continue
+            if cutoff is None or logs.date_epoch(entry["register_date"]) > cutoff:
+                self.emit(watch, entry)
+        return count
+
+    def request_failed(self, watch, error):
+        """Back off a script after a transient error; return whether to keep following it"""
+        watch.errors += 1
+        if watch.errors >= MAX_ERRORS:
+            self.report(watch, f"Stopped following after {watch.errors} failed requests: {error}")
+            self.failed = True
+            return False
+        logging.warning("[%s] Request failed, retrying: %s", watch.name, error)
+        watch.interval = min(MAX_INTERVAL, watch.interval * BACKOFF)
+        return True
+
+    def start(self, watch):
+        """Show the recent history of a script; return whether to keep following it"""
+        script = {}
+        cutoff = int(time.time() - self.since.total_seconds())
+        try:
+            entries = self.request(self.client.iter_script_logs, watch.script_id, script)
+            self.consume(watch, entries, cutoff)
+        except AuthenticationError:
+            raise
+        except ApiError as error:
+            self.report(watch, "Error obtaining info of script.", error=error.status_code)
+            self.failed = True
+            return False
+        except TRANSIENT_ERRORS as error:
+            # Once part of the history is shown, polling continues from there
+            watch.started = watch.last_entry is not None
+            return self.request_failed(watch, error)
+        watch.started = True
+        watch.errors = 0
+        watch.status = script.get("status")
+        if watch.status in FINISHED_STATUSES:
+            self.report_status(watch)
+            return False
+        return True
+
+    def poll(self, watch):
+        """Fetch new entries of a script; return whether to keep following it"""
+        if not watch.started:
+            return self.start(watch)
+        last = watch.last_entry
+        last_date = logs.parse_date(last["register_date"]) if last else None
+        try:
+            entries = self.request(self.client.iter_logs, watch.script_id, last_date)
+            if self.consume(watch, entries):
+                watch.interval = MIN_INTERVAL
+                watch.errors = 0
+                return True
+
+            # Nothing new: back off, and check whether the build is over
+            watch.interval = min(MAX_INTERVAL, watch.interval * BACKOFF)
+            watch.status = self.request(self.client.get_script, watch.script_id)["status"]
+        except AuthenticationError:
+            raise
+        except ApiError as error:
+            self.report(watch, "Error obtaining logs of script.", error=error.status_code)
+            self.failed = True
+            return False
+        except TRANSIENT_ERRORS as error:
+            return self.request_failed(watch, error)
+        watch.errors = 0
+        if watch.status in FINISHED_STATUSES:
+            self.report_status(watch)
+            return False
+        return True
+
+    def run(self):
+        """Follow all scripts until every one of them has finished"""
+        queue = []
+        for order, watch in enumerate(self.watches):
+            if self.start(watch):
+                heapq.heappush(queue, (time.monotonic() + watch.interval, order, watch))
+
+        while queue:
+            due, order, watch = heapq.heappop(queue)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self.poll(watch):
+                heapq.heappush(queue, (time.monotonic() + watch.interval, order, watch))
+        return not self.failed
+
+
+def parse_ids(ids):
+    """Accept ids as a comma-separated string or a sequence"""
+    if not ids:
+        return []
+    if isinstance(ids, str):
+        ids = ids.split(",")
+    return [str(script_id).strip() for script_id in ids if str(script_id).strip()]
+
+
+def workspace_watches(root):
+    """Watches for the published projects in a workspace"""
+    watches = []
+    for path in workspace.discover(root):
+        configuration = workspace.read_configuration(path)
+        name = configuration.get("name", path)
+        if "id" in configuration:
+            watches.append(Watch(configuration["id"], name))
+        else:
+            print(colored(f"[{name}] Script NOT PUBLISHED", "red"))
+    return watches
+
+
+def run(ids=None, workspace_dir=None, since=timedelta(hours=1), jsonl=False, rate=None):
+    """Follow the logs of the given scripts and/or the projects of a workspace"""
+    if not isinstance(since, timedelta):
+        since = timedelta(hours=since)
+    watches = [Watch(script_id) for script_id in parse_ids(ids)]
+    if workspace_dir:
+        watches += workspace_watches(workspace_dir)
+    if not watches:
+        print(colored("No published scripts to follow", "red"))
+        return False
+
+    rate = float(rate or config.get("logs_rate_limit") or DEFAULT_RATE)
+    logging.debug("Following %d scripts at up to %s requests/s", len(watches), rate)
+    try:
+        return Multiplexer(watches, since, jsonl, rate).run()
+    except AuthenticationError:
+        print(colored("Authentication failed. Please login.", "red"))
+        return False
@@ -1,60 +1,84 @@
 """Logs command"""
 
-import json
 import logging
-import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 import dateutil.parser
-import pytz
 from termcolor import colored
 
-from tecli import auth, config
+from tecli.client import ApiError, AuthenticationError, Client
+from tecli.workspace import read_configuration
 
+# Seconds between polls for new entries of a running script
+FOLLOW_INTERVAL = 2
 
-def read_configuration():
-    """Read configuration file of project"""
-    to_dir = os.getcwd()
-    logging.debug(f"Reading configuration file in path: {to_dir}")
-    with open(os.path.join(to_dir, "configuration.json")) as json_data:
-        d = json.load(json_data)
-        return d
 
+def parse_date(value):
+    """Parse an API timestamp into an aware UTC datetime
 
-def get_logs(script, last_date):
-    """Get logs from server"""
-    logging.debug("Obtaining logs")
-    start_query = ""
-    if last_date:
-        start_query = "?start=" + last_date.isoformat()
+    The API sends naive ISO-8601 timestamps in UTC. datetime.fromisoformat
+    handles those (and offsets) an order of magnitude faster than dateutil,
+    which is only used for anything it rejects.
+    """
+    try:
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        date = dateutil.parser.parse(value)
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
 
-    response = auth.make_authenticated_request(
-        "GET", config.get("url_api") + "/api/v1/script/" + script["id"] + "/log" + start_query
-    )
 
-    if response is None:
-        print(colored("Authentication failed. Please login.", "red"))
-        return False, None
+@lru_cache(maxsize=4096)
+def date_epoch(value):
+    """Seconds since the epoch of an API timestamp, cached per string
+
+    Log entries written in the same second share a timestamp, so bursts of
+    output are only parsed once.
+    """
+    return int(parse_date(value).timestamp())
+
+
+def get_logs(script, last_date):
+    """Get logs from server
 
-    if response.status_code != 200:
-        if response.status_code == 401:
+    The entries are returned as an iterator that parses them while the
+    response is still being received.
+    """
+    logging.debug("Obtaining logs")
+    try:
+        return True, Client().iter_logs(script["id"], last_date)
+    except AuthenticationError:
+        print(colored("Authentication failed. Please login.", "red"))
+    except ApiError as error:
+        if error.status_code == 401:
             print(colored("Do you need login", "red"))
         else:
             print(colored("Error obtaining logs of script.", "red"))
-        return False, None
-    return True, response.json()["data"]
+    return False, None
+
 
+def show_logs(script, since, entries=None, sleep=time.sleep):
+    """Show logs in console
 
-def show_logs(script, since):
-    """Show logs in console"""
-    last_date = None
-    now = datetime.utcnow().replace(tzinfo=pytz.utc)
+    The entries are read from `entries` when given, e.g. a stream from
+    jsonstream.iter_items that fills in `script` as it is consumed, and from
+    script["logs"] otherwise. While the script runs, new entries are polled
+    for every FOLLOW_INTERVAL seconds, waiting with `sleep`.
+    """
+    # Only the raw timestamp of the latest entry is kept; it is parsed into
+    # a datetime once per poll instead of once per line.
+    last_register_date = None
+    cutoff = int(time.time() - since.total_seconds())
     printed = False
-    for log in script["logs"]:
-        last_date = dateutil.parser.parse(log["register_date"]).replace(tzinfo=pytz.utc)
-        if log["text"] is not None and (last_date > (now - since)):
-            print(log["register_date"] + ": " + log["text"])
+    for log in script["logs"] if entries is None else entries:
+        last_register_date = log["register_date"]
+        if log["text"] is not None and date_epoch(last_register_date) > cutoff:
+            print(f"{last_register_date}: {log['text']}")
             printed = True
 
     if not printed:
@@ -65,17 +89,18 @@ def show_logs(script, since):
     if script["status"] != "FAIL" and script["status"] != "SUCCESS":
         next = True
         while next:
+            last_date = parse_date(last_register_date) if last_register_date else None
             next, logs = get_logs(script, last_date)
             if logs:
                 for log in logs:
-                    last_date = dateutil.parser.parse(log["register_date"])
+                    last_register_date = log["register_date"]
                     if log["text"] is not None:
-                        print(log["register_date"] + ": " + log["text"])
+                        print(f"{last_register_date}: {log['text']}")
 
-            time.sleep(2)
+            sleep(FOLLOW_INTERVAL)
 
 
-def run(since=timedelta(hours=1)):
+def run(since=timedelta(hours=1), sleep=time.sleep):
     """Run command"""
     try:
         configuration = read_configuration()
@@ -84,25 +109,24 @@ def run(since=timedelta(hours=1)):
             return True
 
         else:
-            response = auth.make_authenticated_request(
-                "GET", config.get("url_api") + f"/api/v1/script/{configuration['id']}?include=logs"
-            )
-
-            if response is None:
+            # Print each entry as it is parsed instead of loading the whole
+            # log history; the other script fields are collected alongside.
+            script = {}
+            try:
+                entries = Client().iter_script_logs(configuration["id"], script)
+            except AuthenticationError:
                 print(colored("Authentication failed. Please login.", "red"))
                 return False
-
-            if response.status_code != 200:
-                if response.status_code == 401:
+            except ApiError as error:
+                if error.status_code == 401:
                     print(colored("Do you need login", "red"))
                 else:
                     print(colored("Error obtaining info of script.", "red"))
                 return False
-            script = response.json()
+
             if not isinstance(since, timedelta):
                 since = timedelta(hours=since)
-
-            show_logs(script["data"], since)
+            show_logs(script, since, entries, sleep)
 
     except (KeyboardInterrupt, SystemExit):
         raise
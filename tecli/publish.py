@@ -1,49 +1,39 @@
 """Publish command"""
 
-import json
 import logging
+import multiprocessing
 import os
 import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 from termcolor import colored
 
-from tecli import auth, config
+from tecli import log, workspace
+from tecli.client import ApiError, AuthenticationError, Client
+from tecli.workspace import read_configuration, write_configuration
 
+# Concurrent uploads when publishing a workspace
+DEFAULT_JOBS = 8
 
-def make_tarfile(name):
-    """Create tar.gz file with the content of the directory"""
-    to_dir = os.getcwd()
-    makefile = os.path.join(to_dir, name + ".tar.gz")
-    logging.debug(f"Creating tar.gz file in path: {to_dir}")
-    with tarfile.open(makefile, "w:gz") as tar:
+
+def make_tarfile(name, path=None, output_dir=None):
+    """Create tar.gz file with the content of the project directory"""
+    to_dir = path or os.getcwd()
+    makefile = os.path.join(output_dir or to_dir, name + ".tar.gz")
+    logging.debug("Creating tar.gz file in path: %s", to_dir)
+    with log.timed("package", project=name), tarfile.open(makefile, "w:gz") as tar:
         tar.add(to_dir + "/configuration.json", arcname="configuration.json")
         tar.add(to_dir + "/requirements.txt", arcname="requirements.txt")
         tar.add(to_dir + "/src", arcname="src")
-        return makefile
-
-
-def read_configuration():
-    """Read configuration file of project"""
-    to_dir = os.getcwd()
-    logging.debug(f"Reading configuration file in path: {to_dir}")
-    with open(os.path.join(to_dir, "configuration.json")) as json_data:
-        d = json.load(json_data)
-        return d
+    return makefile
 
 
-def write_configuration(data):
-    """Write configuration file"""
-    to_dir = os.getcwd()
-    logging.debug(f"Writing configuration file in path: {to_dir}")
-    with open(os.path.join(to_dir, "configuration.json"), "w") as config_file:
-        json.dump(data, config_file)
-
-
-def sure_overwrite():
+def sure_overwrite(message="With this action you will overwrite this script."):
     sure = None
 
     while sure is None or not bool(sure) or sure.lower() not in ["y", "n"]:
-        sure = input("With this action you will overwrite this script. Are you sure? (Y/n): ")
+        sure = input(f"{message} Are you sure? (Y/n): ")
         if sure == "":
             sure = "y"
 
@@ -59,9 +49,8 @@ def publish(public=False, overwrite=False):
             print("Name required in configuration file")
             return False
         tarfile = make_tarfile(configuration["name"])
-        logging.debug(f"Doing request with file {tarfile}")
+        logging.debug("Doing request with file %s", tarfile)
 
-        response = None
         if "id" in configuration:
             if overwrite:
                 sure = True
@@ -71,46 +60,30 @@ def publish(public=False, overwrite=False):
             if not sure:
                 return False
 
-            # Use authenticated request for PATCH
-            with open(tarfile, "rb") as f:
-                response = auth.make_authenticated_request(
-                    "PATCH",
-                    config.get("url_api") + "/api/v1/script/" + configuration["id"],
-                    files={"file": f},
-                )
-        else:
-            # Use authenticated request for POST
-            with open(tarfile, "rb") as f:
-                response = auth.make_authenticated_request(
-                    "POST", config.get("url_api") + "/api/v1/script", files={"file": f}
-                )
-
-        if response is None:
+        client = Client()
+        try:
+            data = client.publish(tarfile, configuration.get("id"))
+        except AuthenticationError:
             print(colored("Authentication failed. Please login.", "red"))
             return False
-
-        if response.status_code != 200:
-            logging.error(response.json())
-            if response.status_code == 401:
+        except ApiError as error:
+            logging.error(error.body)
+            if error.status_code == 401:
                 print(colored("Do you need to login?", "red"))
             else:
                 print(colored("Error publishing script.", "red"))
             return False
 
-        data = response.json()
-        configuration["id"] = data["data"]["id"]
+        configuration["id"] = data["id"]
         write_configuration(configuration)
         if public:
-            response = auth.make_authenticated_request(
-                "POST", config.get("url_api") + "/api/v1/script/" + configuration["id"] + "/publish"
-            )
-
-            if response is None:
+            try:
+                client.make_public(configuration["id"])
+            except AuthenticationError:
                 print(colored("Authentication failed. Please login.", "red"))
                 return False
-
-            if response.status_code != 200:
-                logging.error(response.json())
+            except ApiError as error:
+                logging.error(error.body)
                 print(colored("Error making the script public.", "red"))
                 return False
         return True
@@ -122,6 +95,107 @@ def publish(public=False, overwrite=False):
             os.remove(path=tarfile)
 
 
-def run(public=False, overwrite=False):
+def package_project(path, output_dir):
+    """Read and package the project in `path`; runs in a worker process"""
+    configuration = read_configuration(path)
+    if "name" not in configuration:
+        raise ValueError("Name required in configuration file")
+    os.makedirs(output_dir)
+    return configuration, make_tarfile(configuration["name"], path, output_dir)
+
+
+def upload_project(client, path, configuration, archive, public):
+    """Upload a packaged project and record its id; returns an error message or None"""
+    try:
+        data = client.publish(archive, configuration.get("id"))
+    except AuthenticationError:
+        return "Authentication failed. Please login."
+    except ApiError as error:
+        logging.error(error.body)
+        return f"Error publishing script (status {error.status_code})."
+
+    configuration["id"] = data["id"]
+    write_configuration(configuration, path)
+    if public:
+        try:
+            client.make_public(configuration["id"])
+        except ApiError as error:
+            logging.error(error.body)
+            return "Error making the script public."
+    return None
+
+
+def print_summary(results, verb):
+    """Print one line per project and a total; return whether all succeeded"""
+    width = max(len(name) for name, _, _ in results)
+    failed = 0
+    for name, script_id, error in results:
+        if error:
+            failed += 1
+            print(colored(f"  FAILED  {name:<{width}}  {error}", "red"))
+        else:
+            print(colored(f"  OK      {name:<{width}}  {script_id}", "green"))
+    print(f"{verb} {len(results) - failed} of {len(results)} scripts")
+    return failed == 0
+
+
+def publish_workspace(root, public=False, overwrite=False, jobs=DEFAULT_JOBS):
+    """Publish every project of a workspace
+
+    Archives are built in a process pool and uploaded by a bounded pool of
+    threads as soon as each one is ready, so compression and network
+    transfers overlap.
+    """
+    projects = workspace.discover(root)
+    if not projects:
+        print(colored(f"No projects found in {root}", "red"))
+        return False
+
+    published = [path for path in projects if "id" in read_configuration(path)]
+    if published and not overwrite:
+        if not sure_overwrite(f"With this action you will overwrite {len(published)} scripts."):
+            return False
+
+    jobs = max(1, int(jobs))
+    client = Client()
+    results = {}
+    # Workers are spawned rather than forked, as the parent may be the
+    # multi-threaded agent.
+    context = multiprocessing.get_context("spawn")
+    with (
+        tempfile.TemporaryDirectory() as output_dir,
+        ProcessPoolExecutor(min(jobs, os.cpu_count() or 1), mp_context=context) as packers,
+        ThreadPoolExecutor(jobs) as uploaders,
+    ):
+        packaging = {
+            packers.submit(package_project, path, os.path.join(output_dir, str(i))): path
+            for i, path in enumerate(projects)
+        }
+        uploads = {}
+        for future in as_completed(packaging):
+            path = packaging[future]
+            try:
+                configuration, archive = future.result()
+            except Exception as error:
+                name = os.path.relpath(path, root)
+                results[path] = (name, None, f"Error packaging script: {error}")
+                continue
+            upload = uploaders.submit(upload_project, client, path, configuration, archive, public)
+            uploads[upload] = (path, configuration)
+
+        for future in as_completed(uploads):
+            path, configuration = uploads[future]
+            try:
+                error = future.result()
+            except Exception as exception:
+                error = str(exception)
+            results[path] = (configuration["name"], configuration.get("id"), error)
+
+    return print_summary([results[path] for path in projects], "Published")
+
+
+def run(public=False, overwrite=False, workspace_dir=None, jobs=None):
     """Publish command"""
+    if workspace_dir:
+        return publish_workspace(workspace_dir, public, overwrite, jobs or DEFAULT_JOBS)
     return publish(public, overwrite)
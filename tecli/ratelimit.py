@@ -0,0 +1,265 @@
+"""Client-side request rate limiting and retries
+
+Requests to the API go through a token bucket per host, so concurrent work
+in one process stays under the configured rate (`rate_limit` requests per
+second in ~/.tecli.yml, or per host with `rate_limits`). Throttled (429) and
+unavailable (502-504) responses are retried, honoring Retry-After and
+otherwise backing off with decorrelated jitter.
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from tecli import config, log, timings
+
+DEFAULT_RATE = 50
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+MAX_RETRY_AFTER = 300.0
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+THROTTLING_STATUSES = frozenset({429, 503})
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` operations per second with bursts of `capacity`
+
+    Callers reserve tokens ahead of time, so the balance may go negative; the
+    returned delay is how long the caller has to wait for its turn. That keeps
+    the long-run rate at `rate` regardless of how many callers share a bucket.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take `tokens` and return the seconds to wait before using them"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def defer(self, seconds):
+        """Make the next reservation wait at least `seconds`"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` can be used"""
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def backoff(previous, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Next delay of a decorrelated-jitter exponential backoff"""
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+def is_retryable(method, status_code):
+    """Whether a response is worth retrying
+
+    A 429 means the request was not processed, so it is retried whatever the
+    method; server errors only for idempotent methods.
+    """
+    if status_code == 429:
+        return True
+    return status_code in RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+
+class Stats:
+    """Counters of the requests sent through the limiter"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.retries = 0
+        self.throttled_responses = 0
+        self.throttled_seconds = 0.0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled_responses": self.throttled_responses,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+stats = Stats()
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def configured_rate(host):
+    """Requests per second allowed to `host` by ~/.tecli.yml, or None for no limit"""
+    limits = config.get("rate_limits")
+    rate = limits.get(host) if isinstance(limits, dict) else None
+    if rate is None:
+        rate = config.get("rate_limit")
+    if rate in ("", None):
+        rate = DEFAULT_RATE
+    rate = float(rate)
+    return rate if rate > 0 else None
+
+
+def bucket_for(url):
+    """The token bucket shared by all requests to the host of `url`, or None"""
+    host = urlsplit(url).netloc
+    with _buckets_lock:
+        if host not in _buckets:
+            rate = configured_rate(host)
+            _buckets[host] = TokenBucket(rate) if rate else None
+        return _buckets[host]
+
+
+class Retrying:
+    """Rate limiting and retry decisions for one request
+
+    Callers send the request in a loop: wait throttle() seconds, send, then
+    ask retry_delay() how long to wait before sending again (None: don't).
+    Shared by the blocking and the asyncio clients.
+    """
+
+    def __init__(self, method, url, max_retries=None):
+        self.method = method.upper()
+        self.url = url
+        self.bucket = bucket_for(url)
+        if max_retries is None:
+            max_retries = config.get("max_retries")
+            max_retries = MAX_RETRIES if max_retries in ("", None) else int(max_retries)
+        self.max_retries = max_retries
+        self.attempts = 0
+        self.delay = BACKOFF_BASE
+
+    def throttle(self):
+        """Seconds to wait before sending the next attempt"""
+        stats.add(requests=1)
+        wait = self.bucket.reserve() if self.bucket else 0.0
+        if wait:
+            stats.add(throttled_seconds=wait)
+        return wait
+
+    def retry_delay(self, response=None, error=None):
+        """Seconds to wait before retrying after `response` or `error`, or None"""
+        if self.attempts >= self.max_retries:
+            return None
+        if error is not None:
+            if self.method not in IDEMPOTENT_METHODS:
+                return None
+            retry_after = None
+        else:
+            if not is_retryable(self.method, response.status_code):
+                return None
+            if response.status_code in THROTTLING_STATUSES:
+                stats.add(throttled_responses=1)
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+        self.attempts += 1
+        stats.add(retries=1)
+        if retry_after is not None:
+            wait = min(retry_after, MAX_RETRY_AFTER)
+            self.delay = max(BACKOFF_BASE, wait)
+            if self.bucket:
+                # Hold back every request to this host, not just this one;
+                # the wait then happens in the next throttle().
+                self.bucket.defer(wait)
+                wait = 0.0
+        else:
+            wait = self.delay = backoff(self.delay)
+        logging.debug(
+            "Retrying %s %s (%d/%d) after %s",
+            self.method,
+            self.url,
+            self.attempts,
+            self.max_retries,
+            "an error" if error is not None else response.status_code,
+        )
+        stats.add(throttled_seconds=wait)
+        return wait
+
+
+def _body_positions(kwargs):
+    """Current positions of the file objects a request will read"""
+    objects = [kwargs.get("data")]
+    for value in (kwargs.get("files") or {}).values():
+        objects.append(value[1] if isinstance(value, tuple) else value)
+    return [(obj, obj.tell()) for obj in objects if hasattr(obj, "seek") and hasattr(obj, "tell")]
+
+
+def request(session, method, url, **kwargs):
+    """Send a request through the host's rate limiter, retrying when allowed"""
+    retrying = Retrying(method, url)
+    positions = _body_positions(kwargs)
+    while True:
+        wait = retrying.throttle()
+        if wait:
+            time.sleep(wait)
+        try:
+            with log.timed("http_request", method=method, url=url) as timing:
+                connections = timings.connections()
+                response = session.request(method, url, **kwargs)
+                timing["status"] = response.status_code
+                if connections is not None:
+                    timing["reused_connection"] = timings.connections() == connections
+                    # Until the headers are parsed; the rest of the block is
+                    # the transfer of the body, unless it is streamed
+                    timing["ttfb_ms"] = round(response.elapsed.total_seconds() * 1000, 3)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            delay = retrying.retry_delay(error=error)
+            if delay is None:
+                raise
+        else:
+            delay = retrying.retry_delay(response)
+            if delay is None:
+                return response
+            response.close()
+        if delay:
+            time.sleep(delay)
+        # Uploads are read again from where the first attempt started
+        for obj, position in positions:
+            obj.seek(position)
@@ -0,0 +1,302 @@
+"""Entry point of local script containers started with large parameters
+
+`trends start` passes small parameters to the image's own entry point as a
+base64 command-line argument. Larger ones would exceed the kernel's argument
+size limits, so they are written to a gzip-compressed JSON file mounted into
+the container (TECLI_PARAMS_FILE) and this script is run instead. It loads
+the parameters and hands them to the image's entry point (TECLI_ENTRY) in
+the same process, as the base64 argument it expects, which has no size limit.
+
+With TECLI_PROFILE=cpu|mem (`trends start --profile`), the script's run()
+is profiled and the reports are written to TECLI_PROFILE_DIR. With
+TECLI_GEE_RUNNER set, scripts whose run() takes a `gee_runner` argument get
+a tecli.sdk.executor.GeeRunner. With TECLI_GETINFO_CACHE set, getInfo()
+results are cached in TECLI_GETINFO_CACHE_DIR (tecli.sdk.eecache). With
+TECLI_STARTED_AT (`trends start --startup`), the time from then to the first
+line of run() is printed, to measure the cold start of the container.
+With TECLI_BATCH_LOGS set, run() gets a tecli.sdk.batchlog.BatchingLogger
+wrapping its logger.
+
+Only the standard library is used, as this runs inside the environment image.
+"""
+
+import base64
+import collections
+import cProfile
+import functools
+import gzip
+import json
+import logging
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+
+DEFAULT_ENTRY = "/project/main.py"
+SAMPLE_INTERVAL = 0.005
+TRACEMALLOC_FRAMES = 25
+TOP = 20
+# Durations measured ahead of the script's run(), in seconds
+timings = {}
+
+
+def load_params():
+    """The JSON-encoded parameters from TECLI_PARAMS_FILE or the first argument"""
+    path = os.environ.get("TECLI_PARAMS_FILE")
+    if path:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as infile:
+            return infile.read()
+    if len(sys.argv) > 1:
+        return base64.b64decode(sys.argv[1])
+    return b"{}"
+
+
+def run_script(params):
+    """Run the project's script directly, for images without an entry point"""
+    sys.path.insert(0, "/project")
+    from gefcore.script import main as script
+
+    logging.basicConfig(level=logging.INFO)
+    result = script.run(params, logging.getLogger("script"))
+    print(json.dumps(result, default=str))
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write(self, path):
+        """Write the samples in the folded format read by flamegraph tools"""
+        with open(path, "w") as outfile:
+            for stack, count in self.counts.most_common():
+                outfile.write(f"{stack} {count}\n")
+
+
+def top_functions(profiler, limit=TOP):
+    """The functions with the largest cumulative time"""
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "ncalls": ncalls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6),
+        }
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in rows
+    ]
+
+
+def top_allocations(snapshot, limit=TOP):
+    """The source lines holding the most memory in `snapshot`"""
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    )
+    return snapshot.statistics("lineno")[:limit]
+
+
+def profile_call(function, args, kwargs, mode, output_dir):
+    """Call `function` under the `mode` profiler and write its reports"""
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {"mode": mode}
+    start = time.perf_counter()
+    if mode == "cpu":
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            sampler.stop()
+            summary["wall_seconds"] = round(time.perf_counter() - start, 3)
+            profiler.dump_stats(os.path.join(output_dir, "profile.pstats"))
+            sampler.write(os.path.join(output_dir, "profile.collapsed"))
+            summary["top_functions"] = top_functions(profiler)
+            write_summary(summary, output_dir)
+
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        summary["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        summary["wall_seconds"] = round(time.perf_counter() - start, 3)
+        allocations = top_allocations(snapshot, limit=100)
+        with open(os.path.join(output_dir, "memory.txt"), "w") as outfile:
+            outfile.write(f"Peak traced memory: {summary['peak_bytes']} bytes\n\n")
+            for stat in allocations:
+                outfile.write(f"{stat}\n")
+        summary["top_allocations"] = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in allocations[:TOP]
+        ]
+        write_summary(summary, output_dir)
+
+
+def write_summary(summary, output_dir):
+    with open(os.path.join(output_dir, "summary.json"), "w") as outfile:
+        json.dump(summary, outfile, indent=2)
+
+
+def profiled(mode, output_dir):
+    """Decorator profiling a function with `mode`"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def run(*args, **kwargs):
+            return profile_call(function, args, kwargs, mode, output_dir)
+
+        return run
+
+    return decorator
+
+
+def with_gee_runner(function):
+    """Pass a GeeRunner to a run(params, logger, gee_runner) called without one"""
+
+    @functools.wraps(function)
+    def run(params, logger, *args, **kwargs):
+        if args or "gee_runner" in kwargs:
+            return function(params, logger, *args, **kwargs)
+        from tecli.sdk.executor import GeeRunner
+
+        with GeeRunner.from_env() as gee_runner:
+            result = function(params, logger, gee_runner, **kwargs)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("gee_runner: %s", gee_runner.stats())
+        return result
+
+    return run
+
+
+def with_getinfo_cache(function):
+    """Cache the getInfo() results of a run(), unless its params disable it"""
+
+    @functools.wraps(function)
+    def run(params, logger, *args, **kwargs):
+        if params.get("getinfo_cache") is False:
+            return function(params, logger, *args, **kwargs)
+        from tecli.sdk.eecache import GetInfoCache
+
+        cache = GetInfoCache.from_env()
+        with cache.installed():
+            result = function(params, logger, *args, **kwargs)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("getInfo cache: %s", cache.stats())
+        return result
+
+    return run
+
+
+def with_batching_logger(function):
+    """Give run() a tecli.sdk BatchingLogger over its logger, flushed when it returns"""
+
+    @functools.wraps(function)
+    def run(params, logger, *args, **kwargs):
+        from tecli.sdk.batchlog import BatchingLogger
+
+        with BatchingLogger.wrapping(logger) as batching:
+            return function(params, batching, *args, **kwargs)
+
+    return run
+
+
+def first_line_timed(started_at):
+    """Decorator printing the time from `started_at` (epoch seconds) to a function's start"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def run(*args, **kwargs):
+            elapsed = time.time() - started_at
+            details = ""
+            if "script_import" in timings:
+                details = f" (importing the script took {timings['script_import']:.3f}s)"
+            print(f"Time to first line of run(): {elapsed:.3f}s{details}", flush=True)
+            return function(*args, **kwargs)
+
+        return run
+
+    return decorator
+
+
+def wrap_script(decorators):
+    """Apply `decorators` to the script's run(); return False if it cannot be imported"""
+    sys.path.insert(0, "/project")
+    started = time.perf_counter()
+    try:
+        from gefcore.script import main as script
+    except Exception as error:
+        print(f"The script could not be imported ahead of the run: {error}")
+        return False
+    timings["script_import"] = time.perf_counter() - started
+    for decorator in decorators:
+        script.run = decorator(script.run)
+    return True
+
+
+def main():
+    data = load_params()
+    entry = os.environ.get("TECLI_ENTRY", DEFAULT_ENTRY)
+    profile = os.environ.get("TECLI_PROFILE")
+    profile_dir = os.environ.get("TECLI_PROFILE_DIR", "/tmp/tecli/profile")
+    decorators = []
+    if os.environ.get("TECLI_GETINFO_CACHE"):
+        decorators.append(with_getinfo_cache)
+    if os.environ.get("TECLI_GEE_RUNNER"):
+        decorators.append(with_gee_runner)
+    if os.environ.get("TECLI_BATCH_LOGS"):
+        decorators.append(with_batching_logger)
+    if profile:
+        decorators.append(profiled(profile, profile_dir))
+    started_at = os.environ.get("TECLI_STARTED_AT")
+    if started_at:
+        decorators.append(first_line_timed(float(started_at)))
+    if decorators and not wrap_script(decorators) and profile:
+        print("Profiling the whole run")
+        profile_call(run_entry, (entry, data), {}, profile, profile_dir)
+    else:
+        run_entry(entry, data)
+
+
+def run_entry(entry, data):
+    """Run the image's entry point, or the script itself if there is none"""
+    if not os.path.exists(entry):
+        run_script(json.loads(data))
+        return
+    sys.argv = [entry, base64.b64encode(data).decode("ascii")]
+    sys.path.insert(0, os.path.dirname(entry))
+    runpy.run_path(entry, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Helpers for trends.earth scripts
+
+`trends start` copies this package into the script's image, so scripts can
+import it as `tecli.sdk` when run locally. It only uses the standard
+library; the Earth Engine module is passed in (`ee=`) or imported when
+first needed, which lets tests use a stub in its place.
+"""
@@ -0,0 +1,269 @@
+"""Logging of scripts off their hot path
+
+The `logger` a script's run() receives writes every call synchronously, and
+on the platform each line and progress update is a request to the API.
+BatchingLogger has the same methods but only queues lines; a background
+thread hands them to a sink in batches of up to `max_batch`, at the latest
+`max_delay` seconds after they were logged. Progress updates are coalesced:
+only the last value since the previous flush is sent.
+
+The queue holds at most `max_queue` lines. When it is full, lines below
+`drop_below` (WARNING by default) are dropped and counted, and the others
+wait for room, so a script logging faster than the sink accepts slows down
+only for the lines that matter; the number dropped is logged at the end.
+Lines are dropped as well, whatever their level, once the logger is closed
+or its flush thread has stopped.
+Pending lines are flushed by close(), when the logger is used as a context
+manager, and at interpreter exit.
+
+With `trends start --batch_logs` the local runner wraps the script's logger:
+
+    def run(params, logger):
+        logger.send_progress(50)  # Returns at once, sent by the flush thread
+"""
+
+from __future__ import annotations
+
+import atexit
+import collections
+import logging
+import threading
+import time
+import traceback
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+DEFAULT_MAX_BATCH = 100
+DEFAULT_MAX_DELAY = 1.0
+DEFAULT_MAX_QUEUE = 10_000
+# Seconds between checks that the flush thread is alive, while a line waits
+ALIVE_CHECK_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Entry:
+    """A queued log line; the message is formatted when the batch is sent"""
+
+    level: int
+    msg: Any
+    args: tuple
+    created: float
+
+    @property
+    def message(self) -> str:
+        msg = str(self.msg)
+        return msg % self.args if self.args else msg
+
+
+Sink = Callable[[Sequence[Entry]], None]
+
+
+def logger_sink(target: Any) -> tuple[Sink, Callable[[Any], None] | None]:
+    """Sinks replaying batches to a logger, and its progress to send_progress()"""
+
+    def write(entries: Sequence[Entry]) -> None:
+        for entry in entries:
+            target.log(entry.level, entry.message)
+
+    return write, getattr(target, "send_progress", None)
+
+
+class BatchingLogger:
+    """Buffers log lines and progress updates for a background flush thread
+
+    `sink` receives lists of Entry, `progress_sink` the latest progress
+    value of each flush.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        progress_sink: Callable[[Any], None] | None = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        drop_below: int = logging.WARNING,
+        level: int = logging.DEBUG,
+    ) -> None:
+        self.sink = sink
+        self.progress_sink = progress_sink
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max_delay
+        self.max_queue = max(1, int(max_queue))
+        self.drop_below = drop_below
+        self.level = level
+        self.queue: collections.deque[Entry] = collections.deque()
+        self.condition = threading.Condition()
+        self.progress: Any = None
+        self.progress_pending = False
+        # time.monotonic() of the oldest queued line and of the last flush
+        self.oldest = 0.0
+        self.last_flush = time.monotonic()
+        self.flushing = False
+        self.closed = False
+        self.flush_requested = False
+        self.logged = 0
+        self.dropped = 0
+        self.batches = 0
+        self.sink_errors = 0
+        self.thread = threading.Thread(target=self._run, name="batchlog", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def wrapping(cls, target: Any, **kwargs: Any) -> BatchingLogger:
+        """Logger batching the lines and progress of the logger `target`"""
+        sink, progress_sink = logger_sink(target)
+        return cls(sink, progress_sink, **kwargs)
+
+    def __enter__(self) -> BatchingLogger:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # Methods of the scripts' logger
+
+    def log(self, level: int, msg: Any, *args: Any) -> None:
+        if level < self.level:
+            return
+        entry = Entry(level, msg, args, time.time())
+        with self.condition:
+            if self.closed:
+                return
+            while len(self.queue) >= self.max_queue:
+                # Nothing would make room once the flush thread has stopped
+                if level < self.drop_below or self.closed or not self.thread.is_alive():
+                    self.dropped += 1
+                    return
+                self.condition.wait(ALIVE_CHECK_INTERVAL)
+            if not self.queue:
+                self.oldest = time.monotonic()
+                self.condition.notify_all()
+            self.queue.append(entry)
+            self.logged += 1
+            if len(self.queue) == self.max_batch:
+                self.condition.notify_all()
+
+    def debug(self, msg: Any, *args: Any) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: Any, *args: Any) -> None:
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: Any, *args: Any) -> None:
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg: Any, *args: Any) -> None:
+        self.log(logging.ERROR, msg, *args)
+
+    def exception(self, msg: Any, *args: Any) -> None:
+        message = str(msg) % args if args else str(msg)
+        self.log(logging.ERROR, "%s\n%s", message, traceback.format_exc().rstrip())
+
+    def critical(self, msg: Any, *args: Any) -> None:
+        self.log(logging.CRITICAL, msg, *args)
+
+    def isEnabledFor(self, level: int) -> bool:  # noqa: N802 - logging.Logger's name
+        return level >= self.level
+
+    def send_progress(self, value: Any) -> None:
+        """Report progress; values replaced before the next flush are not sent"""
+        with self.condition:
+            self.progress = value
+            if not self.progress_pending:
+                self.progress_pending = True
+                self.condition.notify_all()
+
+    # Flushing
+
+    def flush(self) -> None:
+        """Block until the lines and progress logged so far are sent"""
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            while (self.queue or self.progress_pending or self.flushing) and self.thread.is_alive():
+                self.condition.wait()
+
+    def close(self) -> None:
+        """Send what is pending and stop the background thread
+
+        Lines logged afterwards are ignored.
+        """
+        with self.condition:
+            if self.closed:
+                return
+            if self.dropped:
+                self.queue.append(
+                    Entry(
+                        logging.WARNING, "%d log lines were dropped", (self.dropped,), time.time()
+                    )
+                )
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "logged": self.logged,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "sink_errors": self.sink_errors,
+        }
+
+    def _wait_time(self) -> float | None:
+        """Seconds until the next flush is due, 0 if it is, None if nothing is pending"""
+        if self.closed or self.flush_requested or len(self.queue) >= self.max_batch:
+            return 0.0
+        deadlines = []
+        if self.queue:
+            deadlines.append(self.oldest + self.max_delay)
+        if self.progress_pending:
+            deadlines.append(self.last_flush + self.max_delay)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                wait = self._wait_time()
+                while wait != 0.0:
+                    self.condition.wait(wait)
+                    wait = self._wait_time()
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+                send_progress, progress = self.progress_pending, self.progress
+                self.progress_pending = False
+                if self.queue:
+                    # The rest is already due
+                    self.oldest = time.monotonic() - self.max_delay
+                else:
+                    self.flush_requested = False
+                stop = self.closed and not self.queue
+                self.flushing = True
+                # Room for the lines waiting on a full queue
+                self.condition.notify_all()
+            try:
+                self._send(batch, progress, send_progress)
+            finally:
+                with self.condition:
+                    self.flushing = False
+                    self.last_flush = time.monotonic()
+                    self.condition.notify_all()
+            if stop:
+                return
+
+    def _send(self, batch: list[Entry], progress: Any, send_progress: bool) -> None:
+        try:
+            if batch:
+                self.batches += 1
+                self.sink(batch)
+            if send_progress and self.progress_sink is not None:
+                self.progress_sink(progress)
+        except Exception as error:
+            self.sink_errors += 1
+            logger.warning("Could not send %d log lines: %s", len(batch), error)
@@ -0,0 +1,189 @@
+"""Persistent cache of Earth Engine getInfo() results
+
+Local iterations of a script send the same expressions (same assets,
+regions and scales) to Earth Engine on every run. GetInfoCache keys each
+result on the SHA-256 of its serialized expression graph and keeps it on
+disk, so a rerun with unchanged inputs answers its getInfo() calls locally.
+Entries expire after `ttl` seconds, and the least recently used ones are
+evicted beyond `max_size` bytes.
+
+installed() routes every getInfo() through the cache (by wrapping
+ee.data.computeValue, which they all call), so scripts need no changes:
+
+    with GetInfoCache(path).installed():
+        stats = image.reduceRegion(...).getInfo()
+
+`trends start --getinfo_cache` does this for the script's run(). Pass
+`"getinfo_cache": false` in the parameters to bypass it for one run.
+Results of expressions that are not deterministic (e.g. ee.Date of the
+current time) are cached like the others.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_SIZE_MB = 256
+# Eviction frees space down to this fraction of max_size
+EVICT_TO = 0.9
+_MISSING = object()
+
+
+def expression_key(ee: Any, obj: Any, namespace: str = "") -> str:
+    """SHA-256 of the serialized expression graph of an EE object"""
+    expression = ee.serializer.encode(obj, for_cloud_api=True)
+    digest = hashlib.sha256(namespace.encode("utf-8") + b"\0")
+    digest.update(json.dumps(expression, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DiskStore:
+    """JSON values in one file per key, with TTL and size-bounded LRU eviction"""
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key: str) -> Any:
+        """The value stored for `key`, or _MISSING"""
+        path = self._entry_path(key)
+        try:
+            with open(path) as infile:
+                entry = json.load(infile)
+        except (OSError, ValueError):
+            return _MISSING
+        if self.clock() - entry["stored_at"] > self.ttl:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return _MISSING
+        # The modification time orders entries for eviction
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as outfile:
+                json.dump({"stored_at": self.clock(), "value": value}, outfile)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries while over max_size"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                with contextlib.suppress(OSError):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+        if total <= self.max_size:
+            return
+        for _, size, path in sorted(entries):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                total -= size
+            if total <= self.max_size * EVICT_TO:
+                break
+
+
+class GetInfoCache:
+    """Memoizes getInfo() results on disk, keyed on the expression graph"""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        namespace: str = "",
+        ee: Any = None,
+    ) -> None:
+        self.ee = ee or importlib.import_module("ee")
+        self.store = DiskStore(path, max_size, ttl)
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, ee: Any = None) -> GetInfoCache:
+        """Cache configured by TECLI_GETINFO_CACHE_DIR, _TTL (seconds) and _MAX_SIZE (MB)"""
+        return cls(
+            os.environ["TECLI_GETINFO_CACHE_DIR"],
+            ttl=float(os.environ.get("TECLI_GETINFO_CACHE_TTL") or DEFAULT_TTL),
+            max_size=int(os.environ.get("TECLI_GETINFO_CACHE_MAX_SIZE") or DEFAULT_MAX_SIZE_MB)
+            * 1024
+            * 1024,
+            ee=ee,
+        )
+
+    def compute(self, obj: Any, compute_value: Callable[[Any], Any]) -> Any:
+        """The cached value of `obj`, or compute_value(obj) stored for next time"""
+        key = expression_key(self.ee, obj, self.namespace)
+        value = self.store.get(key)
+        if value is not _MISSING:
+            with self.lock:
+                self.hits += 1
+            return value
+        value = compute_value(obj)
+        with self.lock:
+            self.misses += 1
+        self.store.set(key, value)
+        return value
+
+    def get_info(self, obj: Any) -> Any:
+        """obj.getInfo(), answered from the cache when possible"""
+        return self.compute(obj, lambda o: o.getInfo())
+
+    @contextlib.contextmanager
+    def installed(self) -> Iterator[GetInfoCache]:
+        """Route every getInfo() through the cache within the block"""
+        data = self.ee.data
+        original = data.computeValue
+
+        @functools.wraps(original)
+        def compute_value(obj: Any) -> Any:
+            return self.compute(obj, original)
+
+        data.computeValue = compute_value
+        try:
+            yield self
+        finally:
+            data.computeValue = original
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
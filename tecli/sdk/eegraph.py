@@ -0,0 +1,450 @@
+"""Size analysis of Earth Engine expression graphs
+
+Scripts build their Earth Engine computations client-side, as a graph of
+function calls that is serialized into every request. Graphs grown by
+Python loops (an image per pair of years, a list built one element at a
+time) reach the request payload and computation limits long before they
+look large in the code. analyze() measures the serialized graph of an EE
+object:
+
+    stats = analyze(image)
+    print(stats.nodes, stats.expanded_nodes, stats.depth, stats.duplicated)
+
+`nodes` counts the distinct function calls, as the serializer sends them;
+`expanded_nodes` counts them with every shared subgraph repeated wherever
+it is used, which is closer to the work the graph describes. `duplicated`
+lists the subgraphs used more than once, largest first.
+
+StubEE stands in for the ee module, so that a whole script can be analyzed
+without credentials or network: it records the expressions the script
+builds, answers getInfo() with placeholders and completes export tasks
+immediately. `trends analyze` runs a project's run() against it. The stub
+serializes every call by reference, so its payload sizes run a little
+above those of the real serializer, which inlines values used once.
+"""
+
+from __future__ import annotations
+
+import importlib
+import itertools
+import json
+import os
+import traceback
+import types
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any, TypedDict
+
+DEFAULT_MAX_NODES = 5000
+DEFAULT_MAX_EXPANDED_NODES = 1_000_000
+DEFAULT_MAX_DEPTH = 200
+# Well below the 10 MB request limit of Earth Engine: payloads this large
+# already take noticeable time to serialize and upload
+DEFAULT_MAX_PAYLOAD_BYTES = 1024 * 1024
+DEFAULT_MAX_GETINFO = 10
+DUPLICATED_TOP = 10
+# Answer of the stub to getInfo() of list lengths and collection sizes
+DEFAULT_LENGTH = 10
+
+TECLI_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# Types of the results of methods that do not return their receiver's type
+METHOD_TYPES = {
+    "bandNames": "List",
+    "geometry": "Geometry",
+    "getNumber": "Number",
+    "getString": "String",
+    "length": "Number",
+    "propertyNames": "List",
+    "reduceRegion": "Dictionary",
+    "reduceRegions": "FeatureCollection",
+    "size": "Number",
+    "toList": "List",
+}
+ELEMENT_TYPES = {"ImageCollection": "Image", "FeatureCollection": "Feature"}
+# Collection methods that reduce a collection to one of its elements
+COLLECTION_REDUCTIONS = (
+    "count",
+    "first",
+    "max",
+    "mean",
+    "median",
+    "min",
+    "mode",
+    "mosaic",
+    "product",
+    "qualityMosaic",
+    "reduce",
+    "sum",
+)
+
+
+class Duplicate(TypedDict):
+    """A subgraph used more than once: its function, uses and expanded size"""
+
+    function: str
+    uses: int
+    size: int
+
+
+@dataclass
+class GraphStats:
+    """Size of one serialized expression graph"""
+
+    nodes: int
+    expanded_nodes: int
+    depth: int
+    payload_bytes: int
+    duplicated: list[Duplicate] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class Thresholds:
+    """Limits above which a graph is reported; None disables a limit"""
+
+    max_nodes: int | None = DEFAULT_MAX_NODES
+    max_expanded_nodes: int | None = DEFAULT_MAX_EXPANDED_NODES
+    max_depth: int | None = DEFAULT_MAX_DEPTH
+    max_payload_bytes: int | None = DEFAULT_MAX_PAYLOAD_BYTES
+    max_getinfo: int | None = DEFAULT_MAX_GETINFO
+
+    def exceeded(self, stats: GraphStats) -> list[str]:
+        """Descriptions of the limits `stats` exceeds"""
+        messages = []
+        for name, value, limit in (
+            ("nodes", stats.nodes, self.max_nodes),
+            ("expanded nodes", stats.expanded_nodes, self.max_expanded_nodes),
+            ("depth", stats.depth, self.max_depth),
+            ("payload bytes", stats.payload_bytes, self.max_payload_bytes),
+        ):
+            if limit is not None and value > limit:
+                messages.append(f"{value} {name} (limit {limit})")
+        return messages
+
+
+def _function_name(value: dict[str, Any]) -> str:
+    call = value.get("functionInvocationValue")
+    if call is not None:
+        return call.get("functionName") or "function"
+    return next(iter(value), "value").replace("Value", "")
+
+
+def analyze_expression(expression: dict[str, Any], top: int = DUPLICATED_TOP) -> GraphStats:
+    """GraphStats of an expression in the Cloud API format
+
+    That is the format of ee.serializer.encode(obj, for_cloud_api=True): a
+    `result` reference into `values`, whose entries may refer to each other.
+    """
+    values = expression.get("values", {})
+    uses: Counter[str] = Counter()
+    # Reference -> (expanded nodes, depth) of the value it refers to
+    memo: dict[str, tuple[int, int]] = {}
+    nodes = 0
+
+    def visit(reference: str) -> tuple[int, int]:
+        uses[reference] += 1
+        if reference not in memo:
+            memo[reference] = walk(values[reference])
+        return memo[reference]
+
+    def walk(value: Any) -> tuple[int, int]:
+        nonlocal nodes
+        if not isinstance(value, dict):
+            return 0, 0
+        if "valueReference" in value:
+            return visit(value["valueReference"])
+        if "functionInvocationValue" in value:
+            call = value["functionInvocationValue"]
+            nodes += 1
+            children = list(call.get("arguments", {}).values())
+            if "functionReference" in call:
+                children.append({"valueReference": call["functionReference"]})
+            own = 1
+        elif "arrayValue" in value:
+            children = value["arrayValue"].get("values", [])
+            own = 0
+        elif "dictionaryValue" in value:
+            children = list(value["dictionaryValue"].get("values", {}).values())
+            own = 0
+        elif "functionDefinitionValue" in value:
+            children = [{"valueReference": value["functionDefinitionValue"]["body"]}]
+            own = 0
+        else:
+            # Constants and argument references
+            return 0, 0
+        expanded = own
+        depth = 0
+        for child in children:
+            child_expanded, child_depth = walk(child)
+            expanded += child_expanded
+            depth = max(depth, child_depth)
+        return expanded, depth + own
+
+    expanded, depth = visit(expression["result"])
+    duplicated: list[Duplicate] = [
+        {"function": _function_name(values[reference]), "uses": count, "size": memo[reference][0]}
+        for reference, count in uses.items()
+        if count > 1 and memo[reference][0] > 0
+    ]
+    duplicated.sort(key=lambda entry: (entry["uses"] - 1) * entry["size"], reverse=True)
+    payload = json.dumps(expression, separators=(",", ":"), default=str)
+    return GraphStats(nodes, expanded, depth, len(payload.encode("utf-8")), duplicated[:top])
+
+
+def analyze(obj: Any, ee: Any = None, top: int = DUPLICATED_TOP) -> GraphStats:
+    """GraphStats of the expression graph of an EE object"""
+    ee = ee or importlib.import_module("ee")
+    return analyze_expression(ee.serializer.encode(obj, for_cloud_api=True), top)
+
+
+class EEException(Exception):
+    """Stands in for ee.EEException"""
+
+
+class Expression:
+    """An EE object built with StubEE: a function call and its arguments
+
+    Every method call returns a new Expression for that call. Argument
+    variables of mapped functions are Expressions with an `argument` name.
+    """
+
+    def __init__(
+        self,
+        ee: StubEE,
+        type_name: str,
+        function: str | None,
+        args: tuple = (),
+        kwargs: dict[str, Any] | None = None,
+        argument: str | None = None,
+    ) -> None:
+        self._ee = ee
+        self._type = type_name
+        self._function = function
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._argument = argument
+
+    def __getattr__(self, name: str) -> Callable[..., Expression]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args: Any, **kwargs: Any) -> Expression:
+            return self._ee._call(f"{self._type}.{name}", (self, *args), kwargs)
+
+        return method
+
+    def cast(self, type_name: str) -> Expression:
+        """The same expression as another EE type, as ee.Image(obj) does"""
+        return Expression(
+            self._ee, type_name, self._function, self._args, self._kwargs, self._argument
+        )
+
+    def getInfo(self) -> Any:
+        return self._ee.data.computeValue(self)
+
+    def __repr__(self) -> str:
+        return f"<{self._type} {self._argument or self._function}>"
+
+
+@dataclass
+class Function:
+    """A Python function traced into an EE function definition"""
+
+    arguments: list[str]
+    body: Any
+
+
+@dataclass
+class Computation:
+    """A getInfo() or export of the script, where it was made and its graph"""
+
+    kind: str
+    function: str
+    location: str
+    expression: dict[str, Any]
+
+
+class _Encoder:
+    """Serializes Expressions in the Cloud API format, sharing equal values"""
+
+    def __init__(self) -> None:
+        self.values: dict[str, Any] = {}
+        self.references: dict[str, str] = {}
+        self.encoded: dict[int, str] = {}
+
+    def reference(self, value: Any) -> str:
+        key = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        reference = self.references.get(key)
+        if reference is None:
+            reference = self.references[key] = str(len(self.references))
+            self.values[reference] = value
+        return reference
+
+    def encode(self, obj: Any) -> Any:
+        if isinstance(obj, Expression):
+            if obj._argument is not None:
+                return {"argumentReference": obj._argument}
+            reference = self.encoded.get(id(obj))
+            if reference is None:
+                arguments = {f"arg{i}": self.encode(arg) for i, arg in enumerate(obj._args)}
+                arguments.update((name, self.encode(arg)) for name, arg in obj._kwargs.items())
+                call = {"functionName": obj._function, "arguments": arguments}
+                reference = self.reference({"functionInvocationValue": call})
+                self.encoded[id(obj)] = reference
+            return {"valueReference": reference}
+        if isinstance(obj, Function):
+            body = self.reference(self.encode(obj.body))
+            return {"functionDefinitionValue": {"argumentNames": obj.arguments, "body": body}}
+        if isinstance(obj, (list, tuple)):
+            values = [self.encode(item) for item in obj]
+            if all("constantValue" in item for item in values):
+                return {"constantValue": [item["constantValue"] for item in values]}
+            return {"arrayValue": {"values": values}}
+        if isinstance(obj, dict):
+            items = {str(key): self.encode(item) for key, item in obj.items()}
+            if all("constantValue" in item for item in items.values()):
+                return {
+                    "constantValue": {key: item["constantValue"] for key, item in items.items()}
+                }
+            return {"dictionaryValue": {"values": items}}
+        return {"constantValue": obj}
+
+
+def encode(obj: Any, for_cloud_api: bool = True) -> dict[str, Any]:
+    """Cloud API expression of `obj`, like ee.serializer.encode"""
+    encoder = _Encoder()
+    value = encoder.encode(obj)
+    result = value["valueReference"] if "valueReference" in value else encoder.reference(value)
+    return {"result": result, "values": encoder.values}
+
+
+class Placeholder(dict):
+    """getInfo() answer of the stub: a dictionary of zeros"""
+
+    def __missing__(self, key: Any) -> int:
+        return 0
+
+
+class StubTask:
+    """Export task of the stub, complete as soon as it is started"""
+
+    ids = itertools.count()
+
+    def __init__(self) -> None:
+        self.id = f"stub-{next(self.ids)}"
+
+    def start(self) -> None:
+        pass
+
+    def cancel(self) -> None:
+        pass
+
+    def active(self) -> bool:
+        return False
+
+    def status(self) -> dict[str, Any]:
+        return {"id": self.id, "state": "COMPLETED", "progress": 1.0}
+
+
+class _Namespace:
+    """ee.Image, ee.Reducer.sum, ee.batch.Export.image... of the stub"""
+
+    def __init__(self, ee: StubEE, path: str) -> None:
+        self._ee = ee
+        self._path = path
+
+    def __getattr__(self, name: str) -> _Namespace:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Namespace(self._ee, f"{self._path}.{name}")
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        if self._path.startswith("batch.Export."):
+            return self._ee._export(self._path, args, kwargs)
+        if "." not in self._path and len(args) == 1 and not kwargs:
+            if isinstance(args[0], Expression):
+                return args[0].cast(self._path)
+        return self._ee._call(self._path, args, kwargs)
+
+
+class StubEE(types.ModuleType):
+    """Stand-in for the ee module that records the expressions built with it
+
+    getInfo() calls and exports are recorded in `computations`, with the
+    serialized graph of their object. getInfo() returns get_info(obj) when
+    given, else `length` for list lengths and collection sizes and a
+    dictionary of zeros for anything else.
+    """
+
+    EEException = EEException
+
+    def __init__(
+        self, length: int = DEFAULT_LENGTH, get_info: Callable[[Expression], Any] | None = None
+    ) -> None:
+        super().__init__("ee")
+        self.length = length
+        self.get_info = get_info
+        self.computations: list[Computation] = []
+        self.data = types.SimpleNamespace(computeValue=self._compute_value)
+        self.serializer = types.SimpleNamespace(encode=encode)
+        self._variables = itertools.count()
+
+    def __getattr__(self, name: str) -> _Namespace:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Namespace(self, name)
+
+    def Initialize(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def Authenticate(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def ServiceAccountCredentials(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def _call(self, function: str, args: tuple, kwargs: dict[str, Any]) -> Expression:
+        type_name, _, method = function.rpartition(".")
+        receiver = type_name.split(".")[0] if type_name else method
+        if method in METHOD_TYPES:
+            result_type = METHOD_TYPES[method]
+        elif receiver in ELEMENT_TYPES and method in COLLECTION_REDUCTIONS:
+            result_type = ELEMENT_TYPES[receiver]
+        else:
+            result_type = receiver
+        element = ELEMENT_TYPES.get(receiver, "Element")
+        args = tuple(self._trace(arg, element) for arg in args)
+        kwargs = {name: self._trace(arg, element) for name, arg in kwargs.items()}
+        return Expression(self, result_type, function, args, kwargs)
+
+    def _trace(self, arg: Any, element: str) -> Any:
+        """Functions passed to EE methods, as the graph of their result"""
+        if not callable(arg) or isinstance(arg, (Expression, _Namespace)):
+            return arg
+        name = f"_MAPPING_VAR_{next(self._variables)}"
+        return Function([name], arg(Expression(self, element, None, argument=name)))
+
+    def _record(self, kind: str, function: str, obj: Any) -> None:
+        location = ""
+        for frame in reversed(traceback.extract_stack()):
+            if not os.path.realpath(frame.filename).startswith(TECLI_DIR + os.sep):
+                location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                break
+        self.computations.append(Computation(kind, function, location, encode(obj)))
+
+    def _compute_value(self, obj: Any) -> Any:
+        function = getattr(obj, "_function", None) or type(obj).__name__
+        self._record("getInfo", function, obj)
+        if self.get_info is not None:
+            return self.get_info(obj)
+        if function.rpartition(".")[2] in ("length", "size"):
+            return self.length
+        return Placeholder()
+
+    def _export(self, path: str, args: tuple, kwargs: dict[str, Any]) -> StubTask:
+        obj = kwargs.get("image", kwargs.get("collection", args[0] if args else None))
+        self._record("export", path.removeprefix("batch.Export."), obj)
+        return StubTask()
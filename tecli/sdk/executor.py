@@ -0,0 +1,247 @@
+"""Concurrent, quota-aware execution of Earth Engine work
+
+Earth Engine rejects requests beyond a user's concurrency quota ("Too many
+concurrent aggregations", HTTP 429). GeeRunner runs EE-bound callables on a
+bounded thread pool behind an adaptive limit: every success raises the
+number of calls allowed in flight by a fraction of one, every throttling
+error halves it (additive increase, multiplicative decrease), so batches
+settle just under the quota instead of running one query at a time.
+Throttled and timed-out calls are retried with jittered exponential
+backoff; other errors are raised as they are.
+
+The local runner passes an instance to scripts whose run() takes a
+`gee_runner` argument:
+
+    def run(params, logger, gee_runner):
+        totals = gee_runner.map(zonal_total, regions)
+        return gee_runner(summarize, totals, logger)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+DECREASE_FACTOR = 0.5
+
+THROTTLED = "throttled"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+THROTTLING_MESSAGES = (
+    "too many concurrent",
+    "too many requests",
+    "quota exceeded",
+    "rate limit",
+    "resource_exhausted",
+)
+TIMEOUT_MESSAGES = ("computation timed out", "deadline exceeded", "timed out")
+STATUS_429 = re.compile(r"\b429\b")
+
+
+def _status_code(error: BaseException) -> int | None:
+    for value in (
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "resp", None), "status", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if value is None:
+            continue
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def classify(error: BaseException) -> str | None:
+    """THROTTLED, TIMED_OUT or None for errors that are not worth retrying"""
+    status = _status_code(error)
+    message = str(error).lower()
+    if (
+        status == 429
+        or STATUS_429.search(message)
+        or any(m in message for m in THROTTLING_MESSAGES)
+    ):
+        return THROTTLED
+    if status in (503, 504) or any(m in message for m in TIMEOUT_MESSAGES):
+        return TIMED_OUT
+    return None
+
+
+class AdaptiveLimit:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease
+
+    Calls that were already in flight when the limit was decreased were
+    started under the old limit, so their throttling errors do not decrease
+    it again; acquire() returns the epoch that release() checks for that.
+    """
+
+    def __init__(
+        self, initial: float, minimum: float = 1, maximum: float = DEFAULT_MAX_CONCURRENCY
+    ) -> None:
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.epoch = 0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """Block until one more call may run and return the current epoch"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return self.epoch
+
+    def release(self, epoch: int, outcome: str | None = None) -> None:
+        """End a call; `outcome` is None for success, FAILED or a classify() result"""
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == THROTTLED:
+                if epoch == self.epoch:
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self.epoch += 1
+            elif outcome is None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class GeeRunner:
+    """Runs Earth Engine work concurrently under an adaptive limit
+
+    Calling the runner runs a callable in the current thread, with retries;
+    it is meant for a script's top-level work, which may itself use
+    submit() and map() to run many EE requests concurrently. Those go
+    through the thread pool and the adaptive limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        initial_concurrency: int | None = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_cap: float = BACKOFF_CAP,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        max_concurrency = max(1, int(max_concurrency))
+        if initial_concurrency is None:
+            initial_concurrency = min(DEFAULT_INITIAL_CONCURRENCY, max_concurrency)
+        self.limit = AdaptiveLimit(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+        self.pool = ThreadPoolExecutor(max_concurrency, thread_name_prefix="gee")
+        self.stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls) -> GeeRunner:
+        """Runner configured by TECLI_GEE_MAX_CONCURRENCY and TECLI_GEE_MAX_RETRIES"""
+        return cls(
+            max_concurrency=int(
+                os.environ.get("TECLI_GEE_MAX_CONCURRENCY") or DEFAULT_MAX_CONCURRENCY
+            ),
+            max_retries=int(os.environ.get("TECLI_GEE_MAX_RETRIES") or DEFAULT_MAX_RETRIES),
+        )
+
+    def __enter__(self) -> GeeRunner:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Wait for submitted work and stop the pool"""
+        self.pool.shutdown(wait=True)
+
+    def _count(self, **counts: int) -> None:
+        with self.stats_lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _retry_delay(self, error: BaseException, attempt: int, delay: float) -> float | None:
+        """Seconds to wait before retrying after `error`, or None to raise it"""
+        outcome = classify(error)
+        if outcome is None or attempt >= self.max_retries:
+            return None
+        self._count(
+            retries=1, throttled=int(outcome == THROTTLED), timeouts=int(outcome == TIMED_OUT)
+        )
+        return min(
+            self.backoff_cap, random.uniform(self.backoff_base, max(self.backoff_base, delay * 3))
+        )
+
+    def __call__(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run `function` in this thread, retrying throttled and timed-out calls"""
+        self._count(calls=1)
+        delay = self.backoff_base
+        attempt = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                retry_delay = self._retry_delay(error, attempt, delay)
+                if retry_delay is None:
+                    raise
+                delay = retry_delay
+            attempt += 1
+            self.sleep(delay)
+
+    def _limited_call(self, function: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        self._count(calls=1)
+        delay = self.backoff_base
+        attempt = 0
+        while True:
+            epoch = self.limit.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                self.limit.release(epoch, classify(error) or FAILED)
+                retry_delay = self._retry_delay(error, attempt, delay)
+                if retry_delay is None:
+                    raise
+                delay = retry_delay
+            else:
+                self.limit.release(epoch)
+                return result
+            attempt += 1
+            self.sleep(delay)
+
+    def submit(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Run `function` on the pool under the adaptive limit"""
+        return self.pool.submit(self._limited_call, function, args, kwargs)
+
+    def map(self, function: Callable[..., Any], *iterables: Iterable[Any]) -> list[Any]:
+        """Results of `function` over the iterables, run concurrently, in order"""
+        futures = [self.submit(function, *args) for args in zip(*iterables, strict=False)]
+        return [future.result() for future in futures]
+
+    def stats(self) -> dict[str, Any]:
+        with self.stats_lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "timeouts": self.timeouts,
+                "concurrency": round(self.limit.limit, 2),
+                "peak_in_flight": self.limit.peak_in_flight,
+            }
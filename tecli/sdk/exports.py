@@ -0,0 +1,402 @@
+"""Tiled, parallel Earth Engine image exports
+
+A single Export.image task over a continental region runs as one long job.
+TiledExport splits the region's bounding box into a grid of tiles holding
+at most `max_pixels` pixels each, drops the tiles that do not touch the
+region, and runs one export per tile with at most `max_concurrent` tasks
+in flight. Failed tiles are resubmitted, and so are tiles whose submission
+Earth Engine refused (e.g. with a full task queue). The manifest lists every
+tile with its bounds, tasks and output files, for mosaicking them afterwards
+(e.g. with gdalbuildvrt). If run() is interrupted, the tasks it started are
+cancelled.
+
+    from tecli.sdk.exports import TiledExport
+
+    export = TiledExport(image, geojson, scale=250, bucket="my-bucket",
+                         description=execution_id)
+    manifest = export.run(progress=logger.send_progress)
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import math
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+# Approximate metres per degree, to size tiles before anything is sent to EE
+METERS_PER_DEGREE = 111_320.0
+# CRSs in degrees, where EE turns `scale` into degrees at the equator, so a
+# pixel spans the same longitude at every latitude
+GEOGRAPHIC_CRS = frozenset({"EPSG:4326", "CRS:84", "EPSG:4269", "EPSG:4258"})
+DEFAULT_MAX_PIXELS = 1e9
+# Tiles are sized with approximate geometry, so EE is allowed some slack
+MAX_PIXELS_MARGIN = 2
+DEFAULT_MAX_CONCURRENT = 8
+DEFAULT_MAX_RETRIES = 2
+POLL_INTERVAL = 10.0
+# Failed status requests of a task in a row before it is given up on
+MAX_STATUS_ERRORS = 5
+# Export task descriptions are limited to 100 characters
+MAX_DESCRIPTION = 100
+ACTIVE_STATES = frozenset({"UNSUBMITTED", "READY", "RUNNING", "CANCEL_REQUESTED"})
+FAILED_STATES = frozenset({"FAILED", "CANCELLED"})
+
+Bounds = tuple[float, float, float, float]
+
+
+def geojson_polygons(geojson: Any) -> list[list[list[Sequence[float]]]]:
+    """Polygons (lists of rings) of a GeoJSON object or bare polygon coordinates"""
+    if isinstance(geojson, dict):
+        if geojson.get("type") == "FeatureCollection":
+            return [p for feature in geojson["features"] for p in geojson_polygons(feature)]
+        if geojson.get("type") == "Feature":
+            return geojson_polygons(geojson["geometry"])
+        if geojson.get("type") == "MultiPolygon":
+            return list(geojson["coordinates"])
+        if geojson.get("type") == "Polygon":
+            return [geojson["coordinates"]]
+        raise ValueError(f"Unsupported geometry type {geojson.get('type')}")
+    # Coordinates: a polygon is a list of rings, a ring a list of positions
+    if isinstance(geojson[0][0][0], (int, float)):
+        return [geojson]
+    return list(geojson)
+
+
+def polygons_bounds(polygons: Iterable[Sequence[Sequence[Sequence[float]]]]) -> Bounds:
+    """(west, south, east, north) of the outer rings of `polygons`"""
+    xs, ys = [], []
+    for polygon in polygons:
+        for x, y, *_ in polygon[0]:
+            xs.append(x)
+            ys.append(y)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _point_in_ring(x: float, y: float, ring: Sequence[Sequence[float]]) -> bool:
+    inside = False
+    previous = ring[-1]
+    for point in ring:
+        if (point[1] > y) != (previous[1] > y):
+            crossing = point[0] + (y - point[1]) * (previous[0] - point[0]) / (
+                previous[1] - point[1]
+            )
+            if x < crossing:
+                inside = not inside
+        previous = point
+    return inside
+
+
+def _segment_hits_box(a: Sequence[float], b: Sequence[float], bounds: Bounds) -> bool:
+    """Whether segment ab intersects the box (Liang-Barsky clipping)"""
+    west, south, east, north = bounds
+    low, high = 0.0, 1.0
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    for p, q in ((-dx, a[0] - west), (dx, east - a[0]), (-dy, a[1] - south), (dy, north - a[1])):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                low = max(low, t)
+            else:
+                high = min(high, t)
+            if low > high:
+                return False
+    return True
+
+
+def box_intersects(bounds: Bounds, polygons: Iterable[Sequence[Sequence[Sequence[float]]]]) -> bool:
+    """Whether the box touches any of the polygons (holes are ignored)"""
+    west, south, east, north = bounds
+    center = ((west + east) / 2, (south + north) / 2)
+    for polygon in polygons:
+        ring = polygon[0]
+        if _point_in_ring(center[0], center[1], ring):
+            return True
+        previous = ring[-1]
+        for point in ring:
+            if _segment_hits_box(previous, point, bounds):
+                return True
+            previous = point
+    return False
+
+
+@dataclass
+class Tile:
+    """One cell of the export grid"""
+
+    index: int
+    row: int
+    col: int
+    bounds: Bounds
+    file_name_prefix: str
+    description: str
+    attempts: int = 0
+    state: str = "PENDING"
+    task: Any = None
+    task_ids: list[str] = field(default_factory=list)
+    progress: float = 0.0
+    error: str | None = None
+    status_errors: int = 0
+
+    @property
+    def region(self) -> list[list[list[float]]]:
+        west, south, east, north = self.bounds
+        return [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+
+
+def grid_shape(
+    bounds: Bounds, scale: float, max_pixels: float, crs: str = "EPSG:4326"
+) -> tuple[int, int]:
+    """(rows, cols) of a grid whose cells hold at most `max_pixels` pixels in `crs`"""
+    west, south, east, north = bounds
+    width = (east - west) * METERS_PER_DEGREE / scale
+    if crs.upper() not in GEOGRAPHIC_CRS:
+        # Pixels of `scale` metres: a degree of longitude narrows with latitude
+        # (the poleward edge, where it is narrowest, is not the one that counts)
+        latitude = math.radians(min(abs(south), abs(north)) if south * north > 0 else 0.0)
+        width *= max(math.cos(latitude), 0.01)
+    height = (north - south) * METERS_PER_DEGREE / scale
+    cols = max(1, math.ceil(width / math.sqrt(max_pixels)))
+    rows = max(1, math.ceil(height / math.sqrt(max_pixels)))
+    # Square cells can hold fewer pixels than allowed; merge columns if so
+    while cols > 1 and math.ceil(width / (cols - 1)) * math.ceil(height / rows) <= max_pixels:
+        cols -= 1
+    return rows, cols
+
+
+def plan_tiles(
+    region: Any,
+    scale: float,
+    max_pixels: float = DEFAULT_MAX_PIXELS,
+    file_name_prefix: str = "export",
+    description: str = "export",
+    crs: str = "EPSG:4326",
+) -> list[Tile]:
+    """Tiles covering a GeoJSON region at `scale` metres per pixel of `crs`"""
+    polygons = geojson_polygons(region)
+    bounds = polygons_bounds(polygons)
+    rows, cols = grid_shape(bounds, scale, max_pixels, crs)
+    west, south, east, north = bounds
+    width = (east - west) / cols
+    height = (north - south) / rows
+    tiles: list[Tile] = []
+    for row in range(rows):
+        for col in range(cols):
+            # Rows run from north to south like the image rows
+            tile_bounds = (
+                west + col * width,
+                south if row == rows - 1 else north - (row + 1) * height,
+                east if col == cols - 1 else west + (col + 1) * width,
+                north - row * height,
+            )
+            if rows * cols > 1 and not box_intersects(tile_bounds, polygons):
+                continue
+            suffix = f"r{row:03d}c{col:03d}"
+            tiles.append(
+                Tile(
+                    index=len(tiles),
+                    row=row,
+                    col=col,
+                    bounds=tile_bounds,
+                    file_name_prefix=f"{file_name_prefix}_{suffix}",
+                    description=f"{description[: MAX_DESCRIPTION - len(suffix) - 1]}_{suffix}",
+                )
+            )
+    return tiles
+
+
+class TiledExport:
+    """Exports an image to Cloud Storage as parallel per-tile tasks
+
+    `image` is clipped to the region, and every tile is exported with the
+    same `scale` and `crs`, so the outputs line up for mosaicking. Tasks are
+    polled every `poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        image: Any,
+        region: Any,
+        scale: float,
+        bucket: str,
+        description: str,
+        file_name_prefix: str | None = None,
+        crs: str = "EPSG:4326",
+        max_pixels: float = DEFAULT_MAX_PIXELS,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        poll_interval: float = POLL_INTERVAL,
+        export_options: dict[str, Any] | None = None,
+        ee: Any = None,
+        sleep: Callable[[float], None] | None = None,
+    ) -> None:
+        self.ee = ee or importlib.import_module("ee")
+        self.region = region
+        self.scale = scale
+        self.bucket = bucket
+        self.description = description
+        self.file_name_prefix = file_name_prefix or description
+        self.crs = crs
+        self.max_pixels = max_pixels
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.export_options = export_options or {}
+        self.sleep = sleep or time.sleep
+        self.tiles = plan_tiles(region, scale, max_pixels, self.file_name_prefix, description, crs)
+        self.image = image.clip(self.ee.Geometry.MultiPolygon(geojson_polygons(region)))
+
+    def submit(self, tile: Tile) -> None:
+        """Start the export task of a tile"""
+        options = {"maxPixels": int(self.max_pixels * MAX_PIXELS_MARGIN), **self.export_options}
+        task = self.ee.batch.Export.image.toCloudStorage(
+            image=self.image,
+            description=tile.description,
+            bucket=self.bucket,
+            fileNamePrefix=tile.file_name_prefix,
+            region=tile.region,
+            scale=self.scale,
+            crs=self.crs,
+            **options,
+        )
+        task.start()
+        tile.task = task
+        tile.attempts += 1
+        tile.state = "READY"
+        tile.progress = 0.0
+        task_id = getattr(task, "id", None)
+        if task_id:
+            tile.task_ids.append(task_id)
+
+    def start(self, tile: Tile) -> bool:
+        """Submit a tile, recording the error if Earth Engine refuses it
+
+        A refused tile is PENDING, to be submitted again, until it has used
+        its `max_retries` resubmissions; it is FAILED after that.
+        """
+        try:
+            self.submit(tile)
+        except Exception as error:  # ee.EEException, e.g. too many tasks queued
+            tile.attempts += 1
+            tile.error = str(error)
+            tile.state = "PENDING" if tile.attempts <= self.max_retries else "FAILED"
+            return False
+        return True
+
+    def poll(self, tile: Tile) -> None:
+        """Update a submitted tile from its task status, resubmitting failures
+
+        Status requests that fail are tried again at the next poll; after
+        MAX_STATUS_ERRORS in a row the tile is left in the UNKNOWN state,
+        its task ids in the manifest.
+        """
+        try:
+            status = tile.task.status()
+        except Exception as error:
+            tile.status_errors += 1
+            tile.error = str(error)
+            if tile.status_errors >= MAX_STATUS_ERRORS:
+                tile.state = "UNKNOWN"
+            return
+        tile.status_errors = 0
+        tile.state = status.get("state", tile.state)
+        tile.progress = float(status.get("progress", 0.0) or 0.0)
+        if tile.state in FAILED_STATES:
+            tile.error = status.get("error_message")
+            if tile.attempts <= self.max_retries:
+                self.start(tile)
+        elif tile.state == "COMPLETED":
+            tile.progress = 1.0
+
+    def cancel(self, tiles: Iterable[Tile] | None = None) -> None:
+        """Cancel the running tasks of `tiles` (default: all), as far as EE allows"""
+        for tile in self.tiles if tiles is None else tiles:
+            if tile.task is None or tile.state not in ACTIVE_STATES:
+                continue
+            try:
+                tile.task.cancel()
+            except Exception as error:
+                tile.error = f"could not cancel: {error}"
+            else:
+                tile.state = "CANCEL_REQUESTED"
+
+    def progress(self) -> float:
+        """Fraction of the tiles exported, counting partial progress"""
+        if not self.tiles:
+            return 1.0
+        return sum(tile.progress for tile in self.tiles) / len(self.tiles)
+
+    def run(self, progress: Callable[[float], Any] | None = None) -> dict[str, Any]:
+        """Export every tile, reporting the overall fraction done to `progress`
+
+        Returns the manifest; its `complete` member is false if any tile
+        still failed after `max_retries` resubmissions. If anything raises
+        out of the loop (including KeyboardInterrupt), the running tasks are
+        cancelled first.
+        """
+        pending = deque(self.tiles)
+        active: list[Tile] = []
+        try:
+            while pending or active:
+                refused = []
+                while pending and len(active) < self.max_concurrent:
+                    tile = pending.popleft()
+                    if self.start(tile):
+                        active.append(tile)
+                    elif tile.state == "PENDING":
+                        refused.append(tile)
+                # Submitted again after the poll interval
+                pending.extend(refused)
+                for tile in list(active):
+                    self.poll(tile)
+                    if tile.state == "PENDING":
+                        active.remove(tile)
+                        pending.append(tile)
+                    elif tile.state not in ACTIVE_STATES:
+                        active.remove(tile)
+                if progress is not None:
+                    progress(self.progress())
+                # Tasks that complete at once, as those of a stub, end the
+                # loop without waiting
+                if pending or active:
+                    self.sleep(self.poll_interval)
+        except BaseException:
+            self.cancel(active)
+            raise
+        return self.manifest()
+
+    def manifest(self) -> dict[str, Any]:
+        """Description of the export and its tiles, JSON-serializable"""
+        return {
+            "description": self.description,
+            "bucket": self.bucket,
+            "scale": self.scale,
+            "crs": self.crs,
+            "complete": all(tile.state == "COMPLETED" for tile in self.tiles),
+            "tiles": [
+                {
+                    "index": tile.index,
+                    "row": tile.row,
+                    "col": tile.col,
+                    "bounds": list(tile.bounds),
+                    "state": tile.state,
+                    "attempts": tile.attempts,
+                    "task_ids": tile.task_ids,
+                    "error": tile.error,
+                    # Large tiles are written as several files with this prefix
+                    "uri": f"gs://{self.bucket}/{tile.file_name_prefix}*.tif",
+                }
+                for tile in self.tiles
+            ],
+        }
+
+    def save_manifest(self, path: str) -> None:
+        with open(path, "w") as outfile:
+            json.dump(self.manifest(), outfile, indent=2)
@@ -1,17 +1,48 @@
 """Create command"""
 
+import ast
 import base64
+import gzip
+import hashlib
 import json
 import logging
 import os
 import subprocess
+import sys
 import tempfile
 import time
-from shutil import copyfile, copytree
+from shutil import copyfile, copytree, ignore_patterns
 
-from tecli import config
+from termcolor import colored
 
-from .info import read_configuration
+from tecli import cache, config, log, threads, wheelhouse
+from tecli.workspace import read_configuration
+
+RUN_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "run")
+SDK_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "sdk")
+# Larger parameters are passed through a mounted file instead of argv
+INLINE_PARAMS_LIMIT = 32 * 1024
+PARAMS_FILE = "params.json.gz"
+CONTAINER_PARAMS_FILE = "/tmp/tecli/params.json.gz"
+CONTAINER_RUNNER = "/project/tecli_runner.py"
+CONTAINER_ENV = ("ENV", "EE_SERVICE_ACCOUNT_JSON", "ROLLBAR_SCRIPT_TOKEN")
+# Settings of the gee_runner given to scripts, from ~/.tecli.yml
+GEE_RUNNER_SETTINGS = {
+    "TECLI_GEE_MAX_CONCURRENCY": "gee_max_concurrency",
+    "TECLI_GEE_MAX_RETRIES": "gee_max_retries",
+}
+PROFILE_MODES = ("cpu", "mem")
+CONTAINER_GETINFO_CACHE_DIR = "/tmp/tecli/getinfo"
+# Limits of the getInfo cache, from ~/.tecli.yml
+GETINFO_CACHE_SETTINGS = {
+    "TECLI_GETINFO_CACHE_TTL": "getinfo_cache_ttl",
+    "TECLI_GETINFO_CACHE_MAX_SIZE": "getinfo_cache_max_size",
+}
+PROFILE_DIR = "profile"
+CONTAINER_PROFILE_DIR = "/tmp/tecli/profile"
+PROFILE_SUMMARY_ROWS = 10
+# Build profile of `trends start --optimized`, see the file
+OPTIMIZED_DOCKERFILE = "Dockerfile.optimized"
 
 
 def query_to_dict(query):
@@ -23,23 +54,41 @@ def query_to_dict(query):
     return query_data
 
 
+def read_params(param, payload):
+    """Parameters of a run, from a query string and a JSON payload file"""
+    param_dict = query_to_dict(param) if param else {}
+    if payload:
+        with open(payload) as data_file:
+            param_dict.update(json.load(data_file))
+    return param_dict
+
+
 def read_gee_service_account():
     """Obtain Google Earth Engine service account JSON"""
     return config.get("EE_SERVICE_ACCOUNT_JSON")
 
 
-def build_docker(tempdir, dockerid):
+def environment_image(configuration):
+    """Base image of the project's environment"""
+    environment = configuration.get("environment", "trends.earth-environment")
+    environment_version = configuration.get("environment_version", "0.1.6")
+    return f"conservationinternational/{environment}:{environment_version}"
+
+
+def build_docker(tempdir, dockerid, pip_options=""):
     """Build docker"""
     try:
         config = read_configuration()
         environment = config.get("environment", "trends.earth-environment")
         environment_version = config.get("environment_version", "0.1.6")
-        logging.debug(f"Building with environment {environment}:{environment_version}...")
+        logging.debug("Building with environment %s:%s...", environment, environment_version)
         subprocess.run(
-            f'docker build --build-arg="ENVIRONMENT={environment}" --build-arg="ENVIRONMENT_VERSION={environment_version}" -t {dockerid} .',
+            f'docker build --build-arg="ENVIRONMENT={environment}" --build-arg="ENVIRONMENT_VERSION={environment_version}" --build-arg="PIP_OPTIONS={pip_options}" -t {dockerid} .',
             shell=True,
             check=True,
             cwd=tempdir,
+            # The Dockerfiles mount the wheels with RUN --mount
+            env=dict(os.environ, DOCKER_BUILDKIT="1"),
         )
         return True
     except subprocess.CalledProcessError as error:
@@ -47,43 +96,382 @@ def build_docker(tempdir, dockerid):
         return False
 
 
-def run_docker(tempdir, dockerid, param):
-    """Run docker"""
+def run_takes_gee_runner(src_dir):
+    """Whether the run() of the script in `src_dir` has a gee_runner argument"""
     try:
-        service_account = read_gee_service_account()
-        rollbar_token = config.get("ROLLBAR_SCRIPT_TOKEN")
-        subprocess.run(
-            f"docker run -e ENV=dev -e EE_SERVICE_ACCOUNT_JSON={service_account} -e ROLLBAR_SCRIPT_TOKEN={rollbar_token} --rm {dockerid} {param}",
-            shell=True,
-            check=True,
-            cwd=tempdir,
-        )
-        return True
-    except subprocess.CalledProcessError as error:
-        logging.error(error)
+        with open(os.path.join(src_dir, "main.py"), "rb") as infile:
+            tree = ast.parse(infile.read())
+    except (OSError, SyntaxError):
         return False
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "run":
+            arguments = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+            return any(argument.arg == "gee_runner" for argument in arguments)
+    return False
+
+
+def getinfo_cache_dir():
+    """Host directory of the getInfo cache shared by local runs"""
+    return os.path.expanduser(config.get("getinfo_cache_dir") or cache.default_dir("getinfo"))
+
+
+def configured_env(settings):
+    """`-e NAME=value` arguments for the ~/.tecli.yml keys of `settings` that are set"""
+    arguments = []
+    for name, key in settings.items():
+        value = config.get(key)
+        if value not in ("", None):
+            arguments += ["-e", f"{name}={value}"]
+    return arguments
+
+
+def docker_run_command(
+    tempdir,
+    dockerid,
+    params,
+    profile=None,
+    gee_runner=False,
+    getinfo_cache=False,
+    startup=False,
+    limits=None,
+    batch_logs=False,
+):
+    """Arguments of the `docker run` command that runs the script with `params`
+
+    Parameters up to INLINE_PARAMS_LIMIT bytes of JSON are passed base64
+    encoded on the command line, as the environment image expects. Larger
+    ones are gzipped into a file mounted into the container and read by
+    run/runner.py, so their size is not bound by argument length limits.
+    With `profile`, run/runner.py also profiles the script and writes its
+    reports to the PROFILE_DIR directory of `tempdir`. With `gee_runner`, it
+    passes a tecli.sdk GeeRunner to the script's run(). With `getinfo_cache`,
+    the script's getInfo() results are cached in getinfo_cache_dir(), and
+    the container runs as the invoking user. With `startup`, it prints the time from now to the first line of run().
+    `limits` (from tecli.threads.limits()) bounds its CPUs and threads.
+    With `batch_logs`, the script's logger is a tecli.sdk BatchingLogger.
+    """
+    command = ["docker", "run", "--rm"]
+    # Values come from the environment of the docker process, which keeps
+    # secrets out of the command line
+    for name in CONTAINER_ENV:
+        command += ["-e", name]
+
+    if limits:
+        command += threads.docker_arguments(limits)
+
+    if gee_runner:
+        command += ["-e", "TECLI_GEE_RUNNER=1"] + configured_env(GEE_RUNNER_SETTINGS)
+
+    if getinfo_cache:
+        cache_dir = getinfo_cache_dir()
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        # Private to the user, as a shared cache could be poisoned; the
+        # container runs as the user to write to it
+        os.chmod(cache_dir, 0o700)
+        command += [
+            "--user",
+            f"{os.getuid()}:{os.getgid()}",
+            "-e",
+            "HOME=/tmp",
+            "-v",
+            f"{cache_dir}:{CONTAINER_GETINFO_CACHE_DIR}",
+            "-e",
+            "TECLI_GETINFO_CACHE=1",
+            "-e",
+            f"TECLI_GETINFO_CACHE_DIR={CONTAINER_GETINFO_CACHE_DIR}",
+        ] + configured_env(GETINFO_CACHE_SETTINGS)
+
+    if profile:
+        profile_dir = os.path.join(tempdir, PROFILE_DIR)
+        os.makedirs(profile_dir, exist_ok=True)
+        # Writable by the user the container runs as
+        os.chmod(profile_dir, 0o777)
+        command += [
+            "-v",
+            f"{profile_dir}:{CONTAINER_PROFILE_DIR}",
+            "-e",
+            f"TECLI_PROFILE={profile}",
+            "-e",
+            f"TECLI_PROFILE_DIR={CONTAINER_PROFILE_DIR}",
+        ]
+
+    if batch_logs:
+        command += ["-e", "TECLI_BATCH_LOGS=1"]
+
+    if startup:
+        command += ["-e", f"TECLI_STARTED_AT={time.time()}"]
+
+    serialized = json.dumps(params).encode("utf-8")
+    inline = base64.b64encode(serialized).decode("ascii")
+    if len(serialized) <= INLINE_PARAMS_LIMIT:
+        if not (profile or gee_runner or getinfo_cache or startup or batch_logs):
+            return command + [dockerid, inline]
+        return command + ["--entrypoint", "python", dockerid, CONTAINER_RUNNER, inline]
+
+    logging.debug("Passing %d bytes of parameters through a file", len(serialized))
+    params_path = os.path.join(tempdir, PARAMS_FILE)
+    with gzip.open(params_path, "wb", compresslevel=1) as outfile:
+        outfile.write(serialized)
+    # The container may run as another user
+    os.chmod(params_path, 0o644)
+    return command + [
+        "-v",
+        f"{params_path}:{CONTAINER_PARAMS_FILE}:ro",
+        "-e",
+        f"TECLI_PARAMS_FILE={CONTAINER_PARAMS_FILE}",
+        "--entrypoint",
+        "python",
+        dockerid,
+        CONTAINER_RUNNER,
+    ]
+
+
+def container_env():
+    """Environment of the docker process, holding the values of CONTAINER_ENV"""
+    return dict(
+        os.environ,
+        ENV="dev",
+        EE_SERVICE_ACCOUNT_JSON=read_gee_service_account() or "",
+        ROLLBAR_SCRIPT_TOKEN=config.get("ROLLBAR_SCRIPT_TOKEN") or "",
+    )
+
+
+def run_docker(
+    tempdir,
+    dockerid,
+    params,
+    capture=None,
+    profile=None,
+    gee_runner=False,
+    getinfo_cache=False,
+    startup=False,
+    limits=None,
+    batch_logs=False,
+):
+    """Run docker
+
+    If `capture` is a list, the output of the container is also appended to
+    it line by line while it is streamed to the console.
+    """
+    command = docker_run_command(
+        tempdir,
+        dockerid,
+        params,
+        profile,
+        gee_runner,
+        getinfo_cache,
+        startup,
+        limits,
+        batch_logs,
+    )
+    env = container_env()
+    if capture is None:
+        try:
+            subprocess.run(command, check=True, cwd=tempdir, env=env)
+            return 0
+        except subprocess.CalledProcessError as error:
+            logging.error(error)
+            return error.returncode
+
+    with subprocess.Popen(
+        command,
+        cwd=tempdir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    ) as process:
+        for line in process.stdout:
+            sys.stdout.write(line)
+            capture.append(line)
+    if process.returncode:
+        logging.error("Command '%s' returned non-zero exit status %d.", command, process.returncode)
+    return process.returncode
+
+
+def copy_sdk(context):
+    """Put tecli.sdk in the build context, without the rest of tecli"""
+    os.makedirs(os.path.join(context, "tecli"))
+    with open(os.path.join(context, "tecli", "__init__.py"), "w") as outfile:
+        outfile.write('"""Script-side part of the trends.earth CLI"""\n')
+    copytree(SDK_DIR, os.path.join(context, "tecli", "sdk"), ignore=ignore_patterns("__pycache__"))
+
+
+def hash_tree(digest, path):
+    """Feed the relative paths and contents of the files under `path` to `digest`"""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".pyc"):
+                continue
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8") + b"\0")
+            with open(file_path, "rb") as infile:
+                digest.update(hashlib.sha256(infile.read()).digest())
+
+
+def run_cache_key(cwd, dockerfile, param_dict, options=None):
+    """Key identifying a run by its code, requirements, environment and params
+
+    `options` are the settings of the run that change what the script does
+    or how fast, e.g. its CPU limits.
+    """
+    configuration = read_configuration()
+    src_digest = hashlib.sha256()
+    hash_tree(src_digest, cwd + "/src")
+    with open(cwd + "/requirements.txt", "rb") as infile:
+        requirements = infile.read()
+    with open(dockerfile, "rb") as infile:
+        dockerfile_content = infile.read()
+    with open(os.path.join(RUN_DIR, "runner.py"), "rb") as infile:
+        runner = infile.read()
+    sdk_digest = hashlib.sha256()
+    hash_tree(sdk_digest, SDK_DIR)
+    return cache.make_key(
+        src_digest.hexdigest(),
+        requirements,
+        dockerfile_content,
+        runner,
+        sdk_digest.hexdigest(),
+        configuration.get("environment", "trends.earth-environment"),
+        configuration.get("environment_version", "0.1.6"),
+        param_dict,
+        options or {},
+    )
+
+
+def get_run_cache(cache_dir=""):
+    """Return the run result cache configured in ~/.tecli.yml"""
+    max_size = config.get("run_cache_max_size") or 512
+    return cache.Cache(
+        os.path.expanduser(cache_dir or config.get("run_cache_dir") or cache.default_dir("runs")),
+        max_size=int(max_size) * 1024 * 1024,
+    )
+
+
+def replay(entry):
+    """Print a cached run and return its success"""
+    logging.debug("Using cached result of a previous identical run")
+    sys.stdout.write(entry["output"])
+    sys.stdout.flush()
+    return entry["exit_status"] == 0
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
 
+def collect_profile(tempdir, target):
+    """Copy the profiling reports of a run to `target` and return its summary"""
+    source = os.path.join(tempdir, PROFILE_DIR)
+    if not os.path.exists(os.path.join(source, "summary.json")):
+        return None
+    copytree(source, target, dirs_exist_ok=True)
+    with open(os.path.join(target, "summary.json")) as infile:
+        return json.load(infile)
+
+
+def print_profile_summary(summary, target):
+    """Print the top functions or allocations of a profiled run"""
+    print(colored(f"\nProfile ({summary['mode']}), {summary['wall_seconds']}s:", "cyan"))
+    if summary["mode"] == "cpu":
+        print(f"{'cumtime':>10} {'tottime':>10} {'ncalls':>8}  function")
+        for row in summary["top_functions"][:PROFILE_SUMMARY_ROWS]:
+            print(
+                f"{row['cumtime']:>10.3f} {row['tottime']:>10.3f} {row['ncalls']:>8}  {row['function']}"
+            )
+        reports = "profile.pstats, profile.collapsed"
+    else:
+        print(f"Peak memory: {format_bytes(summary['peak_bytes'])}")
+        print(f"{'size':>10} {'blocks':>8}  location")
+        for row in summary["top_allocations"][:PROFILE_SUMMARY_ROWS]:
+            print(f"{format_bytes(row['size_bytes']):>10} {row['count']:>8}  {row['location']}")
+        reports = "memory.txt"
+    print(colored(f"Reports ({reports}) saved in {target}", "cyan"))
+
+
+def run(
+    param,
+    payload,
+    use_cache=False,
+    cache_dir="",
+    no_cache=False,
+    profile=None,
+    getinfo_cache=False,
+    optimized=False,
+    startup=False,
+    batch_logs=False,
+):
+    """Start command
+
+    With `use_cache` (or `run_cache: true` in ~/.tecli.yml), runs with the same
+    source, requirements, environment, parameters and options replay the
+    stored output instead of building and executing the script again. Only
+    successful runs are stored, so failures, often transient, run again.
+    `no_cache` disables the cache even when it is enabled in the config.
+    `profile` ("cpu" or "mem") profiles the script and saves the reports in
+    ./profile; profiled runs are never cached. `getinfo_cache` (or
+    `getinfo_cache: true` in ~/.tecli.yml) caches the Earth Engine getInfo()
+    results of the script across runs. `optimized` (or `optimized_build: true`
+    in ~/.tecli.yml) builds the image with run/Dockerfile.optimized, and
+    `startup` prints the time from `docker run` to the first line of the
+    script's run(); such runs are never cached either. `batch_logs` (or
+    `batch_logs: true` in ~/.tecli.yml) hands the script a logger that sends
+    its lines and progress from a background thread.
+    """
+    if profile and profile not in PROFILE_MODES:
+        logging.error("Unknown profile mode %s, use one of: %s", profile, ", ".join(PROFILE_MODES))
+        return False
 
-def run(param, payload):
-    """Start command"""
     logging.debug("Creating temporary file...")
     # Current folder
     cwd = os.getcwd()
     # Getting Dockerfile from /run folder
-    dockerfile = os.path.dirname(os.path.realpath(__file__)) + "/run/Dockerfile"
+    if optimized or str(config.get("optimized_build")).lower() == "true":
+        dockerfile = os.path.join(RUN_DIR, OPTIMIZED_DOCKERFILE)
+    else:
+        dockerfile = os.path.join(RUN_DIR, "Dockerfile")
 
-    payload_data = {}
-    if payload and payload != "":
-        try:
-            with open(payload) as data_file:
-                payload_data = dict(json.load(data_file))
-        except Exception as error:
-            logging.error(error)
-            return False
+    try:
+        param_dict = read_params(param, payload)
+    except Exception as error:
+        logging.error(error)
+        return False
+
+    getinfo_cache = getinfo_cache or str(config.get("getinfo_cache")).lower() == "true"
+    batch_logs = batch_logs or str(config.get("batch_logs")).lower() == "true"
+    limits = threads.limits(read_configuration())
+
+    run_cache = None
+    key = None
+    if (
+        not profile
+        and not startup
+        and not no_cache
+        and (use_cache or str(config.get("run_cache")).lower() == "true")
+    ):
+        run_cache = get_run_cache(cache_dir)
+        key = run_cache_key(
+            cwd,
+            dockerfile,
+            param_dict,
+            {"getinfo_cache": getinfo_cache, "batch_logs": batch_logs, "limits": limits},
+        )
+        entry = run_cache.get(key)
+        # Failed runs were stored by earlier versions
+        if entry is not None and entry["exit_status"] == 0:
+            return replay(entry)
 
     with tempfile.TemporaryDirectory() as tmpdirname:
         logging.debug("Copying Dockerfile ...")
         copyfile(dockerfile, tmpdirname + "/Dockerfile")
+        copyfile(os.path.join(RUN_DIR, "runner.py"), tmpdirname + "/runner.py")
+        copy_sdk(tmpdirname)
 
         logging.debug("Copying src folder ...")
         copytree(cwd + "/src", tmpdirname + "/src")
@@ -91,16 +479,48 @@ def run(param, payload):
         logging.debug("Copying requirements ...")
         copyfile(cwd + "/requirements.txt", tmpdirname + "/requirements.txt")
 
+        logging.debug("Preparing wheels ...")
+        pip_options = wheelhouse.prepare(
+            cwd + "/requirements.txt", environment_image(read_configuration()), tmpdirname
+        )
+
         logging.debug("Building ...")
         dockerid = "gef-local-" + str(time.time())
         success = False
-        if build_docker(tmpdirname, dockerid):
-            logging.debug("Reading and serializing parameters ....")
-            param_dict = query_to_dict(param) if param != "" else {}
-            param_dict.update(payload_data)
-            param_serial = json.dumps(param_dict).encode("utf-8")
-            param_serial = base64.b64encode(param_serial)
+        with log.timed("docker_build", image=dockerid) as timing:
+            timing["success"] = built = build_docker(tmpdirname, dockerid, pip_options)
+        if built:
             logging.debug("Running script....")
-            success = run_docker(tmpdirname, dockerid, param_serial)
+            output = [] if run_cache else None
+            with (
+                threads.reserve(threads.slots()),
+                log.timed("docker_run", image=dockerid) as timing,
+            ):
+                exit_status = run_docker(
+                    tmpdirname,
+                    dockerid,
+                    param_dict,
+                    capture=output,
+                    profile=profile,
+                    gee_runner=run_takes_gee_runner(cwd + "/src"),
+                    getinfo_cache=getinfo_cache,
+                    startup=startup,
+                    limits=limits,
+                    batch_logs=batch_logs,
+                )
+                timing["exit_status"] = exit_status
+            success = exit_status == 0
+            if profile:
+                target = os.path.join(cwd, PROFILE_DIR)
+                summary = collect_profile(tmpdirname, target)
+                if summary:
+                    print_profile_summary(summary, target)
+                else:
+                    logging.warning("The run did not produce a profile")
+            if run_cache and success:
+                run_cache.set(
+                    key,
+                    {"exit_status": exit_status, "output": "".join(output), "params": param_dict},
+                )
 
         return success
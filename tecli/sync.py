@@ -0,0 +1,174 @@
+"""Incremental extraction of script archives into an existing directory
+
+`trends download --sync` streams the archive and compares each file with
+the copy already in the directory, by size and then SHA-256. Only files
+that differ are written, on a thread pool, each replaced atomically, and
+unchanged files are not touched at all, so editors and file watchers see
+no churn. Files the previous download wrote that are no longer in the
+archive are deleted; the names a download wrote are kept in MANIFEST, so
+files created locally are never deleted. Plain downloads extract with
+extract_archive(), which checks member paths the same way and records the
+same normalized names.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST = ".tecli-download.json"
+DEFAULT_JOBS = 8
+CHUNK_SIZE = 1024 * 1024
+
+
+class UnsafePathError(ValueError):
+    """An archive member that would be written outside the target directory"""
+
+
+def safe_path(root, name):
+    """Path of the member `name` under `root`, or UnsafePathError"""
+    if not name or os.path.isabs(name) or name.startswith(("/", "\\")):
+        raise UnsafePathError(name)
+    parts = name.replace("\\", "/").split("/")
+    if ".." in parts:
+        raise UnsafePathError(name)
+    target = os.path.join(root, *[part for part in parts if part not in ("", ".")])
+    # Symbolic links already in the directory must not lead outside of it
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([real_root, os.path.realpath(target)]) != real_root:
+        raise UnsafePathError(name)
+    return target
+
+
+def relative_name(root, target):
+    """Name of the file `target` under `root`, as kept in MANIFEST"""
+    return os.path.relpath(target, root).replace(os.sep, "/")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(root):
+    """Relative paths written by the previous download into `root`"""
+    try:
+        with open(os.path.join(root, MANIFEST)) as infile:
+            # Older downloads kept the member names as they were, e.g. ./src
+            return {posixpath.normpath(name) for name in json.load(infile)}
+    except (OSError, ValueError):
+        return set()
+
+
+def write_manifest(root, names):
+    with open(os.path.join(root, MANIFEST), "w") as outfile:
+        json.dump(sorted(names), outfile)
+
+
+def sync_file(target, data, mode, mtime):
+    """Write `data` to `target` unless it already holds it; True if written"""
+    with contextlib.suppress(OSError):
+        if os.path.getsize(target) == len(data):
+            if file_digest(target) == hashlib.sha256(data).hexdigest():
+                return False
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tecli-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(data)
+        os.chmod(temp_path, mode & 0o777)
+        os.utime(temp_path, (mtime, mtime))
+        os.replace(temp_path, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+def remove_files(root, names):
+    """Delete the files `names` under `root`, then the directories left empty"""
+    directories = set()
+    for name in names:
+        path = safe_path(root, name)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        directories.add(os.path.dirname(path))
+    real_root = os.path.realpath(root)
+    for directory in sorted(directories, key=len, reverse=True):
+        while os.path.realpath(directory) != real_root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def sync_archive(fileobj, root, jobs=DEFAULT_JOBS):
+    """Bring `root` in line with the tar.gz archive read from `fileobj`
+
+    The archive is read as a stream, so it is never stored whole. Returns
+    the lists of `written`, `unchanged` and `deleted` relative paths.
+    """
+    os.makedirs(root, exist_ok=True)
+    previous = read_manifest(root)
+    names = set()
+    futures = {}
+    with (
+        ThreadPoolExecutor(max(1, int(jobs))) as executor,
+        tarfile.open(mode="r|gz", fileobj=fileobj) as tar,
+    ):
+        for member in tar:
+            target = safe_path(root, member.name)
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile():
+                logging.warning("Skipping %s, which is not a regular file", member.name)
+                continue
+            name = relative_name(root, target)
+            names.add(name)
+            data = tar.extractfile(member).read()
+            futures[name] = executor.submit(sync_file, target, data, member.mode, member.mtime)
+
+    result = {"written": [], "unchanged": [], "deleted": sorted(previous - names)}
+    for name, future in sorted(futures.items()):
+        result["written" if future.result() else "unchanged"].append(name)
+    remove_files(root, result["deleted"])
+    write_manifest(root, names)
+    return result
+
+
+def extract_archive(tar, root):
+    """Extract the regular files and directories of `tar` under `root`
+
+    Member paths are checked with safe_path(); links and other special
+    files are skipped. Returns the names of the files written.
+    """
+    os.makedirs(root, exist_ok=True)
+    names = []
+    for member in tar:
+        target = safe_path(root, member.name)
+        if member.isdir():
+            os.makedirs(target, exist_ok=True)
+            continue
+        if not member.isfile():
+            logging.warning("Skipping %s, which is not a regular file", member.name)
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with tar.extractfile(member) as infile, open(target, "wb") as outfile:
+            shutil.copyfileobj(infile, outfile, CHUNK_SIZE)
+        os.chmod(target, member.mode & 0o777)
+        os.utime(target, (member.mtime, member.mtime))
+        names.append(relative_name(root, target))
+    return names
@@ -0,0 +1,147 @@
+"""CPU budget of local script containers
+
+Left alone, the thread pools of OpenMP, OpenBLAS, MKL and TensorFlow in a
+container all size themselves to every core of the host, so a few runs at
+once oversubscribe it and slow each other down. The host's budget is split
+into `max_concurrent_runs` slots (default 4, at most one per CPU). Each
+`trends start` holds a slot while its container runs, waiting for one when
+all are taken, and its container gets the slot's share of the budget: as its
+`--cpus` limit, and as the size of those thread pools.
+
+The budget is `cpu_budget` in ~/.tecli.yml (default: the CPUs tecli may
+run on), and `thread_budget: false` turns the limits off. Projects can
+lower their share, or override any of the variables, in configuration.json:
+
+    {"threads": {"cpus": 2, "OMP_NUM_THREADS": 1}}
+"""
+
+import contextlib
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from tecli import cache, config
+
+# Variables sizing the thread pools of numerical libraries
+THREAD_ENV = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+)
+# TensorFlow runs independent ops in parallel, each on the intra-op threads
+INTEROP_ENV = "TF_NUM_INTEROP_THREADS"
+MAX_INTEROP_THREADS = 2
+DEFAULT_MAX_RUNS = 4
+# Seconds between checks for a free run slot
+WAIT_INTERVAL = 1.0
+
+
+def host_cpus():
+    """Number of CPUs this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def budget():
+    """CPUs shared by the local runs of this host, or None when unlimited"""
+    if str(config.get("thread_budget")).lower() == "false":
+        return None
+    value = config.get("cpu_budget")
+    return float(value) if value not in ("", None) else float(host_cpus())
+
+
+def slots():
+    """Number of local runs allowed at once, or None when unlimited
+
+    `max_concurrent_runs` in ~/.tecli.yml, at most one per CPU of the budget.
+    """
+    total = budget()
+    if total is None:
+        return None
+    value = config.get("max_concurrent_runs")
+    runs = int(value) if value not in ("", None) else DEFAULT_MAX_RUNS
+    return max(1, min(runs, int(total)))
+
+
+@contextlib.contextmanager
+def reserve(count, path=None, interval=WAIT_INTERVAL):
+    """Hold one of `count` run slots within the block
+
+    Waits for a slot when all are taken. Slots are files locked with flock(),
+    so the slot of a process that died is free again. Yields the slot
+    number, or None when `count` is None (no budget) or on systems without
+    flock().
+    """
+    if count is None or fcntl is None:
+        yield None
+        return
+    path = path or cache.default_dir("active")
+    os.makedirs(path, exist_ok=True)
+    waiting = False
+    while True:
+        for slot in range(count):
+            fd = os.open(os.path.join(path, f"slot-{slot}"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            try:
+                yield slot
+            finally:
+                os.close(fd)
+            return
+        if not waiting:
+            logging.warning("%d local runs are in progress, waiting for one to end", count)
+            waiting = True
+        time.sleep(interval)
+
+
+def container_limits(cpus, overrides=None):
+    """`--cpus` value and thread variables of a container given `cpus` CPUs
+
+    `overrides` is the "threads" member of configuration.json.
+    """
+    overrides = dict(overrides or {})
+    cpus = min(float(overrides.pop("cpus", cpus)), host_cpus())
+    threads = max(1, int(cpus))
+    env = dict.fromkeys(THREAD_ENV, threads)
+    env[INTEROP_ENV] = min(MAX_INTEROP_THREADS, threads)
+    env.update(overrides)
+    return {"cpus": cpus, "env": {name: str(value) for name, value in env.items()}}
+
+
+def limits(configuration):
+    """Limits of a container of the project, in one of the slots() of the budget
+
+    Each slot holds an equal share of the budget for the whole run, so the
+    running containers never get more than the budget between them.
+    """
+    total = budget()
+    if total is None:
+        return None
+    share = total / slots()
+    overrides = dict(configuration.get("threads") or {})
+    # Projects may take less than their share, not more
+    overrides["cpus"] = min(float(overrides.get("cpus", share)), share)
+    result = container_limits(share, overrides)
+    logging.debug("A slot of the %g CPUs budget gets %g", total, result["cpus"])
+    return result
+
+
+def docker_arguments(container):
+    """`docker run` arguments applying the limits of container_limits()"""
+    arguments = ["--cpus", f"{container['cpus']:g}"]
+    for name, value in container["env"].items():
+        arguments += ["-e", f"{name}={value}"]
+    return arguments
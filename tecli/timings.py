@@ -0,0 +1,213 @@
+"""Waterfall of the operations of one command (`trends --timings`)
+
+While a Recorder is active, every log.timed() block becomes a span, whatever
+the log level: HTTP requests with their time to first byte and whether
+they opened a connection, token refreshes, config reads and writes, archive
+creation. DNS lookups and connection setup (TCP, and TLS for HTTPS) are
+spans as well, nested in the request that needed them. Times come from the
+monotonic perf_counter and are relative to the start of the command.
+
+At the end of the command the spans are printed to stderr as a table, and
+written as a JSON record when `--timings=PATH` names a file.
+
+Only the standard library is imported up front, as this runs before
+forwarding to the agent.
+"""
+
+import contextlib
+import json
+import socket
+import sys
+import threading
+import time
+
+FLAG = "--timings"
+BAR_WIDTH = 30
+DETAIL_WIDTH = 60
+
+# The active Recorder, set by start()
+recorder = None
+
+
+class Recorder:
+    """Spans of the operations of one command"""
+
+    def __init__(self, command=None):
+        self.command = command
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enter(self):
+        """Nesting depth of a span starting now in this thread"""
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        return depth
+
+    def leave(self, operation, start, end, depth, fields):
+        """Record the span of `operation`, opened by enter() at `start`"""
+        self._local.depth = depth
+        span = {
+            "operation": operation,
+            "start_ms": round((start - self.origin) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "depth": depth,
+            "thread": threading.current_thread().name,
+        }
+        span.update(fields)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextlib.contextmanager
+    def span(self, operation, **fields):
+        depth = self.enter()
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.leave(operation, start, time.perf_counter(), depth, fields)
+
+    def connections(self):
+        """Connections this thread has opened so far"""
+        return getattr(self._local, "connections", 0)
+
+    def opened_connection(self):
+        self._local.connections = self.connections() + 1
+
+    def record(self):
+        """The JSON record of the command"""
+        spans = sorted(self.spans, key=lambda span: (span["start_ms"], span["depth"]))
+        total = max((span["start_ms"] + span["duration_ms"] for span in spans), default=0.0)
+        return {
+            "command": self.command,
+            "started_at": self.started_at,
+            "total_ms": round(total, 3),
+            "spans": spans,
+        }
+
+
+def parse_args(argv):
+    """Split `--timings[=PATH]` from `argv`
+
+    Returns (enabled, path or None, remaining arguments). Arguments after
+    `--` are left alone.
+    """
+    enabled = False
+    path = None
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--":
+            remaining.append(arg)
+            remaining.extend(args)
+            break
+        if arg == FLAG:
+            enabled = True
+        elif arg.startswith(FLAG + "="):
+            enabled = True
+            path = arg.split("=", 1)[1] or None
+        else:
+            remaining.append(arg)
+    return enabled, path, remaining
+
+
+def connections():
+    """Connections opened by this thread, or None when not recording"""
+    return recorder.connections() if recorder is not None else None
+
+
+# (owner, attribute name) -> the original function, restored by stop()
+_originals: dict = {}
+
+
+def _instrument_network():
+    """Record DNS lookups and connection setup as spans"""
+    getaddrinfo = socket.getaddrinfo
+
+    def timed_getaddrinfo(host, *args, **kwargs):
+        if recorder is None:
+            return getaddrinfo(host, *args, **kwargs)
+        with recorder.span("dns", host=host):
+            return getaddrinfo(host, *args, **kwargs)
+
+    _originals[(socket, "getaddrinfo")] = getaddrinfo
+    socket.getaddrinfo = timed_getaddrinfo
+
+    try:
+        from urllib3 import connection
+    except ImportError:
+        return
+    for cls, tls in ((connection.HTTPConnection, False), (connection.HTTPSConnection, True)):
+        connect = cls.__dict__["connect"]
+
+        def timed_connect(self, connect=connect, tls=tls):
+            if recorder is None:
+                return connect(self)
+            recorder.opened_connection()
+            with recorder.span("connect", host=self.host, tls=tls):
+                return connect(self)
+
+        _originals[(cls, "connect")] = connect
+        cls.connect = timed_connect
+
+
+def start(command=None):
+    """Record the spans of the command from now on"""
+    global recorder
+    if not _originals:
+        _instrument_network()
+    recorder = Recorder(command)
+    return recorder
+
+
+def stop():
+    """Stop recording and return the Recorder"""
+    global recorder
+    stopped, recorder = recorder, None
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+    return stopped
+
+
+def _details(span):
+    details = " ".join(
+        f"{name}={value}"
+        for name, value in span.items()
+        if name not in ("operation", "start_ms", "duration_ms", "depth", "thread")
+        and value is not None
+    )
+    if len(details) > DETAIL_WIDTH:
+        details = details[: DETAIL_WIDTH - 3] + "..."
+    return details
+
+
+def waterfall(record):
+    """The spans of a record as a text table"""
+    total = record["total_ms"] or 1.0
+    lines = [
+        f"Timings of {record['command'] or 'trends'} ({record['total_ms']:.1f} ms)",
+        f"{'start ms':>10} {'duration':>10}  {'':{BAR_WIDTH}}  operation",
+    ]
+    for span in record["spans"]:
+        offset = min(BAR_WIDTH - 1, int(span["start_ms"] / total * BAR_WIDTH))
+        length = max(1, round(span["duration_ms"] / total * BAR_WIDTH))
+        bar = (" " * offset + "#" * length)[:BAR_WIDTH]
+        name = "  " * span["depth"] + span["operation"]
+        lines.append(
+            f"{span['start_ms']:>10.1f} {span['duration_ms']:>10.1f}  {bar:{BAR_WIDTH}}  "
+            f"{name}  {_details(span)}".rstrip()
+        )
+    return "\n".join(lines)
+
+
+def report(stopped, path=None, stream=None):
+    """Print the waterfall of a stopped Recorder, and write its record to `path`"""
+    record = stopped.record()
+    print(waterfall(record), file=stream or sys.stderr)
+    if path:
+        with open(path, "w") as outfile:
+            json.dump(record, outfile, indent=2, default=str)
+    return record
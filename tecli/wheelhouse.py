@@ -0,0 +1,126 @@
+"""Host-side cache of the wheels installed in local script images
+
+`trends start` builds a fresh image for every run, and pip inside it would
+download (and sometimes compile) every requirement again. Instead, the wheels
+of a project's requirements are built once per requirements file and base
+image, inside that image so they match its Python and platform, and kept
+under ~/.cache/tecli/wheels/<key>. Each build then installs from that
+directory with --no-index, which also works offline.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from tecli import cache, config
+
+# Where the wheels are copied inside the image build context and the image
+CONTEXT_DIR = "wheels"
+IMAGE_DIR = "/tmp/wheels"
+COMPLETE_MARKER = ".complete"
+
+
+def enabled():
+    """Whether the wheelhouse is enabled in ~/.tecli.yml (it is by default)"""
+    return str(config.get("wheelhouse")).lower() != "false"
+
+
+def root_dir():
+    return os.path.expanduser(config.get("wheelhouse_dir") or cache.default_dir("wheels"))
+
+
+def wheel_dir(requirements, image):
+    """Directory holding the wheels of `requirements` (bytes) built in `image`"""
+    return os.path.join(root_dir(), cache.make_key(requirements, image)[:32])
+
+
+def build(requirements_path, image, target):
+    """Build the wheels of a requirements file inside `image` into `target`"""
+    os.makedirs(target)
+    command = [
+        "docker",
+        "run",
+        "--rm",
+        "--user",
+        f"{os.getuid()}:{os.getgid()}",
+        "-e",
+        "HOME=/tmp",
+        "-v",
+        f"{os.path.abspath(requirements_path)}:/tmp/requirements.txt:ro",
+        "-v",
+        f"{os.path.abspath(target)}:{IMAGE_DIR}",
+        "--entrypoint",
+        "pip",
+        image,
+        "wheel",
+        "--no-cache-dir",
+        "-r",
+        "/tmp/requirements.txt",
+        "-w",
+        IMAGE_DIR,
+    ]
+    logging.debug("Building wheels: %s", " ".join(command))
+    subprocess.run(command, check=True)
+
+
+def ensure(requirements_path, image):
+    """Return the wheel directory for a requirements file, building it if needed
+
+    Returns None if the wheels cannot be built, in which case the image
+    installs its requirements from the index as before.
+    """
+    with open(requirements_path, "rb") as infile:
+        requirements = infile.read()
+    path = wheel_dir(requirements, image)
+    if os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+        logging.debug("Using wheels from %s", path)
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".building-")
+    try:
+        target = os.path.join(staging, "wheels")
+        build(requirements_path, image, target)
+        open(os.path.join(target, COMPLETE_MARKER), "w").close()
+        # Publish the directory in one step; a concurrent build may have won
+        try:
+            os.rename(target, path)
+        except OSError:
+            if not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                raise
+    except (OSError, subprocess.CalledProcessError) as error:
+        logging.warning("Could not build the wheelhouse, installing from the index: %s", error)
+        return None
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+def link_tree(source, target):
+    """Hard-link (or copy) the wheels of `source` into `target`"""
+    for name in os.listdir(source):
+        if not name.endswith(".whl"):
+            continue
+        try:
+            os.link(os.path.join(source, name), os.path.join(target, name))
+        except OSError:
+            shutil.copy2(os.path.join(source, name), os.path.join(target, name))
+
+
+def prepare(requirements_path, image, context):
+    """Put the cached wheels in the build context and return pip's options
+
+    The build context always gets a (possibly empty) wheels directory so the
+    Dockerfiles can mount or COPY it unconditionally.
+    """
+    target = os.path.join(context, CONTEXT_DIR)
+    os.makedirs(target, exist_ok=True)
+    if not enabled():
+        return ""
+    wheels = ensure(requirements_path, image)
+    if not wheels:
+        return ""
+    link_tree(wheels, target)
+    return f"--no-index --find-links={IMAGE_DIR}"
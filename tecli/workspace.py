@@ -0,0 +1,61 @@
+"""Workspaces: directories holding many script projects"""
+
+import json
+import logging
+import os
+import tempfile
+
+CONFIGURATION_FILE = "configuration.json"
+
+# Directories that never contain projects and can be large
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", ".venv"}
+
+
+def read_configuration(path=None):
+    """Read the configuration file of the project in `path` (default: cwd)"""
+    to_dir = path or os.getcwd()
+    logging.debug("Reading configuration file in path: %s", to_dir)
+    with open(os.path.join(to_dir, CONFIGURATION_FILE)) as json_data:
+        return json.load(json_data)
+
+
+def write_configuration(data, path=None):
+    """Write the configuration file of the project in `path` (default: cwd)
+
+    The file is replaced atomically, so an interrupted write never leaves a
+    truncated configuration (and a lost script id) behind.
+    """
+    to_dir = path or os.getcwd()
+    logging.debug("Writing configuration file in path: %s", to_dir)
+    target = os.path.join(to_dir, CONFIGURATION_FILE)
+    try:
+        mode = os.stat(target).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=to_dir, prefix=".configuration-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as config_file:
+            json.dump(data, config_file)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def discover(root):
+    """Return the project directories under `root`, sorted
+
+    A project is a directory with a configuration.json. Projects are not
+    searched for nested projects, and hidden directories are skipped.
+    """
+    projects = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if CONFIGURATION_FILE in filenames:
+            projects.append(dirpath)
+            dirnames.clear()
+            continue
+        dirnames[:] = [
+            name for name in dirnames if not name.startswith(".") and name not in SKIP_DIRS
+        ]
+    return sorted(projects)
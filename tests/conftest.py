@@ -0,0 +1,24 @@
+"""Shared fixtures."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.mock_server import MockServer
+from tecli import config
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Mock API running locally, with a logged-in config pointing at it"""
+    with MockServer() as server:
+        config_file = tmp_path / ".tecli.yml"
+        expires_at = (datetime.now() + timedelta(days=1)).isoformat()
+        config_file.write_text(
+            f'url_api: "{server.url}"\nJWT: "access"\nrefresh_token: "refresh"\n'
+            f'token_expires_at: "{expires_at}"\n'
+        )
+        monkeypatch.setattr(config, "config_path", str(config_file))
+        monkeypatch.setattr(config, "settings", {})
+        monkeypatch.setattr(config, "_loaded_stat", None)
+        yield server
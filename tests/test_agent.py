@@ -0,0 +1,86 @@
+"""Tests for forwarding commands to the agent."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from tecli import agent, config
+
+
+def test_forward_skips_commands_that_must_run_in_process(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert agent.forward([]) is None
+    assert agent.forward(["create"]) is None
+    assert agent.forward(["info", "--help"]) is None
+    # No agent listening
+    assert agent.forward(["info"]) is None
+
+
+@pytest.mark.skipif(not hasattr(agent.socket, "AF_UNIX"), reason="requires Unix sockets")
+def test_forwarded_command_output_is_streamed_back(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.delenv("TECLI_NO_AGENT", raising=False)
+    config_file = tmp_path / ".tecli.yml"
+    config_file.write_text("url_api: http://example.invalid\n")
+    monkeypatch.setattr(config, "config_path", str(config_file))
+
+    server = agent.Agent()
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(agent.socket_path()):
+            break
+        time.sleep(0.01)
+
+    try:
+        assert agent.forward(["config", "show", "url_api"]) == 0
+        assert "Value: http://example.invalid" in capsys.readouterr().out
+        assert agent._request({"control": "status"})["requests"] == 1
+    finally:
+        agent.stop()
+        thread.join(timeout=5)
+    assert not os.path.exists(agent.socket_path())
+
+
+@pytest.mark.skipif(not hasattr(agent.socket, "AF_UNIX"), reason="requires Unix sockets")
+def test_sockets_in_directories_open_to_others_are_not_used(tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(shared))
+    monkeypatch.delenv("TECLI_NO_AGENT", raising=False)
+    # Someone else's listener at the agent's path
+    listener = agent.socket.socket(agent.socket.AF_UNIX, agent.socket.SOCK_STREAM)
+    listener.bind(agent.socket_path())
+    listener.listen()
+    listener.settimeout(0.1)
+
+    with listener:
+        assert agent.forward(["config", "set", "JWT", "secret"]) is None
+        assert agent._request({"control": "status"}) is None
+        with pytest.raises(TimeoutError):
+            listener.accept()
+
+    agent.Agent().serve()
+    assert os.path.exists(agent.socket_path())
+    shared.chmod(0o700)
+    assert agent.private_dir(str(shared))
+
+
+def test_long_lived_settings_forget_keys_removed_by_other_processes(tmp_path, monkeypatch):
+    config_file = tmp_path / ".tecli.yml"
+    config_file.write_text("JWT: token\nrefresh_token: refresh\n")
+    monkeypatch.setattr(config, "config_path", str(config_file))
+    monkeypatch.setattr(config, "settings", dict(config.DEFAULTS))
+    monkeypatch.setattr(config, "_loaded_stat", None)
+    assert config.get("JWT") == "token"
+
+    # `trends logout` in another process
+    config_file.write_text("email: user@example.com\n")
+    config.set("rate_limit", 5)
+
+    assert config.get("JWT") == ""
+    assert config.get("url_api") == config.DEFAULTS["url_api"]
+    assert "JWT" not in config_file.read_text()
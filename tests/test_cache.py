@@ -0,0 +1,40 @@
+"""Tests for the local on-disk cache."""
+
+import os
+
+from tecli import cache
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert cache.make_key("a", b"b", {"x": 1, "y": 2}) == cache.make_key(
+        "a", b"b", {"y": 2, "x": 1}
+    )
+    assert cache.make_key("ab", "c") != cache.make_key("a", "bc")
+
+
+def test_get_returns_stored_entry(tmp_path):
+    store = cache.Cache(str(tmp_path))
+    key = cache.make_key("run")
+    assert store.get(key) is None
+
+    store.set(key, {"exit_status": 0, "output": "done\n"})
+
+    assert store.get(key) == {"exit_status": 0, "output": "done\n"}
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    store = cache.Cache(str(tmp_path), max_size=10**9)
+    keys = [cache.make_key(str(i)) for i in range(3)]
+    for age, key in zip((30, 20, 10), keys, strict=True):
+        store.set(key, {"output": "x" * 100})
+        path = store._entry_path(key)
+        os.utime(path, (os.path.getmtime(path) - age,) * 2)
+    # Reading the oldest entry makes it the most recently used one
+    assert store.get(keys[0]) is not None
+
+    store.max_size = 2 * os.path.getsize(store._entry_path(keys[0]))
+    store.evict()
+
+    assert store.get(keys[0]) is not None
+    assert store.get(keys[1]) is None
+    assert store.get(keys[2]) is not None
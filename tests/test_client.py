@@ -0,0 +1,136 @@
+"""Tests for the programmatic API client against the benchmark mock API."""
+
+import asyncio
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from tecli import auth, config
+from tecli.client import ApiError, Client
+
+
+def expire_token():
+    config.set("token_expires_at", (datetime.now() - timedelta(minutes=1)).isoformat())
+
+
+def count_refreshes(monkeypatch):
+    calls = []
+    refresh = auth.refresh_access_token
+
+    def counting_refresh():
+        calls.append(1)
+        return refresh()
+
+    monkeypatch.setattr(auth, "refresh_access_token", counting_refresh)
+    return calls
+
+
+def test_client_reads_script_and_logs(server):
+    server.state.log_count = 25
+    client = Client()
+
+    assert client.get_script("abc")["id"] == "abc"
+
+    script = {}
+    entries = list(client.iter_script_logs("abc", script))
+    assert len(entries) == 25
+    assert script["status"] == "SUCCESS"
+
+
+def test_client_raises_api_error(server):
+    with pytest.raises(ApiError) as error:
+        Client().iter_logs("abc")
+    assert error.value.status_code == 404
+
+
+def test_client_publish_and_download(server, tmp_path):
+    archive = tmp_path / "script.tar.gz"
+    archive.write_bytes(server.state.archive)
+    client = Client()
+
+    assert client.publish(str(archive), public=True)["id"] == "bench-script"
+
+    path = client.download("bench-script", str(tmp_path / "out"))
+    with open(os.path.join(path, "configuration.json")) as infile:
+        assert json.load(infile)["id"] == "bench-script"
+
+
+def test_async_client_refreshes_token_once(server, monkeypatch):
+    pytest.importorskip("httpx")
+    from tecli.client import AsyncClient
+
+    expire_token()
+    refreshes = count_refreshes(monkeypatch)
+    token_reads = []
+    get = config.get
+
+    def counting_get(name):
+        if name == "JWT":
+            token_reads.append(name)
+        return get(name)
+
+    monkeypatch.setattr(config, "get", counting_get)
+
+    async def poll():
+        async with AsyncClient() as client:
+            first = await asyncio.gather(*(client.get_script(f"s{i}") for i in range(50)))
+            return first + [await client.get_script(f"s{i}") for i in range(50, 60)]
+
+    scripts = asyncio.run(poll())
+
+    assert [script["id"] for script in scripts] == [f"s{i}" for i in range(60)]
+    assert len(refreshes) == 1
+    # The token is kept on the client instead of read from the config per request
+    assert len(token_reads) < 10
+
+
+def test_async_client_downloads_through_a_temporary_file(server, tmp_path):
+    pytest.importorskip("httpx")
+    from tecli.client import AsyncClient
+
+    async def download():
+        async with AsyncClient() as client:
+            return await client.download("bench-script", str(tmp_path / "out"))
+
+    path = asyncio.run(download())
+
+    with open(os.path.join(path, "configuration.json")) as infile:
+        assert json.load(infile)["id"] == "bench-script"
+    assert "configuration.json" in json.loads(
+        (tmp_path / "out" / ".tecli-download.json").read_text()
+    )
+
+
+def test_async_client_streams_logs(server):
+    pytest.importorskip("httpx")
+    from tecli.client import AsyncClient
+
+    server.state.follow_polls = 1
+
+    async def read():
+        async with AsyncClient() as client:
+            return [entry async for entry in client.iter_logs("abc", datetime.now())]
+
+    assert len(asyncio.run(read())) == server.state.follow_batch
+
+
+def test_stateless_mode_keeps_tokens_in_memory(server, tmp_path, monkeypatch):
+    config_file = tmp_path / "missing" / ".tecli.yml"
+    monkeypatch.setattr(config, "config_path", str(config_file))
+    monkeypatch.setenv("TECLI_STATELESS", "1")
+    monkeypatch.setenv("TECLI_URL_API", server.url)
+    expired = {"exp": int((datetime.now() - timedelta(minutes=1)).timestamp())}
+    payload = base64.urlsafe_b64encode(json.dumps(expired).encode()).decode().rstrip("=")
+    monkeypatch.setenv("TECLI_JWT", f"header.{payload}.signature")
+    monkeypatch.setenv("TECLI_REFRESH_TOKEN", "refresh")
+    refreshes = count_refreshes(monkeypatch)
+
+    assert Client().get_script("abc")["id"] == "abc"
+    assert Client().get_script("abc")["id"] == "abc"
+
+    assert len(refreshes) == 1
+    assert config.get("JWT") != f"header.{payload}.signature"
+    assert not config_file.parent.exists()
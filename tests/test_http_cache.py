@@ -0,0 +1,86 @@
+"""Tests for conditional requests and the on-disk response cache."""
+
+import time
+
+import pytest
+import requests
+
+from tecli import auth, config
+from tecli.client import Client
+from tecli.http_cache import HttpCache
+
+
+def test_unchanged_script_is_served_from_304(server, tmp_path):
+    client = Client(http_cache=HttpCache(str(tmp_path / "http")))
+
+    first = client.get_script("abc")
+    second = client.get_script("abc")
+
+    assert second == first
+    assert server.state.not_modified == 1
+
+
+def test_changed_script_is_refetched(server, tmp_path):
+    client = Client(http_cache=HttpCache(str(tmp_path / "http")))
+    client.get_script("abc")
+
+    server.state.script_status = "RUNNING"
+
+    assert client.get_script("abc")["status"] == "RUNNING"
+    assert server.state.not_modified == 0
+
+
+def test_revalidation_does_not_rewrite_or_scan_the_cache(server, tmp_path, monkeypatch):
+    http_cache = HttpCache(str(tmp_path / "http"))
+    client = Client(http_cache=http_cache)
+    client.get_script("abc")
+    writes = []
+    monkeypatch.setattr(http_cache.store, "set", lambda *args, **kwargs: writes.append(kwargs))
+    monkeypatch.setattr(http_cache.store, "evict", lambda: writes.append("evict"))
+
+    for _ in range(3):
+        client.get_script("abc")
+
+    assert server.state.not_modified == 3
+    assert writes == []
+
+    # Past a tenth of the TTL, stored_at is refreshed, still without eviction
+    later = time.time() + 3 * 60 * 60
+    monkeypatch.setattr("tecli.http_cache.time.time", lambda: later)
+    client.get_script("abc")
+    assert writes == [{"evict": False}]
+
+
+class OfflineSession:
+    def request(self, *args, **kwargs):
+        raise requests.ConnectionError("offline")
+
+
+def test_cached_body_is_used_offline_within_ttl(server, tmp_path, monkeypatch):
+    client = Client(http_cache=HttpCache(str(tmp_path / "http"), ttl=60))
+    script = client.get_script("abc")
+
+    monkeypatch.setattr(auth, "session", OfflineSession)
+    config.set("max_retries", 0)
+    assert client.get_script("abc") == script
+
+    client.http_cache.ttl = 0
+    monkeypatch.setattr("tecli.http_cache.time.time", lambda: 1e12)
+    with pytest.raises(requests.ConnectionError):
+        client.get_script("abc")
+
+
+def test_responses_are_not_shared_between_identities(server, tmp_path, monkeypatch):
+    path = str(tmp_path / "http")
+    Client(http_cache=HttpCache(path, identity="alice")).get_script("abc")
+
+    Client(http_cache=HttpCache(path, identity="bob")).get_script("abc")
+    assert server.state.not_modified == 0
+    Client(http_cache=HttpCache(path, identity="alice")).get_script("abc")
+    assert server.state.not_modified == 1
+
+    settings = {"JWT": "header.eyJzdWIiOiAidXNlci0xIn0.signature", "email": "a@b.org"}
+    monkeypatch.setattr(config, "get", settings.get)
+    assert auth.identity() == "user-1"
+    settings["JWT"] = None
+    assert auth.identity() == "a@b.org"
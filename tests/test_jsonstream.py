@@ -0,0 +1,66 @@
+"""Tests for incremental JSON parsing."""
+
+import json
+
+import pytest
+
+from tecli import jsonstream
+
+
+def chunked(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+DOCUMENT = {
+    "data": {
+        "id": "abc",
+        "logs": [
+            {"id": 1, "text": "héllo, wörld ✓", "register_date": "2024-01-01T00:00:00"},
+            {"id": 12345678, "text": None, "nested": [1, [2, {"a": "]}"}]]},
+            3.25e10,
+        ],
+        "status": "RUNNING",
+    },
+    "meta": {"total": 2},
+}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_iter_items_across_chunk_boundaries(size):
+    raw = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+    meta = {}
+
+    items = list(jsonstream.iter_items(chunked(raw, size), ("data", "logs"), meta))
+
+    assert items == DOCUMENT["data"]["logs"]
+    assert meta == {"data": {"id": "abc", "status": "RUNNING"}, "meta": {"total": 2}}
+
+
+def test_items_are_yielded_before_the_document_is_complete():
+    def chunks():
+        yield b'{"data": [{"n": 1}, '
+        raise AssertionError("read past the first item")
+
+    assert next(jsonstream.iter_items(chunks(), ("data",))) == {"n": 1}
+
+
+def test_meta_fills_existing_dicts_in_place():
+    script = {}
+    raw = b'{"data": {"logs": [], "status": "SUCCESS"}}'
+
+    assert list(jsonstream.iter_items([raw], ("data", "logs"), {"data": script})) == []
+    assert script == {"status": "SUCCESS"}
+
+
+def test_missing_or_null_array_yields_nothing():
+    meta = {}
+    assert list(jsonstream.iter_items([b'{"data": {"logs": null}}'], ("data", "logs"), meta)) == []
+    assert meta == {"data": {"logs": None}}
+
+
+def test_top_level_array_and_errors():
+    assert list(jsonstream.iter_items([b"[1, 2", b"3]"], ())) == [1, 23]
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_items([b'{"data": [1, 2'], ("data",)))
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_items([b'{"data": [1]} x'], ("data",)))
@@ -0,0 +1,61 @@
+"""Tests for the logging setup."""
+
+import json
+import logging
+
+import pytest
+
+from tecli import log
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers:
+        handler.close()
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_parse_args_removes_logging_flags():
+    assert log.parse_args(["info"]) == (0, None, ["info"])
+    assert log.parse_args(["-v", "logs", "--since", "1"]) == (1, None, ["logs", "--since", "1"])
+    assert log.parse_args(["info", "-vv"]) == (2, None, ["info"])
+    assert log.parse_args(["-q", "publish"]) == (-1, None, ["publish"])
+    assert log.parse_args(["--log-json=out.jsonl", "info"]) == (0, "out.jsonl", ["info"])
+    assert log.parse_args(["--log-json", "out.jsonl", "info"]) == (0, "out.jsonl", ["info"])
+    # Flags after -- belong to Fire
+    assert log.parse_args(["info", "--", "-v"]) == (0, None, ["info", "--", "-v"])
+
+
+def test_default_setup_filters_debug_and_skips_timings(root_logger, monkeypatch):
+    log.setup()
+    clock_calls = []
+    monkeypatch.setattr(log.time, "perf_counter", lambda: clock_calls.append(1) or 0.0)
+
+    with log.timed("http_request") as timing:
+        timing["status"] = 200
+
+    assert root_logger.level == logging.WARNING
+    assert not root_logger.isEnabledFor(logging.DEBUG)
+    assert clock_calls == []
+
+
+def test_json_sink_records_timed_operations(root_logger, tmp_path):
+    path = tmp_path / "log.jsonl"
+    log.setup(verbosity=-1, json_path=str(path))
+
+    with log.timed("http_request", method="GET") as timing:
+        timing["status"] = 200
+    logging.debug("Evicted cache entry %s", "abc")
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]["operation"] == "http_request"
+    assert records[0]["method"] == "GET"
+    assert records[0]["status"] == 200
+    assert records[0]["duration_ms"] >= 0
+    assert records[1]["message"] == "Evicted cache entry abc"
+    # The console stays quiet
+    assert root_logger.handlers[0].level == logging.ERROR
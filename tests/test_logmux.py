@@ -0,0 +1,113 @@
+"""Tests for following several scripts' logs at once."""
+
+import json
+from datetime import timedelta
+
+import requests
+
+from tecli import logmux, workspace
+from tecli.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_spaces_out_reservations():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.now = 10
+    assert bucket.reserve() == 0.0
+
+
+def test_discover_finds_project_directories(tmp_path):
+    for path in ("a", "b/nested", "b/nested/inner", ".hidden/c"):
+        (tmp_path / path).mkdir(parents=True)
+        (tmp_path / path / "configuration.json").write_text("{}")
+
+    assert workspace.discover(tmp_path) == [str(tmp_path / "a"), str(tmp_path / "b/nested")]
+
+
+def test_follows_scripts_until_finished(server, monkeypatch, capsys):
+    monkeypatch.setattr(logmux.time, "sleep", lambda seconds: None)
+    server.state.log_count = 3
+    server.state.script_status = "RUNNING"
+    server.state.follow_polls = 1
+
+    # Each script's first poll after start-up gets a batch of new entries;
+    # the next poll finds the mock's log endpoint exhausted and stops.
+    def skip_history(self, watch):
+        watch.started = True
+        return True
+
+    monkeypatch.setattr(logmux.Multiplexer, "start", skip_history)
+
+    assert not logmux.run("one,two", jsonl=True, rate=1000, since=timedelta(days=1))
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    entries = [line for line in lines if "text" in line]
+    assert len(entries) == server.state.follow_batch
+    assert {line["script"] for line in lines} == {"one", "two"}
+
+
+def test_workspace_history_of_finished_scripts(server, tmp_path, capsys):
+    server.state.log_count = 2
+    for name in ("alpha", "beta"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "configuration.json").write_text(
+            json.dumps({"name": name, "id": f"{name}-id"})
+        )
+    (tmp_path / "draft").mkdir()
+    (tmp_path / "draft" / "configuration.json").write_text(json.dumps({"name": "draft"}))
+
+    assert logmux.run(workspace_dir=str(tmp_path), since=timedelta(days=1))
+
+    out = capsys.readouterr().out
+    assert "[draft] Script NOT PUBLISHED" in out
+    assert out.count("[alpha] ") == 3
+    assert "[beta] Status: SUCCESS" in out
+
+
+class FlakyClient:
+    """Scripts whose requests fail `failures[script_id]` times, then finish"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def fail(self, script_id):
+        if self.failures.get(script_id, 0):
+            self.failures[script_id] -= 1
+            raise requests.ConnectionError(f"{script_id} unreachable")
+
+    def iter_script_logs(self, script_id, script):
+        self.fail(script_id)
+        script["status"] = "RUNNING"
+        return iter([{"register_date": "2020-01-01T00:00:00", "text": f"{script_id} started"}])
+
+    def iter_logs(self, script_id, start):
+        self.fail(script_id)
+        return iter([])
+
+    def get_script(self, script_id):
+        self.fail(script_id)
+        return {"status": "SUCCESS"}
+
+
+def test_errors_of_one_script_do_not_stop_the_others(monkeypatch, capsys):
+    monkeypatch.setattr(logmux.time, "sleep", lambda seconds: None)
+    client = FlakyClient({"flaky": 2, "down": logmux.MAX_ERRORS})
+    watches = [logmux.Watch(name) for name in ("flaky", "down", "fine")]
+
+    multiplexer = logmux.Multiplexer(watches, timedelta(days=36500), rate=1000, client=client)
+    assert not multiplexer.run()
+
+    out = capsys.readouterr().out
+    assert out.count("flaky started") == 1 and out.count("fine started") == 1
+    assert "[flaky] Status: SUCCESS" in out and "[fine] Status: SUCCESS" in out
+    assert "[down] Stopped following after 5 failed requests: down unreachable" in out
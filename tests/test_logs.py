@@ -0,0 +1,47 @@
+"""Tests for the logs command helpers."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tecli import logs
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-03-01T12:30:45",
+        "2024-03-01T12:30:45Z",
+        "2024-03-01T14:30:45+02:00",
+        "2024-03-01 12:30:45",
+        "Fri, 01 Mar 2024 12:30:45 GMT",
+    ],
+)
+def test_parse_date_returns_aware_utc(value):
+    assert logs.parse_date(value) == datetime(2024, 3, 1, 12, 30, 45, tzinfo=timezone.utc)
+
+
+def test_show_logs_filters_by_since(capsys):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    old = (now - timedelta(hours=3)).isoformat()
+    recent = (now - timedelta(minutes=5)).isoformat()
+    script = {
+        "status": "SUCCESS",
+        "logs": [
+            {"register_date": old, "text": "old line"},
+            {"register_date": recent, "text": None},
+            {"register_date": recent, "text": "recent line"},
+        ],
+    }
+
+    logs.show_logs(script, timedelta(hours=1))
+
+    assert capsys.readouterr().out == f"{recent}: recent line\n"
+
+
+def test_show_logs_reports_empty_window(capsys):
+    script = {"status": "FAIL", "logs": [{"register_date": "2000-01-01T00:00:00", "text": "x"}]}
+
+    logs.show_logs(script, timedelta(hours=1))
+
+    assert capsys.readouterr().out == "No log entries in last 1:00:00\n"
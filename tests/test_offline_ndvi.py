@@ -0,0 +1,88 @@
+"""Tests for the offline NDVI trend of the example_gee_ci script."""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(__file__), "..", "examples", "example_gee_ci")
+
+
+@pytest.fixture(scope="module")
+def offline():
+    sys.path.insert(0, EXAMPLE_DIR)
+    try:
+        yield importlib.import_module("src.offline")
+    finally:
+        sys.path.remove(EXAMPLE_DIR)
+        for name in ("src", "src.offline", "src.kendall"):
+            sys.modules.pop(name, None)
+
+
+def reference_trend(offline, years, annual, kendall):
+    """Per-pixel reference implementation using plain Python loops."""
+    n, rows, cols = annual.shape
+    result = np.empty((rows, cols), dtype=np.float32)
+    for r in range(rows):
+        for c in range(cols):
+            values = annual[:, r, c]
+            valid = ~np.isnan(values)
+            s = 0
+            for j in range(0, n - 2):
+                for k in range(j + 1, n - 1):
+                    s += int(values[j] < values[k]) - int(values[j] > values[k])
+            if valid.sum() < 2:
+                result[r, c] = offline.NODATA
+                continue
+            slope = np.polyfit(np.asarray(years)[valid], values[valid], 1)[0]
+            if abs(s) <= kendall or abs(slope) <= 0.000001:
+                result[r, c] = offline.NODATA
+            else:
+                result[r, c] = slope
+    return result
+
+
+def test_qa_filter_masks_flagged_observations(offline):
+    ndvi = np.array([100, 200, 300, 400, 500])
+    qa = np.array([-1, 0, 1, 2, 3])
+    masked = offline.qa_filter(ndvi, qa)
+    assert np.isnan(masked[[0, 3, 4]]).all()
+    assert masked[1] == 200 and masked[2] == 300
+
+
+def test_trend_matches_per_pixel_reference(offline):
+    rng = np.random.default_rng(42)
+    years = list(range(2001, 2013))
+    obs, rows, cols = 4, 6, 5
+    trend = np.linspace(-200, 200, rows * cols).reshape(rows, cols)
+    ndvi = [
+        (5000 + trend * (i + 1) + rng.normal(0, 50, (obs, rows, cols))).astype(np.int16)
+        for i in range(len(years))
+    ]
+    qa = [rng.choice([-1, 0, 1, 2], size=(obs, rows, cols)) for _ in years]
+    # A pixel with no valid observations at all
+    for year_qa in qa:
+        year_qa[:, 0, 0] = 3
+
+    period = len(years) + 1
+    annual = np.stack([offline.annual_mean(n, q) for n, q in zip(ndvi, qa, strict=True)])
+    expected = reference_trend(offline, years, annual, offline.kendall_threshold(period))
+    result = offline.trend_block(years, ndvi, qa, period)
+
+    assert result[0, 0] == offline.NODATA
+    np.testing.assert_allclose(result, expected, rtol=1e-4, atol=1e-7)
+
+
+def test_streaming_blocks_cover_the_raster(offline):
+    shape = (7, 5)
+
+    def read_block(year, window):
+        rows, cols = window
+        size = (2, rows.stop - rows.start, cols.stop - cols.start)
+        return np.full(size, (year - 2000) * 100), np.zeros(size)
+
+    result = offline.ndvi_trend(read_block, 2001, 2010, shape, block_size=3)
+    np.testing.assert_allclose(result, np.full(shape, 0.01), rtol=1e-5)
@@ -0,0 +1,43 @@
+"""Tests for publishing a workspace of projects."""
+
+import json
+
+from tecli import info, publish
+
+
+def make_project(root, name, **configuration):
+    path = root / name
+    (path / "src").mkdir(parents=True)
+    (path / "src" / "main.py").write_text("def run(params, logger):\n    return 1\n")
+    (path / "requirements.txt").write_text("")
+    (path / "configuration.json").write_text(json.dumps({"name": name, **configuration}))
+    return path
+
+
+def test_publish_workspace_records_ids(server, tmp_path, capsys):
+    root = tmp_path / "scripts"
+    paths = [make_project(root, name) for name in ("alpha", "beta")]
+    paths.append(make_project(root, "gamma", id="gamma-id"))
+    (root / "broken").mkdir()
+    (root / "broken" / "configuration.json").write_text("{}")
+
+    assert not publish.run(overwrite=True, workspace_dir=str(root), jobs=2)
+
+    ids = [json.loads((path / "configuration.json").read_text())["id"] for path in paths]
+    assert ids == ["bench-script", "bench-script", "gamma-id"]
+    out = capsys.readouterr().out
+    assert "Published 3 of 4 scripts" in out
+    assert "broken  Error packaging script: Name required in configuration file" in out
+    assert not list(root.rglob("*.tar.gz"))
+    assert not list(root.rglob(".configuration-*"))
+
+
+def test_workspace_info_lists_statuses(server, tmp_path, capsys):
+    make_project(tmp_path, "alpha", id="alpha-id")
+    make_project(tmp_path, "draft")
+
+    assert info.run(workspace_dir=str(tmp_path))
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["alpha", "alpha-id", "SUCCESS"]
+    assert lines[1].split() == ["draft", "-", "NOT", "PUBLISHED"]
@@ -0,0 +1,89 @@
+"""Tests for request retries and rate limiting."""
+
+import pytest
+import requests
+
+from tecli import ratelimit
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        files = kwargs.get("files")
+        self.calls.append((method, files["file"].read() if files else None))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(ratelimit.time, "sleep", slept.append)
+    monkeypatch.setattr(ratelimit, "bucket_for", lambda url: None)
+    monkeypatch.setattr(ratelimit.config, "get", lambda name: "")
+    ratelimit.stats.reset()
+    return slept
+
+
+def test_retry_after_is_honored_for_any_method(sleeps, tmp_path):
+    archive = tmp_path / "archive"
+    archive.write_bytes(b"payload")
+    session = FakeSession(FakeResponse(429, {"Retry-After": "7"}), FakeResponse(200))
+
+    with open(archive, "rb") as infile:
+        response = ratelimit.request(session, "POST", "http://api/x", files={"file": infile})
+
+    assert response.status_code == 200
+    assert sleeps == [7.0]
+    # The upload is sent again from the start
+    assert session.calls == [("POST", b"payload"), ("POST", b"payload")]
+    assert ratelimit.stats.snapshot()["throttled_responses"] == 1
+
+
+def test_server_errors_are_retried_only_when_idempotent(sleeps):
+    assert (
+        ratelimit.request(FakeSession(FakeResponse(503)), "POST", "http://api/x").status_code == 503
+    )
+
+    session = FakeSession(FakeResponse(503), requests.ConnectionError(), FakeResponse(200))
+    assert ratelimit.request(session, "GET", "http://api/x").status_code == 200
+    assert len(sleeps) == 2
+    assert all(ratelimit.BACKOFF_BASE <= delay <= ratelimit.BACKOFF_CAP for delay in sleeps)
+    assert ratelimit.stats.snapshot()["retries"] == 2
+
+
+def test_retries_are_bounded(sleeps):
+    session = FakeSession(*[FakeResponse(502) for _ in range(ratelimit.MAX_RETRIES + 1)])
+
+    assert ratelimit.request(session, "GET", "http://api/x").status_code == 502
+    assert len(session.calls) == ratelimit.MAX_RETRIES + 1
+
+
+def test_deferred_bucket_holds_back_next_request():
+    bucket = ratelimit.TokenBucket(rate=10, clock=lambda: 0.0)
+
+    bucket.defer(3)
+
+    assert bucket.reserve() == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"), [("12", 12.0), ("-1", 0.0), ("soon", None), (None, None)]
+)
+def test_parse_retry_after(value, expected):
+    assert ratelimit.parse_retry_after(value) == expected
@@ -0,0 +1,162 @@
+"""Tests for the batching logger of scripts."""
+
+import logging
+import runpy
+import threading
+import time
+
+import pytest
+
+from tecli import start
+from tecli.sdk.batchlog import BatchingLogger
+
+# Time a sink call takes, as a request to the API would
+ROUND_TRIP = 0.002
+
+
+class SlowSink:
+    """Local sink taking ROUND_TRIP per call"""
+
+    def __init__(self):
+        self.lines = []
+        self.progress = []
+        self.calls = 0
+
+    def __call__(self, entries):
+        time.sleep(ROUND_TRIP)
+        self.calls += 1
+        self.lines.extend(entry.message for entry in entries)
+
+    def send_progress(self, value):
+        time.sleep(ROUND_TRIP)
+        self.calls += 1
+        self.progress.append(value)
+
+
+def chatty_script(logger, lines):
+    for i in range(lines):
+        logger.debug("line %d", i)
+        logger.send_progress(i * 100 // lines)
+
+
+def test_throughput_against_a_slow_sink():
+    lines = 2000
+    sink = SlowSink()
+
+    logger = BatchingLogger(sink, sink.send_progress, max_delay=0.05)
+    started = time.perf_counter()
+    chatty_script(logger, lines)
+    logging_time = time.perf_counter() - started
+    logger.close()
+
+    # Sent synchronously, every line and progress update would be a round trip
+    assert logging_time < lines * 2 * ROUND_TRIP / 10
+    assert sink.lines == [f"line {i}" for i in range(lines)]
+    assert sink.calls < lines / 10
+    # Last value wins
+    assert sink.progress[-1] == 99
+    assert sink.progress == sorted(sink.progress)
+    assert logger.stats()["dropped"] == 0
+
+
+def test_progress_is_coalesced_and_flushed():
+    sink = SlowSink()
+
+    with BatchingLogger(sink, sink.send_progress, max_delay=60) as logger:
+        for value in range(10):
+            logger.send_progress(value)
+        logger.info("done %s", "now")
+        logger.flush()
+        assert sink.progress == [9]
+        assert sink.lines == ["done now"]
+        logger.send_progress(10)
+
+    assert sink.progress == [9, 10]
+
+
+def test_full_queue_drops_debug_lines_and_holds_back_warnings():
+    release = threading.Event()
+    batches = []
+
+    def blocked_sink(entries):
+        release.wait()
+        batches.append([entry.message for entry in entries])
+
+    logger = BatchingLogger(blocked_sink, max_batch=2, max_queue=2, max_delay=0)
+    logger.debug("first")
+    # Wait for the flush thread to take "first" and block in the sink
+    while logger.queue:
+        time.sleep(0.001)
+    logger.debug("second")
+    logger.debug("third")
+    logger.debug("dropped")
+    warning = threading.Thread(target=logger.warning, args=("kept",))
+    warning.start()
+    time.sleep(0.05)
+    assert warning.is_alive()
+
+    release.set()
+    warning.join(5)
+    logger.close()
+
+    lines = [line for batch in batches for line in batch]
+    assert lines == ["first", "second", "third", "kept", "1 log lines were dropped"]
+    assert logger.stats()["dropped"] == 1
+
+
+def test_sink_errors_are_logged(caplog):
+    def failing_sink(entries):
+        raise ConnectionError("API unreachable")
+
+    with BatchingLogger(failing_sink, max_delay=0) as logger:
+        logger.error("lost")
+        logger.flush()
+
+    assert caplog.messages == ["Could not send 1 log lines: API unreachable"]
+    assert logger.stats()["sink_errors"] == 1
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_warnings_do_not_wait_on_a_stopped_flush_thread():
+    def exiting_sink(entries):
+        raise SystemExit
+
+    logger = BatchingLogger(exiting_sink, max_queue=1, max_delay=0)
+    logger.debug("first")
+    logger.thread.join(5)
+    logger.debug("queued")
+
+    logger.warning("dropped")
+
+    assert [entry.message for entry in logger.queue] == ["queued"]
+    assert logger.stats()["dropped"] == 1
+
+
+def test_runner_wraps_the_script_logger(tmp_path):
+    runner = runpy.run_path(start.RUN_DIR + "/runner.py")
+    script_logger = logging.getLogger("test_batchlog_script")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    script_logger.addHandler(handler)
+    script_logger.setLevel(logging.DEBUG)
+    progress = []
+    script_logger.send_progress = progress.append
+
+    def run(params, logger):
+        assert isinstance(logger, BatchingLogger)
+        chatty_script(logger, params["lines"])
+        return "ok"
+
+    try:
+        assert runner["with_batching_logger"](run)({"lines": 50}, script_logger) == "ok"
+    finally:
+        script_logger.removeHandler(handler)
+        del script_logger.send_progress
+
+    assert [record.getMessage() for record in records] == [f"line {i}" for i in range(50)]
+    assert progress[-1] == 98
+
+    command = start.docker_run_command(str(tmp_path), "image", {}, batch_logs=True)
+    assert "TECLI_BATCH_LOGS=1" in command
+    assert command[-3:-1] == ["image", start.CONTAINER_RUNNER]
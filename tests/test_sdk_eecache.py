@@ -0,0 +1,110 @@
+"""Tests for the getInfo() cache, against a fake ee module."""
+
+import logging
+import os
+import runpy
+import types
+
+from tecli import start
+from tecli.sdk import eecache
+
+
+class FakeObject:
+    def __init__(self, graph, ee):
+        self.graph = graph
+        self.ee = ee
+
+    def getInfo(self):
+        return self.ee.data.computeValue(self)
+
+
+def make_ee():
+    ee = types.SimpleNamespace(computed=[])
+
+    def compute_value(obj):
+        ee.computed.append(obj.graph)
+        return {"sum": len(ee.computed), "graph": obj.graph}
+
+    ee.data = types.SimpleNamespace(computeValue=compute_value)
+    ee.serializer = types.SimpleNamespace(encode=lambda obj, for_cloud_api: obj.graph)
+    return ee
+
+
+def reduce_region(ee, scale):
+    graph = {"function": "Image.reduceRegion", "arguments": {"asset": "hansen", "scale": scale}}
+    return FakeObject(graph, ee)
+
+
+def test_installed_cache_answers_repeated_expressions(tmp_path):
+    ee = make_ee()
+    original = ee.data.computeValue
+
+    for _ in range(2):
+        cache = eecache.GetInfoCache(str(tmp_path), ee=ee)
+        with cache.installed():
+            first = reduce_region(ee, 90).getInfo()
+            other = reduce_region(ee, 30).getInfo()
+
+    assert first["graph"]["arguments"]["scale"] == 90
+    assert other["graph"]["arguments"]["scale"] == 30
+    assert len(ee.computed) == 2
+    assert cache.stats() == {"hits": 2, "misses": 0}
+    assert ee.data.computeValue is original
+
+
+def test_key_ignores_member_order_but_not_values():
+    ee = make_ee()
+    a = FakeObject({"x": 1, "y": [1, 2]}, ee)
+    b = FakeObject({"y": [1, 2], "x": 1}, ee)
+    c = FakeObject({"y": [2, 1], "x": 1}, ee)
+
+    assert eecache.expression_key(ee, a) == eecache.expression_key(ee, b)
+    assert eecache.expression_key(ee, a) != eecache.expression_key(ee, c)
+    assert eecache.expression_key(ee, a) != eecache.expression_key(ee, a, namespace="prod")
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    now = [1000.0]
+    store = eecache.DiskStore(str(tmp_path), ttl=60, clock=lambda: now[0])
+    store.set("ab12", [1, 2])
+
+    now[0] += 59
+    assert store.get("ab12") == [1, 2]
+    now[0] += 2
+    assert store.get("ab12") is eecache._MISSING
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = eecache.DiskStore(str(tmp_path), max_size=3000)
+    keys = [f"{i:02d}key" for i in range(5)]
+    for age, key in enumerate(keys):
+        store.set(key, "x" * 500)
+        path = store._entry_path(key)
+        os.utime(path, (1000 + age, 1000 + age))
+    # Reading refreshes an old entry
+    assert store.get(keys[0]) == "x" * 500
+
+    store.set("new", "x" * 1000)
+
+    assert store.get(keys[0]) is not eecache._MISSING
+    assert store.get(keys[1]) is eecache._MISSING
+    assert store.get("new") == "x" * 1000
+
+
+def test_runner_skips_the_cache_when_params_disable_it(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("TECLI_GETINFO_CACHE_DIR", str(tmp_path))
+    runner = runpy.run_path(os.path.join(start.RUN_DIR, "runner.py"))
+    ee = make_ee()
+    monkeypatch.setattr(eecache.importlib, "import_module", lambda name: ee)
+
+    def run(params, logger):
+        return reduce_region(ee, 90).getInfo()["sum"]
+
+    wrapped = runner["with_getinfo_cache"](run)
+    logger = logging.getLogger("script")
+
+    assert [wrapped({}, logger) for _ in range(2)] == [1, 1]
+    assert wrapped({"getinfo_cache": False}, logger) == 2
+    with caplog.at_level(logging.DEBUG, logger="script"):
+        wrapped({}, logger)
+    assert caplog.records[-1].getMessage() == "getInfo cache: {'hits': 1, 'misses': 0}"
@@ -0,0 +1,147 @@
+"""Tests for the expression-graph analyzer and its stub ee module."""
+
+import json
+import os
+import sys
+import time
+
+from tecli import analyze
+from tecli.sdk import eegraph
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+def test_expressions_of_the_real_serializer():
+    # ee.ImageCollection(...).map(lambda img: img.select("a").add(img.select("a")))
+    # as the real serializer writes it: shared values by reference, others inline
+    expression = {
+        "result": "0",
+        "values": {
+            "1": {
+                "functionInvocationValue": {
+                    "functionName": "Image.select",
+                    "arguments": {
+                        "input": {"argumentReference": "_MAPPING_VAR_0_0"},
+                        "bandSelectors": {"constantValue": ["a"]},
+                    },
+                }
+            },
+            "2": {
+                "functionInvocationValue": {
+                    "functionName": "Image.add",
+                    "arguments": {
+                        "image1": {"valueReference": "1"},
+                        "image2": {"valueReference": "1"},
+                    },
+                }
+            },
+            "0": {
+                "functionInvocationValue": {
+                    "functionName": "Collection.map",
+                    "arguments": {
+                        "collection": {
+                            "functionInvocationValue": {
+                                "functionName": "ImageCollection.load",
+                                "arguments": {"id": {"constantValue": "MODIS/006/MOD13Q1"}},
+                            }
+                        },
+                        "baseAlgorithm": {
+                            "functionDefinitionValue": {
+                                "argumentNames": ["_MAPPING_VAR_0_0"],
+                                "body": "2",
+                            }
+                        },
+                    },
+                }
+            },
+        },
+    }
+
+    stats = eegraph.analyze_expression(expression)
+
+    assert stats.nodes == 4
+    assert stats.expanded_nodes == 5
+    assert stats.depth == 3
+    assert stats.duplicated == [{"function": "Image.select", "uses": 2, "size": 1}]
+    assert stats.payload_bytes == len(json.dumps(expression, separators=(",", ":")))
+
+
+def test_stub_records_getinfo_calls_and_exports():
+    ee = eegraph.StubEE(length=4)
+    collection = ee.ImageCollection("MODIS/006/MOD13Q1").map(
+        lambda img: img.select("NDVI").updateMask(img.select("SummaryQA").eq(0))
+    )
+
+    size = collection.toList(50).length().getInfo()
+    stats = collection.first().reduceRegion(reducer=ee.Reducer.mean()).getInfo()
+    task = ee.batch.Export.image.toCloudStorage(image=collection.mean(), bucket="b")
+    task.start()
+
+    assert size == 4
+    assert stats["NDVI"] == 0
+    assert task.status()["state"] == "COMPLETED"
+    assert [(c.kind, c.function) for c in ee.computations] == [
+        ("getInfo", "List.length"),
+        ("getInfo", "Image.reduceRegion"),
+        ("export", "image.toCloudStorage"),
+    ]
+    assert all(c.location.startswith("test_sdk_eegraph.py:") for c in ee.computations)
+    export = eegraph.analyze_expression(ee.computations[2].expression)
+    assert export.nodes == 7
+    assert export.depth == 5
+
+
+def test_equal_subexpressions_are_shared():
+    ee = eegraph.StubEE()
+    image = ee.Image("asset")
+    graph = image.select("QA").eq(1).Or(image.select("QA").eq(2))
+
+    stats = eegraph.analyze(graph, ee=ee)
+
+    assert stats.nodes == 5
+    assert stats.expanded_nodes == 7
+    assert stats.duplicated[0] == {"function": "Image.select", "uses": 2, "size": 2}
+
+
+def test_pairwise_loops_grow_the_expanded_graph_quadratically():
+    def pairwise_sum(ee):
+        images = ee.ImageCollection("c").toList(50)
+        count = images.length().getInfo()
+        pairs = [
+            ee.Image(images.get(j)).lt(ee.Image(images.get(k)))
+            for j in range(count)
+            for k in range(j + 1, count)
+        ]
+        return eegraph.analyze(ee.ImageCollection(pairs).sum(), ee=ee)
+
+    small = pairwise_sum(eegraph.StubEE(length=5))
+    large = pairwise_sum(eegraph.StubEE(length=20))
+
+    assert large.expanded_nodes > small.expanded_nodes * 15
+    assert large.duplicated[0]["function"] == "List.get"
+    assert large.duplicated[0]["uses"] == 19
+    assert eegraph.Thresholds(max_expanded_nodes=1000).exceeded(large) == [
+        f"{large.expanded_nodes} expanded nodes (limit 1000)"
+    ]
+    assert eegraph.Thresholds().exceeded(small) == []
+
+
+def test_analyze_runs_a_project_against_the_stub(monkeypatch, capsys):
+    monkeypatch.chdir(os.path.join(EXAMPLES_DIR, "example_gee_ci"))
+    # Stub tasks complete at once, so nothing waits for them
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    ee_module = sys.modules.get("ee")
+
+    assert analyze.run(as_json=True)
+    report = json.loads(capsys.readouterr().out)
+    assert [graph["kind"] for graph in report["graphs"]] == ["getInfo", "export"]
+    assert report["warnings"] == []
+
+    strict = eegraph.Thresholds(max_expanded_nodes=1000, max_getinfo=0)
+    assert not analyze.run(thresholds=strict)
+    output = capsys.readouterr().out
+    assert "image.toCloudStorage (main.py:" in output
+    assert "1 blocking getInfo() calls (limit 0)" in output
+    assert sleeps == []
+    assert sys.modules.get("ee") is ee_module
@@ -0,0 +1,128 @@
+"""Tests for the quota-aware gee_runner."""
+
+import logging
+import os
+import runpy
+import threading
+import time
+
+import pytest
+
+from tecli import config, start
+from tecli.sdk import executor
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+class EEException(Exception):
+    pass
+
+
+class FakeQuota:
+    """An EE endpoint that rejects calls beyond `limit` concurrent ones"""
+
+    def __init__(self, limit, duration=0.01):
+        self.limit = limit
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def query(self, value):
+        with self.lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise EEException("Too many concurrent aggregations.")
+            self.in_flight += 1
+        try:
+            time.sleep(self.duration)
+            return value * 2
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_classify_ee_errors():
+    assert executor.classify(EEException("Too many concurrent aggregations.")) == "throttled"
+    assert executor.classify(EEException("HTTP Error 429: Too Many Requests")) == "throttled"
+    assert executor.classify(EEException("Computation timed out.")) == "timed_out"
+    assert executor.classify(EEException("Image.load: Image asset not found.")) is None
+    assert executor.classify(EEException("Band 14290 not found")) is None
+
+
+def test_map_adapts_to_the_quota_and_beats_serial_execution():
+    quota = FakeQuota(limit=6)
+    values = list(range(120))
+
+    started = time.perf_counter()
+    with executor.GeeRunner(max_concurrency=32, backoff_base=0.001, backoff_cap=0.01) as runner:
+        results = runner.map(quota.query, values)
+    elapsed = time.perf_counter() - started
+
+    assert results == [value * 2 for value in values]
+    stats = runner.stats()
+    # It grew past its initial concurrency, then backed off on throttling
+    assert stats["peak_in_flight"] > executor.DEFAULT_INITIAL_CONCURRENCY
+    assert stats["throttled"] == quota.rejected > 0
+    assert stats["concurrency"] < 32
+    assert elapsed < len(values) * quota.duration / 3
+
+
+def test_errors_that_are_not_throttling_are_raised_without_retry():
+    calls = []
+
+    def missing_asset():
+        calls.append(1)
+        raise EEException("Image asset not found.")
+
+    with executor.GeeRunner(sleep=lambda seconds: None) as runner:
+        with pytest.raises(EEException):
+            runner(missing_asset)
+        with pytest.raises(EEException):
+            runner.submit(missing_asset).result()
+    assert len(calls) == 2
+
+
+def test_retries_are_bounded():
+    calls = []
+
+    def timing_out():
+        calls.append(1)
+        raise EEException("Computation timed out.")
+
+    with executor.GeeRunner(max_retries=2, sleep=lambda seconds: None) as runner:
+        with pytest.raises(EEException):
+            runner(timing_out)
+    assert len(calls) == 3
+    assert runner.stats()["timeouts"] == 2
+
+
+def test_runner_passes_a_gee_runner_to_scripts_that_take_one(caplog):
+    runner = runpy.run_path(os.path.join(start.RUN_DIR, "runner.py"))
+
+    def run(params, logger, gee_runner):
+        return gee_runner.map(lambda value: value + params["offset"], [1, 2, 3])
+
+    wrapped = runner["with_gee_runner"](run)
+
+    assert wrapped({"offset": 10}, logging.getLogger("script")) == [11, 12, 13]
+    assert not caplog.records
+    with caplog.at_level(logging.DEBUG, logger="script"):
+        wrapped({"offset": 10}, logging.getLogger("script"))
+    assert caplog.records[-1].getMessage().startswith("gee_runner: {'calls': 3")
+    assert start.run_takes_gee_runner(os.path.join(EXAMPLES_DIR, "example_gee_queue", "src"))
+    assert not start.run_takes_gee_runner(os.path.join(EXAMPLES_DIR, "example_gee", "src"))
+
+
+def test_gee_runner_scripts_go_through_the_runner(tmp_path, monkeypatch):
+    config_file = tmp_path / ".tecli.yml"
+    config_file.write_text("gee_max_concurrency: 40\n")
+    monkeypatch.setattr(config, "config_path", str(config_file))
+    monkeypatch.setattr(config, "_loaded_stat", None)
+    monkeypatch.setattr(config, "settings", {})
+
+    command = start.docker_run_command(str(tmp_path), "image", {"thresh": 30}, gee_runner=True)
+
+    assert command[-3:-1] == ["image", start.CONTAINER_RUNNER]
+    assert "TECLI_GEE_RUNNER=1" in command
+    assert "TECLI_GEE_MAX_CONCURRENCY=40" in command
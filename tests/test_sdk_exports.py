@@ -0,0 +1,183 @@
+"""Tests for tiled Earth Engine exports, against a stub ee module."""
+
+import itertools
+import types
+
+from tecli.sdk import exports
+
+# About 1000 x 700 km around the equator
+AOI = {
+    "type": "Polygon",
+    "coordinates": [[[0, 0], [9, 0], [9, 6.3], [0, 6.3], [0, 0]]],
+}
+
+
+class FakeImage:
+    def clip(self, geometry):
+        self.clipped_to = geometry
+        return self
+
+
+class FakeTask:
+    """Runs for `polls` status calls, then ends in `final_state`"""
+
+    ids = itertools.count()
+
+    def __init__(self, ee, options, final_state="COMPLETED", polls=2):
+        self.ee = ee
+        self.options = options
+        self.id = f"task-{next(self.ids)}"
+        self.final_state = final_state
+        self.polls = polls
+
+    def start(self):
+        if self.ee.refusals:
+            self.ee.refusals -= 1
+            raise RuntimeError("Too many tasks already in the queue")
+        self.ee.running += 1
+        self.ee.max_running = max(self.ee.max_running, self.ee.running)
+
+    def status(self):
+        self.polls -= 1
+        if self.polls > 0:
+            return {"state": "RUNNING", "progress": 0.5}
+        self.ee.running -= 1
+        return {"state": self.final_state, "error_message": "boom"}
+
+    def cancel(self):
+        self.ee.running -= 1
+        self.ee.cancelled.append(self.id)
+
+
+class FakeEE(types.SimpleNamespace):
+    def __init__(self, failures=(), refusals=0):
+        super().__init__(
+            running=0,
+            max_running=0,
+            tasks=[],
+            failures=list(failures),
+            refusals=refusals,
+            cancelled=[],
+        )
+        self.Geometry = types.SimpleNamespace(MultiPolygon=lambda coords: ("MultiPolygon", coords))
+        export_image = types.SimpleNamespace(toCloudStorage=self.to_cloud_storage)
+        self.batch = types.SimpleNamespace(Export=types.SimpleNamespace(image=export_image))
+
+    def to_cloud_storage(self, **options):
+        prefix = options["fileNamePrefix"]
+        final_state = "FAILED" if prefix in self.failures else "COMPLETED"
+        if prefix in self.failures:
+            self.failures.remove(prefix)
+        task = FakeTask(self, options, final_state)
+        self.tasks.append(task)
+        return task
+
+
+def make_export(ee, **kwargs):
+    options = {"scale": 250, "bucket": "bucket", "description": "run1", "max_pixels": 2e6}
+    options.update(kwargs)
+    return exports.TiledExport(FakeImage(), AOI, ee=ee, sleep=lambda seconds: None, **options)
+
+
+def test_tiles_respect_the_pixel_budget_and_cover_the_region():
+    tiles = exports.plan_tiles(AOI, scale=250, max_pixels=2e6)
+
+    assert len(tiles) > 1
+    for tile in tiles:
+        west, south, east, north = tile.bounds
+        pixels = (east - west) * exports.METERS_PER_DEGREE / 250
+        pixels *= (north - south) * exports.METERS_PER_DEGREE / 250
+        assert pixels <= 2e6 * 1.01
+    assert min(t.bounds[0] for t in tiles) == 0 and max(t.bounds[2] for t in tiles) == 9
+    assert min(t.bounds[1] for t in tiles) == 0 and max(t.bounds[3] for t in tiles) == 6.3
+    assert len({t.file_name_prefix for t in tiles}) == len(tiles)
+
+
+def test_tiles_outside_the_region_are_skipped():
+    # An L-shaped region leaves the north-east quarter of its bounding box empty
+    region = [[[0, 0], [8, 0], [8, 3.9], [3.9, 3.9], [3.9, 8], [0, 8], [0, 0]]]
+
+    tiles = exports.plan_tiles(region, scale=1000, max_pixels=(4 * 111.32) ** 2 * 1.1)
+
+    assert {(t.row, t.col) for t in tiles} == {(0, 0), (1, 0), (1, 1)}
+
+
+def test_run_exports_every_tile_under_the_concurrency_cap():
+    ee = FakeEE()
+    export = make_export(ee, max_concurrent=3)
+    progress = []
+
+    manifest = export.run(progress=progress.append)
+
+    assert manifest["complete"]
+    assert len(ee.tasks) == len(export.tiles) > 3
+    assert ee.max_running == 3
+    assert progress[-1] == 1.0
+    assert all(t["uri"].startswith("gs://bucket/run1_r") for t in manifest["tiles"])
+    options = ee.tasks[0].options
+    assert options["region"] == export.tiles[0].region
+    assert options["scale"] == 250 and options["crs"] == "EPSG:4326"
+
+
+def test_failed_tiles_are_resubmitted_then_reported():
+    tiles = exports.plan_tiles(AOI, scale=250, max_pixels=2e6, file_name_prefix="run1")
+    flaky, broken = tiles[0].file_name_prefix, tiles[1].file_name_prefix
+    ee = FakeEE(failures=[flaky, broken, broken])
+
+    manifest = make_export(ee, max_retries=1).run()
+
+    states = {t["index"]: (t["state"], t["attempts"]) for t in manifest["tiles"]}
+    assert states[0] == ("COMPLETED", 2)
+    assert states[1] == ("FAILED", 2)
+    assert manifest["tiles"][1]["error"] == "boom"
+    assert not manifest["complete"]
+
+
+def test_tiles_in_degrees_respect_the_pixel_budget_at_high_latitudes():
+    # In EPSG:4326 a pixel spans the same longitude at every latitude
+    region = [[[0, 70], [9, 70], [9, 76.3], [0, 76.3], [0, 70]]]
+
+    tiles = exports.plan_tiles(region, scale=250, max_pixels=2e6)
+
+    for tile in tiles:
+        west, south, east, north = tile.bounds
+        pixels = (east - west) * exports.METERS_PER_DEGREE / 250
+        pixels *= (north - south) * exports.METERS_PER_DEGREE / 250
+        assert pixels <= 2e6 * 1.01
+    # Projected in metres, tiles get wider as meridians converge
+    assert len(exports.plan_tiles(region, 250, 2e6, crs="EPSG:3413")) < len(tiles)
+
+
+def test_refused_submissions_are_retried_then_reported():
+    ee = FakeEE(refusals=2)
+
+    manifest = make_export(ee, max_retries=2, max_concurrent=2).run()
+
+    assert manifest["complete"]
+    assert [t["attempts"] for t in manifest["tiles"][:2]] == [2, 2]
+
+    ee = FakeEE(refusals=3)
+    manifest = make_export(ee, max_retries=0, max_concurrent=4).run()
+
+    states = [t["state"] for t in manifest["tiles"]]
+    assert states[:3] == ["FAILED"] * 3 and set(states[3:]) == {"COMPLETED"}
+    assert "Too many tasks" in manifest["tiles"][0]["error"]
+    assert not manifest["complete"]
+
+
+def test_interrupted_runs_cancel_their_tasks():
+    ee = FakeEE()
+    export = make_export(ee, max_concurrent=3)
+
+    def interrupt(progress):
+        raise KeyboardInterrupt
+
+    try:
+        export.run(progress=interrupt)
+    except KeyboardInterrupt:
+        pass
+
+    assert ee.cancelled == [task.id for task in ee.tasks] and len(ee.cancelled) == 3
+    assert ee.running == 0
+    manifest = export.manifest()
+    assert [t["task_ids"] for t in manifest["tiles"][:3]] == [[id_] for id_ in ee.cancelled]
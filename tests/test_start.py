@@ -0,0 +1,188 @@
+"""Tests for how local runs hand their parameters to the container."""
+
+import base64
+import gzip
+import json
+import os
+import runpy
+import shutil
+import sys
+import time
+
+from tecli import start
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+def test_small_params_are_passed_inline(tmp_path):
+    params = {"year": 2020}
+
+    command = start.docker_run_command(str(tmp_path), "image", params)
+
+    assert command[-2] == "image"
+    assert json.loads(base64.b64decode(command[-1])) == params
+    assert "EE_SERVICE_ACCOUNT_JSON" in command
+    assert not (tmp_path / start.PARAMS_FILE).exists()
+
+
+def test_large_params_are_mounted_gzipped(tmp_path):
+    params = {"geojson": "x" * (start.INLINE_PARAMS_LIMIT + 1)}
+
+    command = start.docker_run_command(str(tmp_path), "image", params)
+
+    assert command[-2:] == ["image", start.CONTAINER_RUNNER]
+    assert f"TECLI_PARAMS_FILE={start.CONTAINER_PARAMS_FILE}" in command
+    assert max(len(arg) for arg in command) < 1024
+    with gzip.open(tmp_path / start.PARAMS_FILE) as infile:
+        assert json.load(infile) == params
+
+
+def test_runner_hands_file_params_to_the_entry_point(tmp_path, monkeypatch, capsys):
+    params = {"geojson": "y" * 100_000}
+    params_file = tmp_path / "params.json.gz"
+    params_file.write_bytes(gzip.compress(json.dumps(params).encode()))
+    entry = tmp_path / "main.py"
+    entry.write_text(
+        "import base64, json, sys\nprint(len(json.loads(base64.b64decode(sys.argv[1]))['geojson']))\n"
+    )
+    monkeypatch.setenv("TECLI_PARAMS_FILE", str(params_file))
+    monkeypatch.setenv("TECLI_ENTRY", str(entry))
+    monkeypatch.setattr(sys, "argv", ["runner.py"])
+    monkeypatch.setattr(sys, "path", list(sys.path))
+
+    runpy.run_path(str(start.RUN_DIR + "/runner.py"), run_name="__main__")
+
+    assert capsys.readouterr().out == "100000\n"
+
+
+def test_profiled_runs_use_the_runner_with_a_report_mount(tmp_path):
+    params = {"year": 2020}
+
+    command = start.docker_run_command(str(tmp_path), "image", params, profile="cpu")
+
+    assert command[-3:-1] == ["image", start.CONTAINER_RUNNER]
+    assert json.loads(base64.b64decode(command[-1])) == params
+    assert "TECLI_PROFILE=cpu" in command
+    assert f"{tmp_path / start.PROFILE_DIR}:{start.CONTAINER_PROFILE_DIR}" in command
+
+
+def run_profiled(tmp_path, monkeypatch, mode):
+    entry = tmp_path / "main.py"
+    entry.write_text(
+        "def work():\n    return [str(i) * 10 for i in range(200_000)]\n\nresult = work()\n"
+    )
+    output_dir = tmp_path / "profile"
+    monkeypatch.setenv("TECLI_ENTRY", str(entry))
+    monkeypatch.setenv("TECLI_PROFILE", mode)
+    monkeypatch.setenv("TECLI_PROFILE_DIR", str(output_dir))
+    monkeypatch.setitem(sys.modules, "gefcore", None)
+    monkeypatch.setattr(sys, "argv", ["runner.py", base64.b64encode(b"{}").decode()])
+    monkeypatch.setattr(sys, "path", list(sys.path))
+
+    runpy.run_path(str(start.RUN_DIR + "/runner.py"), run_name="__main__")
+
+    return output_dir, start.collect_profile(str(tmp_path), str(tmp_path / "collected"))
+
+
+def test_cpu_profile_reports_top_functions(tmp_path, monkeypatch, capsys):
+    output_dir, summary = run_profiled(tmp_path, monkeypatch, "cpu")
+
+    assert (output_dir / "profile.pstats").stat().st_size
+    assert any(
+        "work" in line for line in (output_dir / "profile.collapsed").read_text().splitlines()
+    )
+    assert any("(work)" in row["function"] for row in summary["top_functions"])
+    start.print_profile_summary(summary, "profile")
+    assert "cumtime" in capsys.readouterr().out
+
+
+def test_mem_profile_reports_peak_and_allocations(tmp_path, monkeypatch, capsys):
+    _, summary = run_profiled(tmp_path, monkeypatch, "mem")
+
+    assert summary["peak_bytes"] > 1_000_000
+    assert summary["top_allocations"][0]["location"].endswith("main.py:2")
+    start.print_profile_summary(summary, "profile")
+    assert "Peak memory" in capsys.readouterr().out
+
+
+def test_sdk_is_copied_into_the_build_context(tmp_path):
+    start.copy_sdk(str(tmp_path))
+
+    assert (tmp_path / "tecli" / "__init__.py").exists()
+    assert (tmp_path / "tecli" / "sdk" / "exports.py").exists()
+    assert not (tmp_path / "tecli" / "start.py").exists()
+
+
+def test_startup_runs_report_the_time_to_the_first_line(tmp_path, capsys):
+    before = time.time()
+    command = start.docker_run_command(str(tmp_path), "image", {}, startup=True)
+
+    assert command[-3:-1] == ["image", start.CONTAINER_RUNNER]
+    (started_at,) = [arg for arg in command if arg.startswith("TECLI_STARTED_AT=")]
+    assert float(started_at.split("=")[1]) >= before
+
+    runner = runpy.run_path(start.RUN_DIR + "/runner.py")
+    runner["timings"]["script_import"] = 0.25
+    wrapped = runner["first_line_timed"](time.time() - 2)(lambda params, logger: params)
+
+    assert wrapped({"year": 2020}, None) == {"year": 2020}
+    output = capsys.readouterr().out
+    assert output.startswith("Time to first line of run(): 2.0")
+    assert "(importing the script took 0.250s)" in output
+
+
+def test_getinfo_cache_stays_private_to_the_user(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "getinfo"
+    cache_dir.mkdir(mode=0o777)
+    os.chmod(cache_dir, 0o777)
+    monkeypatch.setattr(start, "getinfo_cache_dir", lambda: str(cache_dir))
+    monkeypatch.setattr(start.config, "get", lambda name: "")
+
+    command = start.docker_run_command(str(tmp_path), "image", {}, getinfo_cache=True)
+
+    assert cache_dir.stat().st_mode & 0o777 == 0o700
+    user = command.index("--user")
+    assert command[user + 1] == f"{os.getuid()}:{os.getgid()}"
+    assert f"{cache_dir}:{start.CONTAINER_GETINFO_CACHE_DIR}" in command
+
+
+def test_optimized_dockerfile_splits_build_and_runtime_stages():
+    with open(os.path.join(start.RUN_DIR, start.OPTIMIZED_DOCKERFILE)) as infile:
+        dockerfile = infile.read()
+
+    assert dockerfile.count("\nFROM ") == 2
+    assert "COPY --from=build" in dockerfile
+    assert "compileall" in dockerfile.split("FROM ")[-1]
+    # The wheels stay in the build stage
+    assert "wheels" not in dockerfile.split("FROM ")[-1]
+
+
+def test_only_successful_runs_are_cached(tmp_path, monkeypatch, capsys):
+    project = tmp_path / "project"
+    shutil.copytree(os.path.join(EXAMPLES_DIR, "example_numpy"), project)
+    monkeypatch.chdir(project)
+    settings = {"run_cache": "true", "thread_budget": "false"}
+    monkeypatch.setattr(start.config, "get", lambda name: settings.get(name, ""))
+    monkeypatch.setattr(start.wheelhouse, "prepare", lambda *args: "")
+    monkeypatch.setattr(start, "build_docker", lambda *args: True)
+    exit_statuses = [1, 0]
+    runs = []
+
+    def run_docker(tempdir, dockerid, params, capture=None, **options):
+        runs.append(options)
+        capture.append("output\n")
+        return exit_statuses.pop(0)
+
+    monkeypatch.setattr(start, "run_docker", run_docker)
+    cache_dir = str(tmp_path / "cache")
+
+    assert not start.run("", "", cache_dir=cache_dir)
+    assert start.run("", "", cache_dir=cache_dir)
+    assert start.run("", "", cache_dir=cache_dir)
+    assert len(runs) == 2
+    assert capsys.readouterr().out.count("output\n") == 1
+
+    # Options changing the run are part of the key
+    exit_statuses.append(0)
+    assert start.run("", "", cache_dir=cache_dir, batch_logs=True)
+    assert len(runs) == 3
@@ -0,0 +1,112 @@
+"""Tests for incremental downloads into an existing script directory."""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+from tecli import sync
+from tecli.client import Client
+
+
+def make_archive(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = 1_600_000_000
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    return buffer
+
+
+def test_only_changes_are_written(tmp_path):
+    files = {
+        "configuration.json": b'{"name": "demo"}',
+        "src/main.py": b"def run(params, logger):\n    return 1\n",
+        "src/util/helpers.py": b"X = 1\n",
+        "src/kendall.py": b"K = [4, 6, 9]\n",
+    }
+    first = sync.sync_archive(make_archive(files), str(tmp_path))
+    assert first["written"] == sorted(files)
+    same_size_path = tmp_path / "src" / "kendall.py"
+    os.utime(same_size_path, (1, 1))
+    (tmp_path / "notes.txt").write_text("local file")
+
+    files["src/main.py"] = b"def run(params, logger):\n    return 2\n"
+    # Same size, different content
+    files["src/kendall.py"] = b"K = [4, 6, 8]\n"
+    del files["src/util/helpers.py"]
+    files["src/new.py"] = b"NEW = True\n"
+    second = sync.sync_archive(make_archive(files), str(tmp_path))
+
+    assert second == {
+        "written": ["src/kendall.py", "src/main.py", "src/new.py"],
+        "unchanged": ["configuration.json"],
+        "deleted": ["src/util/helpers.py"],
+    }
+    assert same_size_path.read_bytes() == b"K = [4, 6, 8]\n"
+    assert not (tmp_path / "src" / "util").exists()
+    assert (tmp_path / "notes.txt").exists()
+
+    os.utime(tmp_path / "configuration.json", (1, 1))
+    third = sync.sync_archive(make_archive(files), str(tmp_path))
+    assert third["written"] == [] and third["deleted"] == []
+    assert os.path.getmtime(tmp_path / "configuration.json") == 1
+
+
+@pytest.mark.parametrize(
+    "name", ["../evil.py", "/etc/evil.py", "src/../../evil.py", "link/evil.py"]
+)
+def test_unsafe_paths_are_rejected(tmp_path, name):
+    root = tmp_path / "script"
+    root.mkdir()
+    (root / "link").symlink_to(tmp_path)
+
+    with pytest.raises(sync.UnsafePathError):
+        sync.sync_archive(make_archive({name: b"boom"}), str(root))
+
+    assert not (tmp_path / "evil.py").exists()
+
+
+def test_sync_after_a_download_of_dot_prefixed_members(tmp_path):
+    files = {"./configuration.json": b"{}", "./src/main.py": b"X = 1\n"}
+    with tarfile.open(fileobj=make_archive(files), mode="r|gz") as tar:
+        names = sync.extract_archive(tar, str(tmp_path))
+    sync.write_manifest(str(tmp_path), names)
+
+    result = sync.sync_archive(make_archive(files), str(tmp_path))
+
+    assert names == ["configuration.json", "src/main.py"]
+    assert result["deleted"] == [] and result["written"] == []
+    assert (tmp_path / "src" / "main.py").read_bytes() == b"X = 1\n"
+
+    # Manifests of earlier downloads kept the names as they were
+    sync.write_manifest(str(tmp_path), list(files))
+    assert sync.sync_archive(make_archive(files), str(tmp_path))["deleted"] == []
+
+
+@pytest.mark.parametrize("name", ["../evil.py", "/etc/evil.py", "link/evil.py"])
+def test_downloads_reject_unsafe_paths(tmp_path, name):
+    root = tmp_path / "script"
+    root.mkdir()
+    (root / "link").symlink_to(tmp_path)
+
+    with tarfile.open(fileobj=make_archive({name: b"boom"}), mode="r|gz") as tar:
+        with pytest.raises(sync.UnsafePathError):
+            sync.extract_archive(tar, str(root))
+
+    assert not (tmp_path / "evil.py").exists()
+
+
+def test_client_sync_after_a_download(server, tmp_path):
+    target = str(tmp_path / "bench-script")
+    Client().download("bench-script", target)
+
+    result = Client().sync("bench-script", target)
+
+    assert result["written"] == [] and result["deleted"] == []
+    assert "configuration.json" in result["unchanged"]
@@ -0,0 +1,94 @@
+"""Tests for the CPU budget of local script containers."""
+
+import contextlib
+import threading
+
+from tecli import config, start, threads
+
+
+def use_config(monkeypatch, tmp_path, text):
+    config_file = tmp_path / ".tecli.yml"
+    config_file.write_text(text)
+    monkeypatch.setattr(config, "config_path", str(config_file))
+    monkeypatch.setattr(config, "_loaded_stat", None)
+    monkeypatch.setattr(config, "settings", {})
+
+
+def test_runs_get_a_fixed_share_of_the_budget(tmp_path, monkeypatch):
+    use_config(monkeypatch, tmp_path, "cpu_budget: 64\n")
+    monkeypatch.setattr(threads, "host_cpus", lambda: 64)
+
+    limits = threads.limits({})
+
+    assert threads.slots() == threads.DEFAULT_MAX_RUNS == 4
+    assert limits["cpus"] == 16
+    assert limits["env"]["OMP_NUM_THREADS"] == "16"
+    assert limits["env"]["OPENBLAS_NUM_THREADS"] == "16"
+    assert limits["env"]["MKL_NUM_THREADS"] == "16"
+    assert limits["env"]["TF_NUM_INTRAOP_THREADS"] == "16"
+    assert limits["env"]["TF_NUM_INTEROP_THREADS"] == "2"
+    # Never below one CPU per run
+    use_config(monkeypatch, tmp_path, "cpu_budget: 2\nmax_concurrent_runs: 100\n")
+    assert threads.slots() == 2
+    assert threads.limits({})["cpus"] == 1
+
+
+def test_runs_started_in_sequence_stay_within_the_budget(tmp_path, monkeypatch):
+    use_config(monkeypatch, tmp_path, "cpu_budget: 64\n")
+    monkeypatch.setattr(threads, "host_cpus", lambda: 64)
+    monkeypatch.setattr(threads, "WAIT_INTERVAL", 0.01)
+    slots_dir = str(tmp_path / "active")
+
+    with contextlib.ExitStack() as stack:
+        cpus = []
+        for _ in range(threads.slots()):
+            stack.enter_context(threads.reserve(threads.slots(), slots_dir))
+            cpus.append(threads.limits({})["cpus"])
+        assert sum(cpus) <= threads.budget()
+
+        # One more run waits until one of those ends
+        started = threading.Event()
+
+        def another_run():
+            with threads.reserve(threads.slots(), slots_dir, interval=0.01):
+                started.set()
+
+        waiting = threading.Thread(target=another_run)
+        waiting.start()
+        assert not started.wait(0.1)
+    assert started.wait(5)
+    waiting.join()
+
+
+def test_projects_lower_their_share(tmp_path, monkeypatch):
+    use_config(monkeypatch, tmp_path, "cpu_budget: 8\nmax_concurrent_runs: 2\n")
+    monkeypatch.setattr(threads, "host_cpus", lambda: 8)
+    configuration = {"threads": {"cpus": 3, "OMP_NUM_THREADS": 1}}
+
+    limits = threads.limits(configuration)
+
+    assert limits["cpus"] == 3
+    assert limits["env"]["OMP_NUM_THREADS"] == "1"
+    assert limits["env"]["MKL_NUM_THREADS"] == "3"
+    assert threads.docker_arguments(limits)[:2] == ["--cpus", "3"]
+    # But cannot take more than their slot
+    assert threads.limits({"threads": {"cpus": 6}})["cpus"] == 4
+
+
+def test_budget_can_be_disabled(tmp_path, monkeypatch):
+    use_config(monkeypatch, tmp_path, "thread_budget: false\n")
+
+    assert threads.limits({}) is None
+    assert threads.slots() is None
+    command = start.docker_run_command(str(tmp_path), "image", {})
+    assert "--cpus" not in command
+
+
+def test_limits_are_passed_to_the_container(tmp_path, monkeypatch):
+    monkeypatch.setattr(threads, "host_cpus", lambda: 8)
+    limits = threads.container_limits(2)
+
+    command = start.docker_run_command(str(tmp_path), "image", {}, limits=limits)
+
+    assert command[command.index("--cpus") + 1] == "2"
+    assert "OPENBLAS_NUM_THREADS=2" in command
@@ -0,0 +1,106 @@
+"""Tests for the --timings waterfall."""
+
+import http.server
+import io
+import json
+import threading
+
+import pytest
+import requests
+
+from tecli import config, log, ratelimit, timings
+
+
+@pytest.fixture
+def recorder():
+    recorder = timings.start("publish")
+    yield recorder
+    timings.stop()
+
+
+@pytest.fixture
+def server():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(("localhost", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_args_removes_the_timings_flag():
+    assert timings.parse_args(["info"]) == (False, None, ["info"])
+    assert timings.parse_args(["--timings", "logs"]) == (True, None, ["logs"])
+    assert timings.parse_args(["publish", "--timings=t.json"]) == (True, "t.json", ["publish"])
+    assert timings.parse_args(["info", "--", "--timings"]) == (
+        False,
+        None,
+        ["info", "--", "--timings"],
+    )
+
+
+def test_timed_blocks_are_nested_spans(recorder, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "config_path", str(tmp_path / "tecli.yml"))
+    monkeypatch.setattr(config, "settings", {})
+    monkeypatch.setattr(config, "_loaded_stat", None)
+    (tmp_path / "tecli.yml").write_text("url_api: http://localhost\n")
+
+    with log.timed("command", command="publish"):
+        config.get("url_api")
+        config.get("url_api")
+        config.set("JWT", "token")
+
+    out = io.StringIO()
+    record = timings.report(timings.stop(), str(tmp_path / "t.json"), stream=out)
+    spans = [(span["operation"], span["depth"], span.get("parsed")) for span in record["spans"]]
+    assert spans == [
+        ("command", 0, None),
+        ("config_read", 1, True),
+        ("config_read", 1, False),
+        ("config_read", 1, False),
+        ("config_write", 1, None),
+    ]
+    assert json.loads((tmp_path / "t.json").read_text()) == record
+    command = record["spans"][0]
+    assert record["total_ms"] == round(command["start_ms"] + command["duration_ms"], 3)
+    table = out.getvalue().splitlines()
+    assert table[0].startswith("Timings of publish")
+    assert table[3].split()[-2:] == ["config_read", "parsed=True"]
+
+
+def test_http_requests_report_connection_reuse(recorder, server, monkeypatch):
+    monkeypatch.setattr(ratelimit, "configured_rate", lambda host: None)
+    monkeypatch.setattr(config, "get", lambda name: "")
+    session = requests.Session()
+
+    for _ in range(2):
+        ratelimit.request(session, "GET", server + "/")
+
+    spans = timings.stop().record()["spans"]
+    requests_ = [span for span in spans if span["operation"] == "http_request"]
+    assert [span["reused_connection"] for span in requests_] == [False, True]
+    assert all(span["ttfb_ms"] <= span["duration_ms"] for span in requests_)
+    connect = next(span for span in spans if span["operation"] == "connect")
+    assert connect["depth"] == 1 and connect["tls"] is False
+    assert any(span["operation"] == "dns" and span["depth"] == 2 for span in spans)
+
+
+def test_stop_restores_the_network_functions(server):
+    getaddrinfo = timings.socket.getaddrinfo
+    timings.start()
+    assert timings.socket.getaddrinfo is not getaddrinfo
+    timings.stop()
+    assert timings.socket.getaddrinfo is getaddrinfo
+    assert timings.connections() is None
@@ -0,0 +1,50 @@
+"""Tests for the host-side wheel cache used by local runs."""
+
+import os
+
+from tecli import wheelhouse
+
+
+def fake_build(calls):
+    def build(requirements_path, image, target):
+        calls.append(image)
+        os.makedirs(target)
+        open(os.path.join(target, "numpy-1.0-py3-none-any.whl"), "w").close()
+
+    return build
+
+
+def test_wheels_are_built_once_per_requirements(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(wheelhouse.config, "get", lambda name: "")
+    calls = []
+    monkeypatch.setattr(wheelhouse, "build", fake_build(calls))
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("numpy\n")
+
+    for run in range(2):
+        context = tmp_path / f"context{run}"
+        options = wheelhouse.prepare(str(requirements), "base:1", str(context))
+        assert options == "--no-index --find-links=/tmp/wheels"
+        assert os.listdir(context / "wheels") == ["numpy-1.0-py3-none-any.whl"]
+    assert calls == ["base:1"]
+
+    requirements.write_text("numpy\nscipy\n")
+    wheelhouse.prepare(str(requirements), "base:1", str(tmp_path / "context2"))
+    assert len(calls) == 2
+
+
+def test_failed_build_falls_back_to_the_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(wheelhouse.config, "get", lambda name: "")
+
+    def failing_build(requirements_path, image, target):
+        raise FileNotFoundError("docker")
+
+    monkeypatch.setattr(wheelhouse, "build", failing_build)
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("numpy\n")
+
+    assert wheelhouse.prepare(str(requirements), "base:1", str(tmp_path / "context")) == ""
+    assert os.listdir(tmp_path / "context" / "wheels") == []
+    assert os.listdir(tmp_path / "cache" / "tecli" / "wheels") == []